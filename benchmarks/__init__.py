@@ -0,0 +1,11 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# 基准测试不访问 12306, 跳过导入时的车站更新
+os.environ.setdefault('CR_TOOLS_SKIP_INIT', '1')
+# 数据库连接在导入时创建, 需在导入 china_railway_tools 之前指定临时目录, 避免写入用户的数据库
+if 'CR_TOOLS_SQLITE_DIR' not in os.environ:
+    os.environ['CR_TOOLS_SQLITE_DIR'] = tempfile.mkdtemp(prefix='cr_tools_bench_')
+    atexit.register(shutil.rmtree, os.environ['CR_TOOLS_SQLITE_DIR'], ignore_errors=True)
@@ -0,0 +1,113 @@
+"""
+热点路径上模型构建方式的耗时对比
+
+    python -m benchmarks.bench_fast_models
+"""
+import asyncio
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.fixtures import make_left_ticket_data, make_station_rows
+from china_railway_tools.database.connection import Base
+from china_railway_tools.database.schema import MStation
+from china_railway_tools.schemas.station import Station
+from china_railway_tools.schemas.train import TrainInfo, Ticket, StopInfo
+from china_railway_tools.utils.cr_decoder import decode_ticket_data
+from china_railway_tools.utils.fast_models import model_columns, validate_rows
+
+
+def timeit(func, repeat: int = 10) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def async_timeit(func, repeat: int = 10) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def bench_station_query(size: int = 3000):
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    session_maker = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as session:
+        session.add_all([MStation(name=x.name, pinyin=x.pinyin, pinyin_abbr=x.pinyin_abbr, code=x.code, city=x.city)
+                         for x in make_station_rows(size)])
+        await session.commit()
+
+    async def orm_rows():
+        async with session_maker() as session:
+            result = await session.execute(select(MStation))
+            return [Station.model_validate(x) for x in result.scalars().all()]
+
+    async def column_rows():
+        async with session_maker() as session:
+            result = await session.execute(select(*model_columns(MStation, Station)))
+            return validate_rows(Station, result.all())
+
+    orm = await async_timeit(orm_rows)
+    columns = await async_timeit(column_rows)
+    await engine.dispose()
+    return orm, columns
+
+
+def bench_train_info(size: int = 500):
+    data = make_left_ticket_data(size)
+    dep_date = '2025-01-01'
+    items = [x['queryLeftNewDTO'] for x in decode_ticket_data(data['result'], data['map'])]
+    for item in items:
+        item['prices'] = [{'stock': '有', 'seatType': '二等座', 'price': 123.5},
+                          {'stock': '3', 'seatType': '一等座', 'price': 213.5}]
+
+    def nested_models():
+        # 优化前的 TrainInfo.from_raw_dict: 逐个构建嵌套模型, 使用 strptime 转换日期
+        for item in items:
+            TrainInfo(
+                depart_date=dep_date,
+                train_date=datetime.strptime(item['start_train_date'], '%Y%m%d').strftime('%Y-%m-%d'),
+                train_no=item['train_no'],
+                train_code=item['station_train_code'],
+                tickets=[Ticket(stock=x['stock'], seat_type=x['seatType'], price=str(x['price']))
+                         for x in item['prices']],
+                from_station=item['from_station_name'], from_station_code=item['from_station_telecode'],
+                to_station=item['to_station_name'], to_station_code=item['to_station_telecode'],
+                first_station_code=item['start_station_telecode'], end_station_code=item['end_station_telecode'],
+                from_stop_info=StopInfo(station_name=item['from_station_name'], dep_time=item['start_time']),
+                to_stop_info=StopInfo(station_name=item['to_station_name'], arr_time=item['arrive_time']))
+
+    def single_validation():
+        for item in items:
+            TrainInfo.from_raw_dict(dep_date, item,
+                                    from_stop_info={'station_name': item['from_station_name'],
+                                                    'dep_time': item['start_time']},
+                                    to_stop_info={'station_name': item['to_station_name'],
+                                                  'arr_time': item['arrive_time']})
+
+    return timeit(nested_models), timeit(single_validation)
+
+
+def report(name: str, before: float, after: float):
+    print(f'{name:<28} before: {before * 1000:8.2f}ms  after: {after * 1000:8.2f}ms  '
+          f'speedup: {before / after:5.1f}x')
+
+
+def main():
+    report('query Station x3000', *asyncio.run(bench_station_query()))
+    report('build TrainInfo x500', *bench_train_info())
+
+
+if __name__ == '__main__':
+    main()
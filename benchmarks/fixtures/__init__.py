@@ -0,0 +1,162 @@
+"""
+12306 接口响应样例数据.
+fixtures 目录下存在录制的响应文件时使用录制数据(见 record.py), 否则按线上接口格式生成确定性的数据
+"""
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 录制文件名
+LEFT_TICKET_FILE = 'left_ticket.json'
+TRAIN_SCHEDULE_FILE = 'train_schedule.json'
+STATION_NAME_JS_FILE = 'station_name.js'
+
+STATION_NAMES = ['北京南', '天津南', '济南西', '徐州东', '南京南', '上海虹桥', '杭州东', '长沙南', '武汉', '郑州东',
+                 '广州南', '深圳北', '西安北', '成都东', '重庆北', '贵阳北', '昆明南', '南宁东', '福州南', '厦门北']
+STATION_CODES = ['VNP', 'JGP', 'JGK', 'FYH', 'NKH', 'AOH', 'HGH', 'CWQ', 'WHN', 'ZAF',
+                 'IZQ', 'IOQ', 'EAY', 'ICW', 'CUW', 'KQW', 'KOM', 'NFZ', 'FYS', 'XKS']
+# 座位字段在 result 中的下标, 见 cr_decoder.decode_ticket_data
+SEAT_NUM_INDEXES = {'ZE_': 30, 'ZY_': 31, 'SWZ_': 32, 'WZ_': 26}
+SEAT_PRICE_CODES = {'ZE_': 'O', 'ZY_': 'M', 'SWZ_': '9', 'WZ_': 'W'}
+
+
+def make_ticket_row(rnd: random.Random, index: int, dep_date: datetime) -> str:
+    from_index, to_index = rnd.sample(range(len(STATION_CODES)), 2)
+    train_code = f'{rnd.choice("GDCKZT")}{index + 1}'
+    fields = [''] * 57
+    fields[0] = 'secret%06d' % index
+    fields[1] = '预订'
+    fields[2] = f'{rnd.randint(10, 99)}000{train_code:0>5}0{rnd.randint(0, 9)}'
+    fields[3] = train_code
+    fields[4] = STATION_CODES[from_index]
+    fields[5] = STATION_CODES[to_index]
+    fields[6] = STATION_CODES[from_index]
+    fields[7] = STATION_CODES[to_index]
+    dep_minutes = rnd.randint(0, 24 * 60 - 1)
+    arr_minutes = (dep_minutes + rnd.randint(30, 600)) % (24 * 60)
+    fields[8] = '%02d:%02d' % divmod(dep_minutes, 60)
+    fields[9] = '%02d:%02d' % divmod(arr_minutes, 60)
+    fields[10] = '04:30'
+    fields[11] = 'Y'
+    fields[13] = dep_date.strftime('%Y%m%d')
+    yp_info_new = ''
+    for seat, field_index in SEAT_NUM_INDEXES.items():
+        if rnd.random() < 0.3:
+            continue
+        fields[field_index] = rnd.choice(['有', '无', str(rnd.randint(1, 20))])
+        price = rnd.randint(500, 20000)
+        count = 3000 + rnd.randint(0, 99) if seat == 'WZ_' else rnd.randint(0, 99)
+        yp_info_new += f'{SEAT_PRICE_CODES[seat]}{price:05d}{count:04d}'
+    fields[39] = yp_info_new
+    return '|'.join(fields)
+
+
+def make_left_ticket_data(size: int = 500, dep_date: datetime = None, seed: int = 12306) -> dict:
+    """
+    :return: leftTicket/queryU 响应中的 data 字段: {'result': [...], 'map': {code: name}}
+    """
+    rnd = random.Random(seed)
+    dep_date = dep_date or datetime.now() + timedelta(days=1)
+    return {
+        'result': [make_ticket_row(rnd, i, dep_date) for i in range(size)],
+        'map': dict(zip(STATION_CODES, STATION_NAMES)),
+    }
+
+
+def make_left_ticket_response(size: int = 500, dep_date: datetime = None, seed: int = 12306) -> dict:
+    """
+    :return: leftTicket/queryU 的完整响应
+    """
+    return {
+        'data': {**make_left_ticket_data(size, dep_date, seed), 'flag': '1'},
+        'httpstatus': 200,
+        'messages': '',
+        'status': True,
+    }
+
+
+def make_train_schedule_response(size: int = 20, seed: int = 12306, train_code: str = 'G1') -> dict:
+    """
+    :return: queryTrainInfo/query 的完整响应
+    """
+    rnd = random.Random(seed)
+    stops = []
+    minutes = rnd.randint(6 * 60, 22 * 60)
+    start_minutes = minutes
+    for index in range(size):
+        arrive = minutes
+        stopover = 0 if index in (0, size - 1) else rnd.randint(2, 10)
+        start = arrive + stopover
+        stops.append({
+            'station_no': f'{index + 1:02d}',
+            'station_name': f'{STATION_NAMES[index % len(STATION_NAMES)]}{"" if index < len(STATION_NAMES) else index}',
+            'station_train_code': train_code,
+            'arrive_time': '----' if index == 0 else '%02d:%02d' % divmod(arrive % (24 * 60), 60),
+            'start_time': '----' if index == size - 1 else '%02d:%02d' % divmod(start % (24 * 60), 60),
+            'running_time': '%02d:%02d' % divmod(arrive - start_minutes, 60),
+            'arrive_day_diff': str(arrive // (24 * 60) - start_minutes // (24 * 60)),
+            'arrive_day_str': '当日到达',
+            'is_start': 'Y' if index == 0 else 'N',
+            'service_type': '2',
+        })
+        minutes = start + rnd.randint(20, 90)
+    return {
+        'data': {'data': stops},
+        'httpstatus': 200,
+        'messages': '',
+        'status': True,
+    }
+
+
+def make_station_names_js(size: int = 3000) -> str:
+    """
+    :return: station_name_*.js 的内容
+    """
+    rows = [f'@{x.pinyin_abbr}|{x.name}|{x.code}|{x.pinyin}|{x.pinyin_abbr}|{i}|{i:04d}|{x.city}|||'
+            for i, x in enumerate(make_station_rows(size))]
+    return "var station_names ='" + ''.join(rows) + "';"
+
+
+def fixture_path(file_name: str) -> str:
+    return os.path.join(FIXTURE_DIR, file_name)
+
+
+def load_left_ticket_response(size: int = 500) -> dict:
+    if os.path.exists(fixture_path(LEFT_TICKET_FILE)):
+        with open(fixture_path(LEFT_TICKET_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    return make_left_ticket_response(size)
+
+
+def load_train_schedule_response(size: int = 20) -> dict:
+    if os.path.exists(fixture_path(TRAIN_SCHEDULE_FILE)):
+        with open(fixture_path(TRAIN_SCHEDULE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    return make_train_schedule_response(size)
+
+
+def load_station_names_js(size: int = 3000) -> str:
+    if os.path.exists(fixture_path(STATION_NAME_JS_FILE)):
+        with open(fixture_path(STATION_NAME_JS_FILE), encoding='utf-8') as f:
+            return f.read()
+    return make_station_names_js(size)
+
+
+class StationRow:
+    """
+    模拟 tb_station 的 ORM 行
+    """
+
+    def __init__(self, index: int):
+        self.name = f'{STATION_NAMES[index % len(STATION_NAMES)]}{index}'
+        self.pinyin = f'station{index}'
+        self.pinyin_abbr = f'st{index}'
+        self.code = f'S{index:04d}'
+        self.city = STATION_NAMES[index % len(STATION_NAMES)]
+
+
+def make_station_rows(size: int = 3000) -> List[StationRow]:
+    return [StationRow(i) for i in range(size)]
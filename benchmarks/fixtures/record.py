@@ -0,0 +1,64 @@
+"""
+录制 12306 的真实响应作为基准测试数据
+
+    python -m benchmarks.fixtures.record --from GZQ --to SHH --date 2025-01-01 --train-no 6i000G13020B
+"""
+import argparse
+import asyncio
+import json
+import urllib.parse
+
+from lxml import html
+
+from benchmarks.fixtures import fixture_path, LEFT_TICKET_FILE, TRAIN_SCHEDULE_FILE, STATION_NAME_JS_FILE
+from china_railway_tools.utils.cr_fetcher import get_url, get_cookie_store
+from china_railway_tools.utils.http_utils import HeadersBuilder, get_async_client
+
+
+async def record(from_code: str, to_code: str, date: str, train_no: str):
+    cookies = await (await get_cookie_store()).get_valid_cookie()
+    headers = HeadersBuilder().add_header('Cookie', cookies) \
+        .add_header('Referer', 'https://kyfw.12306.cn/otn/leftTicket/init?').build()
+    async with get_async_client() as client:
+        params = {
+            'leftTicketDTO.train_date': date,
+            'leftTicketDTO.from_station': from_code,
+            'leftTicketDTO.to_station': to_code,
+            'purpose_codes': 'ADULT',
+        }
+        response = await client.get(get_url('QUERY_TICKETS'), params=params, headers=headers)
+        if response.status_code == 302:
+            response = await client.get(get_url('QUERY_TICKETS2'), params=params, headers=headers)
+        response.raise_for_status()
+        with open(fixture_path(LEFT_TICKET_FILE), 'w', encoding='utf-8') as f:
+            json.dump(response.json(), f, ensure_ascii=False)
+
+        if train_no:
+            params = {'leftTicketDTO.train_no': train_no, 'leftTicketDTO.train_date': date, 'rand_code': ''}
+            response = await client.get(get_url('QUERY_TRAIN_SCHEDULE'), params=params, headers=headers)
+            response.raise_for_status()
+            with open(fixture_path(TRAIN_SCHEDULE_FILE), 'w', encoding='utf-8') as f:
+                json.dump(response.json(), f, ensure_ascii=False)
+
+        response = await client.get('https://www.12306.cn/index/', headers=HeadersBuilder().build())
+        response.raise_for_status()
+        js_src = html.fromstring(response.text) \
+            .xpath("//script[contains(@src, './script/core/common/station_name_')]/@src")[0].strip('.')
+        response = await client.get(urllib.parse.urljoin('https://www.12306.cn/', f'index{js_src}'))
+        response.raise_for_status()
+        with open(fixture_path(STATION_NAME_JS_FILE), 'w', encoding='utf-8') as f:
+            f.write(response.text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record 12306 responses as benchmark fixtures')
+    parser.add_argument('--from', dest='from_code', required=True, help='出发站电报码')
+    parser.add_argument('--to', dest='to_code', required=True, help='到达站电报码')
+    parser.add_argument('--date', required=True, help='出发日期, 如 2025-01-01')
+    parser.add_argument('--train-no', default=None, help='录制该列车编号的时刻表')
+    args = parser.parse_args()
+    asyncio.run(record(args.from_code, args.to_code, args.date, args.train_no))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+使用本地模拟的 12306 (benchmarks.mock_12306) 压测 query_tickets / query_train_prices
+
+    python -m benchmarks.load_test --qps 50 --duration 20 --latency 0.05 --error-rate 0.01 --json result.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from benchmarks.mock_12306 import Mock12306
+from china_railway_tools.utils import http_utils, metrics
+
+
+def percentile(sorted_values: List[float], p: float) -> float | None:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies) + errors,
+        'succeeded': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else None,
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'max': latencies[-1] if latencies else None,
+    }
+
+
+async def prepare(mock: Mock12306):
+    from china_railway_tools.database.schema import init_db_async
+    from china_railway_tools.scrpits.init_script import init_stations
+    from china_railway_tools.utils.cr_fetcher import fetch_all_stations
+    http_utils.set_transport(mock.transport())
+    await init_db_async()
+    await init_stations(await fetch_all_stations())
+    mock.calls.clear()
+
+
+async def run_load(mock: Mock12306, qps: float, duration: float, prices_ratio: float, force_update: bool) -> dict:
+    from china_railway_tools.api.train import query_tickets, query_train_prices
+    from china_railway_tools.schemas.query import QueryTrains, QueryTrainTicket
+
+    dep_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    error_samples: Dict[str, str] = {}
+
+    async def one_request(kind: str):
+        train, from_station, to_station = mock.sample_route()
+        start = time.perf_counter()
+        try:
+            if kind == 'query_train_prices':
+                await query_train_prices(QueryTrainTicket(from_station_name=from_station, to_station_name=to_station,
+                                                          dep_date=dep_date, train_code=train.train_code))
+            else:
+                await query_tickets(QueryTrains(from_station_name=from_station, to_station_name=to_station,
+                                                dep_date=dep_date, exact=True, force_update=force_update))
+            latencies[kind].append(time.perf_counter() - start)
+        except Exception as e:
+            errors[kind] += 1
+            error_samples.setdefault(kind, repr(e))
+
+    total = int(qps * duration)
+    tasks = []
+    started = time.perf_counter()
+    # 开环压测: 按目标 QPS 发起请求, 不等待前一个请求完成
+    for i in range(total):
+        delay = started + i / qps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = 'query_train_prices' if mock.rnd.random() < prices_ratio else 'query_tickets'
+        tasks.append(asyncio.create_task(one_request(kind)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [x for values in latencies.values() for x in values]
+    return {
+        'target_qps': qps,
+        'duration': elapsed,
+        'total': summarize(all_latencies, sum(errors.values()), elapsed),
+        'operations': {k: summarize(latencies[k], errors[k], elapsed) for k in set(latencies) | set(errors)},
+        'upstream_calls': dict(mock.calls),
+        'upstream_errors': dict(mock.errors),
+        'error_samples': error_samples,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Load test against a local 12306 stand-in')
+    parser.add_argument('--qps', type=float, default=20)
+    parser.add_argument('--duration', type=float, default=10, help='压测时长(秒)')
+    parser.add_argument('--prices-ratio', type=float, default=0.1, help='query_train_prices 请求的比例')
+    parser.add_argument('--force-update', action='store_true', help='query_tickets 不使用缓存')
+    parser.add_argument('--latency', type=float, default=0.05, help='模拟接口延迟(秒)')
+    parser.add_argument('--latency-jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--redirect-rate', type=float, default=0.5, help='queryU 返回 302 的比例')
+    parser.add_argument('--stations', type=int, default=200)
+    parser.add_argument('--trains', type=int, default=400)
+    parser.add_argument('--json', dest='json_path', default=None, help='结果写入的 json 文件, - 表示标准输出')
+    parser.add_argument('--metrics', action='store_true', help='记录各阶段耗时, 结束后输出 prometheus 格式指标')
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable_metrics()
+
+    mock = Mock12306(station_count=args.stations, train_count=args.trains, latency=args.latency,
+                     latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                     redirect_rate=args.redirect_rate)
+
+    async def run():
+        from china_railway_tools.scrpits.init_script import shutdown
+        # 与 SyncClient/守护进程一样复用连接池, 结束时关闭
+        http_utils.share_client_in_loop()
+        try:
+            await prepare(mock)
+            return await run_load(mock, args.qps, args.duration, args.prices_ratio, args.force_update)
+        finally:
+            await shutdown()
+
+    result = asyncio.run(run())
+    for name, summary in {'total': result['total'], **result['operations']}.items():
+        p50 = summary['p50'] * 1000 if summary['p50'] is not None else float('nan')
+        p99 = summary['p99'] * 1000 if summary['p99'] is not None else float('nan')
+        print(f"{name:<20} requests: {summary['requests']:6d}  errors: {summary['errors']:5d}  "
+              f"p50: {p50:8.1f}ms  p99: {p99:8.1f}ms  throughput: {summary['throughput']:7.1f}/s", file=sys.stderr)
+    print(f"upstream calls: {result['upstream_calls']}", file=sys.stderr)
+    if args.metrics:
+        result['metrics'] = metrics.METRICS.snapshot()
+        print(metrics.export_prometheus(), file=sys.stderr)
+    if args.json_path == '-':
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    elif args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+本地模拟的 12306 接口, 基于 httpx.MockTransport, 用于压测和离线调试.
+生成一组确定性的车站和列车, 余票/时刻表/车次搜索的结果彼此一致, 可配置延迟、错误率和 queryU 的 302 跳转比例
+
+    mock = Mock12306(latency=0.05, error_rate=0.01)
+    http_utils.set_transport(mock.transport())
+"""
+import asyncio
+import random
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.fixtures import make_station_rows
+
+STATION_NAME_JS_PATH = '/index/script/core/common/station_name_v10001.js'
+INDEX_HTML = f'''<!DOCTYPE html>
+<html><head><title>中国铁路12306</title>
+<script type="text/javascript" src=".{STATION_NAME_JS_PATH[len('/index'):]}"></script>
+</head><body></body></html>'''
+
+
+class MockTrain:
+    __slots__ = ('train_no', 'train_code', 'stops', 'positions')
+
+    def __init__(self, train_no: str, train_code: str, stops: List[Tuple[int, int, int]]):
+        self.train_no = train_no
+        self.train_code = train_code
+        # (车站下标, 到达分钟, 出发分钟), 分钟数从始发日 00:00 起算
+        self.stops = stops
+        self.positions: Dict[int, int] = {x[0]: i for i, x in enumerate(stops)}
+
+
+def hhmm(minutes: int) -> str:
+    return '%02d:%02d' % divmod(minutes % (24 * 60), 60)
+
+
+class Mock12306:
+    def __init__(self, station_count: int = 200, train_count: int = 400, latency: float = 0.05,
+                 latency_jitter: float = 0.02, error_rate: float = 0.0, redirect_rate: float = 0.5,
+                 search_page_size: int = 100, seed: int = 12306):
+        """
+        :param latency: 每个请求的平均延迟(秒)
+        :param latency_jitter: 延迟的随机浮动范围(秒)
+        :param error_rate: 返回 500 的概率
+        :param redirect_rate: queryU 返回 302 (客户端改用 queryG) 的概率
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.redirect_rate = redirect_rate
+        self.search_page_size = search_page_size
+        self.rnd = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.stations = make_station_rows(station_count)
+        self.station_index = {x.code: i for i, x in enumerate(self.stations)}
+        self.trains: List[MockTrain] = [self._make_train(i) for i in range(train_count)]
+        self.trains_by_no = {x.train_no: x for x in self.trains}
+        self.trains_by_station: Dict[int, List[MockTrain]] = {}
+        for train in self.trains:
+            for station, _, _ in train.stops:
+                self.trains_by_station.setdefault(station, []).append(train)
+
+    def _make_train(self, index: int) -> MockTrain:
+        rnd = self.rnd
+        train_code = f'{rnd.choice("GDCKZT")}{index + 1}'
+        station_count = len(self.stations)
+        start = rnd.randrange(station_count)
+        step = rnd.choice([1, -1]) * rnd.randint(1, 3)
+        station_indexes = list(dict.fromkeys((start + step * k) % station_count for k in range(rnd.randint(4, 14))))
+        minutes = rnd.randint(5 * 60, 22 * 60)
+        stops = []
+        for position, station in enumerate(station_indexes):
+            dep = minutes if position == 0 else minutes + rnd.randint(2, 8)
+            stops.append((station, minutes, dep))
+            minutes = dep + rnd.randint(20, 90)
+        train_no = f'{rnd.randint(10, 99)}000{train_code:0>5}0{index % 10}'
+        return MockTrain(train_no, train_code, stops)
+
+    def sample_route(self) -> Tuple[MockTrain, str, str]:
+        """
+        :return: 随机的一列车及其经停的两站(站名), 可用于生成有结果的查询
+        """
+        train = self.rnd.choice(self.trains)
+        from_position, to_position = sorted(self.rnd.sample(range(len(train.stops)), 2))
+        return (train, self.stations[train.stops[from_position][0]].name,
+                self.stations[train.stops[to_position][0]].name)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.calls[path] += 1
+        delay = self.latency + self.rnd.uniform(-self.latency_jitter, self.latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.rnd.random() < self.error_rate:
+            self.errors[path] += 1
+            return httpx.Response(500, text='Internal Server Error')
+        params = request.url.params
+        if path == '/otn/leftTicket/queryU' and self.rnd.random() < self.redirect_rate:
+            return httpx.Response(302, headers={'Location': str(request.url).replace('queryU', 'queryG')})
+        if path in ('/otn/leftTicket/queryU', '/otn/leftTicket/queryG'):
+            return httpx.Response(200, json=self.left_ticket(params.get('leftTicketDTO.from_station'),
+                                                             params.get('leftTicketDTO.to_station'),
+                                                             params.get('leftTicketDTO.train_date')))
+        if path == '/otn/queryTrainInfo/query':
+            return httpx.Response(200, json=self.train_schedule(params.get('leftTicketDTO.train_no')))
+        if path == '/search/v1/train/search':
+            return httpx.Response(200, json=self.search(params.get('keyword', ''), params.get('date', '')))
+        if path == '/index/otn/login/conf':
+            return httpx.Response(200, json={'status': True}, headers=[
+                ('Set-Cookie', f'JSESSIONID=MOCK{int(time.time())}; Path=/'),
+                ('Set-Cookie', 'route=mock; Path=/'),
+            ])
+        if path in ('/index/', '/index'):
+            return httpx.Response(200, text=INDEX_HTML, headers={'Content-Type': 'text/html; charset=utf-8'})
+        if path == STATION_NAME_JS_PATH:
+            js_text = self.station_names_js()
+            etag = '"%08x"' % zlib.crc32(js_text.encode('utf-8'))
+            if request.headers.get('If-None-Match') == etag:
+                return httpx.Response(304, headers={'ETag': etag})
+            return httpx.Response(200, text=js_text,
+                                  headers={'Content-Type': 'application/javascript; charset=utf-8', 'ETag': etag})
+        return httpx.Response(404, text='Not Found')
+
+    def station_names_js(self) -> str:
+        rows = [f'@{x.pinyin_abbr}|{x.name}|{x.code}|{x.pinyin}|{x.pinyin_abbr}|{i}|{i:04d}|{x.city}|||'
+                for i, x in enumerate(self.stations)]
+        return "var station_names ='" + ''.join(rows) + "';"
+
+    def _ticket_row(self, train: MockTrain, from_position: int, to_position: int, dep_date: datetime) -> str:
+        from_station, _, dep = train.stops[from_position]
+        to_station, arr, _ = train.stops[to_position]
+        first_station = train.stops[0][0]
+        last_station = train.stops[-1][0]
+        train_date = dep_date - timedelta(days=dep // (24 * 60))
+        fields = [''] * 57
+        fields[0] = f'secret{train.train_no}'
+        fields[1] = '预订'
+        fields[2] = train.train_no
+        fields[3] = train.train_code
+        fields[4] = self.stations[first_station].code
+        fields[5] = self.stations[last_station].code
+        fields[6] = self.stations[from_station].code
+        fields[7] = self.stations[to_station].code
+        fields[8] = hhmm(dep)
+        fields[9] = hhmm(arr)
+        fields[10] = hhmm(arr - dep)
+        fields[11] = 'Y'
+        fields[13] = train_date.strftime('%Y%m%d')
+        fields[16] = f'{from_position + 1:02d}'
+        fields[17] = f'{to_position + 1:02d}'
+        # 余票每次查询都会变化, 票价只和区间有关
+        fields[30] = self.rnd.choice(['有', '无', str(self.rnd.randint(1, 20))])
+        fields[31] = self.rnd.choice(['有', '无', str(self.rnd.randint(1, 20))])
+        fields[26] = self.rnd.choice(['有', '无'])
+        base_price = (arr - dep) * 5
+        fields[39] = f'O{base_price:05d}0021M{int(base_price * 1.6):05d}0008W{base_price:05d}3000'
+        return '|'.join(fields)
+
+    def left_ticket(self, from_code: str, to_code: str, train_date: str) -> dict:
+        dep_date = datetime.strptime(train_date, '%Y-%m-%d')
+        from_station = self.station_index.get(from_code)
+        to_station = self.station_index.get(to_code)
+        result = []
+        for train in self.trains_by_station.get(from_station, []):
+            from_position = train.positions[from_station]
+            to_position = train.positions.get(to_station)
+            if to_position is not None and to_position > from_position:
+                result.append(self._ticket_row(train, from_position, to_position, dep_date))
+        return {
+            'data': {
+                'result': result,
+                'map': {x.code: x.name for x in
+                        (self.stations[from_station], self.stations[to_station])} if result else {},
+                'flag': '1',
+            },
+            'httpstatus': 200,
+            'messages': '',
+            'status': True,
+        }
+
+    def train_schedule(self, train_no: str) -> dict:
+        train = self.trains_by_no.get(train_no)
+        stops = []
+        for position, (station, arr, dep) in enumerate(train.stops if train else []):
+            stops.append({
+                'station_no': f'{position + 1:02d}',
+                'station_name': self.stations[station].name,
+                'station_train_code': train.train_code,
+                'arrive_time': '----' if position == 0 else hhmm(arr),
+                'start_time': '----' if position == len(train.stops) - 1 else hhmm(dep),
+                'running_time': hhmm(arr - train.stops[0][2]),
+                'arrive_day_diff': str(arr // (24 * 60)),
+            })
+        return {'data': {'data': stops}, 'httpstatus': 200, 'messages': '', 'status': True}
+
+    def search(self, keyword: str, date: str) -> dict:
+        keyword = keyword.upper()
+        trains = sorted((x for x in self.trains if x.train_code.startswith(keyword)),
+                        key=lambda x: (len(x.train_code), x.train_code))[:self.search_page_size]
+        return {
+            'data': [{
+                'date': date,
+                'from_station': self.stations[x.stops[0][0]].name,
+                'station_train_code': x.train_code,
+                'to_station': self.stations[x.stops[-1][0]].name,
+                'total_num': str(len(x.stops)),
+                'train_no': x.train_no,
+            } for x in trains],
+            'status': True,
+            'errorMsg': '',
+        }
@@ -0,0 +1,286 @@
+"""
+热点路径基准测试, 使用 benchmarks/fixtures 中的 12306 响应数据, 不访问网络
+
+    python -m benchmarks.run                              # 运行全部
+    python -m benchmarks.run -k parse --json result.json  # 只运行名称包含 parse 的, 结果写入 json
+    python -m benchmarks.run --compare baseline.json      # 与基线比较, 中位数变慢超过阈值时返回码为 1
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """
+    注册基准测试. 被装饰的函数完成准备工作, 返回需要计时的无参函数(普通函数或协程函数)
+    """
+
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+@benchmark('decode_ticket_data')
+async def bench_decode_ticket_data():
+    from benchmarks.fixtures import load_left_ticket_response
+    from china_railway_tools.utils.cr_decoder import decode_ticket_data
+    data = load_left_ticket_response()['data']
+    return lambda: decode_ticket_data(data['result'], data['map'])
+
+
+@benchmark('parse_ticket_data')
+async def bench_parse_ticket_data():
+    from benchmarks.fixtures import load_left_ticket_response
+    from china_railway_tools.utils.cr_utils import parse_ticket_data
+    data = load_left_ticket_response()['data']
+    return lambda: parse_ticket_data(data, dep_date='2025-01-01')
+
+
+@benchmark('parse_ticket_data_cold')
+async def bench_parse_ticket_data_cold():
+    from benchmarks.fixtures import load_left_ticket_response
+    from china_railway_tools.utils.cr_utils import parse_ticket_data
+    from china_railway_tools.utils.train_statics import TRAIN_STATICS
+    data = load_left_ticket_response()['data']
+
+    async def run():
+        # 每次清空车次静态信息缓存, 测量首次查询时的完整解析
+        TRAIN_STATICS.clear()
+        return await parse_ticket_data(data, dep_date='2025-01-01')
+
+    return run
+
+
+@benchmark('filter_trains')
+async def bench_filter_trains():
+    from benchmarks.fixtures import load_left_ticket_response
+    from china_railway_tools.schemas.query import QueryTrains
+    from china_railway_tools.utils.cr_utils import parse_ticket_data, filter_trains
+    trains = await parse_ticket_data(load_left_ticket_response()['data'], dep_date='2025-01-01')
+    form = QueryTrains(train_codes=['G*', 'D*'], start_time='08:00', end_time='20:00')
+    return lambda: filter_trains(form, trains)
+
+
+@benchmark('parse_train_schedule')
+async def bench_parse_train_schedule():
+    from benchmarks.fixtures import load_train_schedule_response
+    from china_railway_tools.schemas.train import TrainSchedule
+    from china_railway_tools.utils.cr_utils import parse_stop_info_list
+    stop_info_list = load_train_schedule_response()['data']['data']
+    return lambda: TrainSchedule.from_raw_dict({
+        'train_no': 'BENCH', 'train_date': '2025-01-01', 'stop_info_list': parse_stop_info_list(stop_info_list)})
+
+
+@benchmark('parse_station_names_js')
+async def bench_parse_station_names_js():
+    from benchmarks.fixtures import load_station_names_js
+    from china_railway_tools.utils.cr_fetcher import parse_station_names_js
+    js_text = load_station_names_js()
+    return lambda: parse_station_names_js(js_text)
+
+
+@benchmark('datastore_set')
+async def bench_datastore_set():
+    from china_railway_tools.utils.DataStore import DataStore
+    ds = DataStore()
+    keys = [f'bench_set.route{i}' for i in range(200)]
+
+    def run():
+        # 超过节点容量(100)后每次写入都会触发淘汰
+        for key in keys:
+            ds.set([], key, 60)
+
+    return run
+
+
+@benchmark('datastore_get')
+async def bench_datastore_get():
+    from china_railway_tools.utils.DataStore import DataStore
+    ds = DataStore()
+    keys = [f'bench_get.route{i}' for i in range(100)]
+    for key in keys:
+        ds.set([], key, 3600)
+
+    def run():
+        for key in keys:
+            ds.get(key)
+
+    return run
+
+
+@benchmark('datastore_evict')
+async def bench_datastore_evict():
+    from china_railway_tools.utils.DataStore import DataStore
+    ds = DataStore()
+    for i in range(100):
+        ds.set([], f'bench_evict.route{i}', 3600)
+    return ds.clear_expired
+
+
+@benchmark('query_cached_result')
+async def bench_query_cached_result():
+    from benchmarks.fixtures import load_train_schedule_response
+    from china_railway_tools.database.curd import query_cached_result
+    from china_railway_tools.schemas.train import TrainSchedule
+    from china_railway_tools.utils.cr_utils import parse_stop_info_list
+    schedule = TrainSchedule.from_raw_dict({
+        'train_no': 'BENCH', 'train_date': '2025-01-01',
+        'stop_info_list': parse_stop_info_list(load_train_schedule_response()['data']['data'])})
+
+    async def empty_cb():
+        return schedule
+
+    async def run():
+        return await query_cached_result(query_key='BENCH', category='train_schedule', empty_cb=empty_cb,
+                                         _date='2025-01-01', pydantic_class=TrainSchedule)
+
+    # 首次调用写入缓存, 之后均为缓存命中
+    await run()
+    return run
+
+
+@benchmark('query_train_schedule_memory')
+async def bench_query_train_schedule_memory():
+    from china_railway_tools.api.common import query_train_schedule
+    from china_railway_tools.schemas.query import QueryTrainSchedule
+    from china_railway_tools.utils.schedule_cache import SCHEDULE_CACHE
+    await bench_query_cached_result()
+    form = QueryTrainSchedule(train_no='BENCH', train_date=datetime(2025, 1, 1))
+    SCHEDULE_CACHE.clear()
+
+    async def run():
+        return await query_train_schedule(form)
+
+    # 首次调用从 SQLite 缓存读取并写入内存缓存
+    await run()
+    return run
+
+
+@benchmark('query_station')
+async def bench_query_station():
+    from benchmarks.fixtures import load_station_names_js
+    from china_railway_tools.api.station import query_station
+    from china_railway_tools.scrpits.init_script import init_stations
+    from china_railway_tools.utils.cr_fetcher import parse_station_names_js
+    await init_stations(parse_station_names_js(load_station_names_js()))
+
+    async def run():
+        await query_station('beijing')
+        await query_station('北京')
+        await query_station('VNP', exact=True)
+
+    return run
+
+
+async def measure(func: Callable, rounds: int, min_round_seconds: float) -> dict:
+    is_async = inspect.iscoroutinefunction(func)
+
+    async def call():
+        result = func()
+        if is_async or inspect.isawaitable(result):
+            await result
+
+    # 预热并估算每轮的调用次数
+    start = time.perf_counter()
+    await call()
+    elapsed = time.perf_counter() - start
+    iterations = max(1, int(min_round_seconds / elapsed)) if elapsed > 0 else 1000
+
+    samples: List[float] = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await call()
+        samples.append((time.perf_counter() - start) / iterations)
+    median = statistics.median(samples)
+    return {
+        'rounds': rounds,
+        'iterations': iterations,
+        'min': min(samples),
+        'max': max(samples),
+        'mean': statistics.mean(samples),
+        'median': median,
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'ops': 1 / median if median else None,
+    }
+
+
+async def run_benchmarks(names: List[str], rounds: int, min_round_seconds: float) -> List[dict]:
+    from china_railway_tools.database.schema import init_db_async
+    from china_railway_tools.database.connection import async_engine
+    await init_db_async()
+    results = []
+    for name in names:
+        func = await BENCHMARKS[name]()
+        result = {'name': name, **await measure(func, rounds, min_round_seconds)}
+        print(f"{name:<26} median: {result['median'] * 1e6:12.1f}us  min: {result['min'] * 1e6:12.1f}us  "
+              f"ops: {result['ops']:12.1f}/s", file=sys.stderr)
+        results.append(result)
+    await async_engine.dispose()
+    return results
+
+
+def compare(results: List[dict], baseline_path: str, threshold: float) -> List[str]:
+    """
+    :return: 中位数比基线慢超过 threshold 的基准测试
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {x['name']: x for x in json.load(f)['benchmarks']}
+    regressions = []
+    for result in results:
+        base = baseline.get(result['name'])
+        if base is None:
+            continue
+        ratio = result['median'] / base['median']
+        result['baseline_median'] = base['median']
+        result['ratio'] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(f"{result['name']}: {base['median'] * 1e6:.1f}us -> {result['median'] * 1e6:.1f}us "
+                               f"({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='china_railway_tools hot path benchmarks')
+    parser.add_argument('-k', dest='keyword', default=None, help='只运行名称包含该关键字的基准测试')
+    parser.add_argument('--rounds', type=int, default=15)
+    parser.add_argument('--min-round-seconds', type=float, default=0.05)
+    parser.add_argument('--json', dest='json_path', default=None, help='结果写入的 json 文件, - 表示标准输出')
+    parser.add_argument('--compare', default=None, help='基线结果 json 文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许的中位数变慢比例')
+    args = parser.parse_args(argv)
+
+    names = [x for x in BENCHMARKS if args.keyword is None or args.keyword in x]
+    results = asyncio.run(run_benchmarks(names, args.rounds, args.min_round_seconds))
+
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+    output = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'benchmarks': results,
+        'regressions': regressions,
+    }
+    if args.json_path == '-':
+        json.dump(output, sys.stdout, ensure_ascii=False, indent=2)
+    elif args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+    for regression in regressions:
+        print(f'REGRESSION {regression}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,12 @@
-from .scrpits import init_script
+import os
 
 
 def init_app():
+    from .scrpits import init_script
     init_script.run()
 
 
-init_app()
+# 设置环境变量 CR_TOOLS_SKIP_INIT=1 可跳过导入时的初始化, 之后需自行调用 init_app()
+# 设置 CR_TOOLS_DAEMON 时作为守护进程的客户端使用(见 china_railway_tools.daemon), 同样不在本进程初始化
+if not os.environ.get('CR_TOOLS_SKIP_INIT') and not os.environ.get('CR_TOOLS_DAEMON'):
+    init_app()
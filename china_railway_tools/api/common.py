@@ -4,17 +4,28 @@ import logging
 from sqlalchemy import or_, func, and_
 from sqlalchemy import select
 
+from china_railway_tools.config import get_config
 from china_railway_tools.database.connection import AsyncSessionLocal
-from china_railway_tools.database.curd import batch_add_train_no, query_cached_result
+from china_railway_tools.database.curd import batch_add_train_no, query_cached_result, save_stop_times
+from china_railway_tools.database.maintenance import start_db_maintenance
 from china_railway_tools.database.schema import MStation, MTrainNo, QueryResult
+from china_railway_tools.database.write_queue import TRAIN_NO_WRITE_QUEUE
 from china_railway_tools.schemas.query import QueryTrainSchedule
 from china_railway_tools.schemas.station import Station
 from china_railway_tools.schemas.train import *
 from china_railway_tools.utils.cr_fetcher import fetch_train_no, fetch_train_schedule
 from china_railway_tools.utils.decorators import complete_train_no
+from china_railway_tools.utils.exception_utils import extract_exception_traceback
+from china_railway_tools.utils.fast_models import model_columns, validate_rows
+from china_railway_tools.utils.schedule_cache import SCHEDULE_CACHE
+from china_railway_tools.utils.train_no_directory import TRAIN_NO_DIRECTORY
+from china_railway_tools.utils.upstream_scheduler import BACKGROUND, upstream_priority
 
 logger = logging.getLogger(__name__)
 
+# 车次首字符: 高铁/动车/城际/直达/特快/快速/旅游/市郊 以及纯数字的普速列车
+TRAIN_CODE_PREFIXES = ['G', 'D', 'C', 'Z', 'T', 'K', 'Y', 'S', *[str(x) for x in range(1, 10)]]
+
 
 async def get_station_by_name(name: str) -> Optional[Station]:
     async with AsyncSessionLocal() as session:
@@ -27,6 +38,8 @@ async def get_station_by_name(name: str) -> Optional[Station]:
 
 
 async def train_code2no(train_code: str, train_date: datetime = datetime.now()) -> Optional[str]:
+    if train_no := TRAIN_NO_DIRECTORY.get(train_code, train_date):
+        return train_no.train_no
     train_code_result = await query_train_no(train_code, train_date=train_date, exact=True)
     if len(train_code_result) == 0:
         return None
@@ -35,49 +48,125 @@ async def train_code2no(train_code: str, train_date: datetime = datetime.now())
 
 
 async def query_train_no(train_code: str, train_date: datetime = datetime.now(), **kwargs) -> List[TrainNo]:
+    if directory_result := TRAIN_NO_DIRECTORY.search(train_code, train_date, exact=kwargs.get('exact', True),
+                                                     limit=kwargs.get('limit', 200)):
+        return directory_result
     async with AsyncSessionLocal() as session:
-        stmt = select(MTrainNo).filter(and_(
+        stmt = select(*model_columns(MTrainNo, TrainNo)).filter(and_(
             MTrainNo.date == train_date.strftime('%Y-%m-%d'),
             MTrainNo.train_code == train_code if kwargs.get('exact', True)
             else MTrainNo.train_code.like(train_code + '%'))) \
             .order_by(func.length(MTrainNo.train_code), MTrainNo.train_code) \
             .limit(kwargs.get('limit', 200))
         _r = await session.execute(stmt)
-        _r = _r.scalars().all()
+        _r = _r.all()
 
     if len(_r) > 0:
-        return [TrainNo.model_validate(x) for x in _r]
+        return validate_rows(TrainNo, _r)
+    # 写后队列中尚未落库的车次
+    if pending := TRAIN_NO_WRITE_QUEUE.search(train_code, train_date.strftime('%Y-%m-%d'),
+                                              exact=kwargs.get('exact', True), limit=kwargs.get('limit', 200)):
+        return [TrainNo(id=None, **x) for x in pending]
 
     train_no_model_list = await fetch_train_no(train_code, train_date.strftime('%Y-%m-%d'), **kwargs)
-    _ = asyncio.create_task(batch_add_train_no(train_no_model_list, train_date))
+    TRAIN_NO_WRITE_QUEUE.put(train_no_model_list)
     train_no_list: List[TrainNo] = [TrainNo.model_validate(x) for x in train_no_model_list]
+    TRAIN_NO_DIRECTORY.add(train_date, train_no_list)
     return train_no_list
 
 
+async def load_train_no_directory(train_date: datetime = None, **kwargs) -> int:
+    """
+    批量加载某日的全部车次编号: 按车次前缀遍历搜索接口, 结果数达到单次返回上限时继续细分前缀.
+    结果写入 tb_train_no 并加载到内存目录, 之后 train_code2no/query_train_no 不再访问 SQLite
+    :return: 加载的车次数量
+    """
+    train_date = train_date or datetime.now()
+    date_str = train_date.strftime('%Y-%m-%d')
+    page_size = kwargs.get('page_size', get_config('train_no_sweep.page_size', 100))
+    max_prefix_length = kwargs.get('max_prefix_length', get_config('train_no_sweep.max_prefix_length', 4))
+    prefixes = kwargs.get('prefixes', get_config('train_no_sweep.prefixes', TRAIN_CODE_PREFIXES))
+    collected: Dict[str, MTrainNo] = {}
+
+    async def sweep(prefix: str):
+        try:
+            result = await fetch_train_no(prefix, date_str) or []
+        except Exception as e:
+            logger.warning(f'Failed to sweep train no prefix {prefix}: {extract_exception_traceback(e)}')
+            return
+        for x in result:
+            collected.setdefault(x.train_code, x)
+        if len(result) >= page_size and len(prefix) < max_prefix_length:
+            await asyncio.gather(*[sweep(f'{prefix}{x}') for x in range(10)])
+
+    # 批量加载不应挤占用户查询的额度
+    with upstream_priority(BACKGROUND):
+        await asyncio.gather(*[sweep(x) for x in prefixes])
+    train_no_model_list = list(collected.values())
+    if train_no_model_list:
+        await batch_add_train_no(train_no_model_list, train_date)
+    TRAIN_NO_DIRECTORY.load(train_date, [TrainNo.model_validate(x) for x in train_no_model_list])
+    logger.info(f'Train no directory of {date_str} loaded, total:{len(train_no_model_list)}')
+    return len(train_no_model_list)
+
+
+async def load_train_no_directory_from_db(train_date: datetime = None) -> int:
+    """
+    从 tb_train_no 加载某日已存储的车次编号到内存目录
+    """
+    train_date = train_date or datetime.now()
+    async with AsyncSessionLocal() as session:
+        stmt = select(*model_columns(MTrainNo, TrainNo)).filter(MTrainNo.date == train_date.strftime('%Y-%m-%d'))
+        _r = await session.execute(stmt)
+        train_no_list = validate_rows(TrainNo, _r.all())
+    TRAIN_NO_DIRECTORY.load(train_date, train_no_list)
+    return len(train_no_list)
+
+
 async def get_station_by_names(names: List[str]) -> List[Station]:
     async with AsyncSessionLocal() as session:
-        stmt = select(MStation).filter(MStation.name.in_(names))
+        stmt = select(*model_columns(MStation, Station)).filter(MStation.name.in_(names))
         result = await session.execute(stmt)
-        stations = result.scalars().all()
-        stations = [Station.model_validate(x) for x in stations]
+        stations = validate_rows(Station, result.all())
         return stations
 
 
 async def get_station(code_or_name: str) -> Optional[Station]:
     async with AsyncSessionLocal() as session:
-        stmt = select(MStation).where(or_(MStation.code == code_or_name, MStation.name == code_or_name))
+        stmt = select(*model_columns(MStation, Station)) \
+            .where(or_(MStation.code == code_or_name, MStation.name == code_or_name))
         result = await session.execute(stmt)
-        if r := result.scalars().one_or_none():
-            return Station.model_validate(r)
+        if r := result.one_or_none():
+            return validate_rows(Station, [r])[0]
 
 
-@complete_train_no(train_code2no=train_code2no)
 async def query_train_schedule(form: QueryTrainSchedule) -> Optional[TrainSchedule]:
+    """
+    查询时刻表, 依次查询内存缓存、SQLite 缓存和 12306
+    """
+    train_date = form.train_date.strftime('%Y-%m-%d')
+    found, train_schedule = SCHEDULE_CACHE.get(train_date, train_no=form.train_no, train_code=form.train_code)
+    if found:
+        return train_schedule
+    train_schedule = await query_stored_train_schedule(form)
+    # complete_train_no 已补全 form.train_no
+    SCHEDULE_CACHE.set(train_date, form.train_no, train_schedule, train_code=form.train_code)
+    return train_schedule
+
+
+@complete_train_no(train_code2no=train_code2no)
+async def query_stored_train_schedule(form: QueryTrainSchedule) -> Optional[TrainSchedule]:
     query_key = form.train_code if form.train_code is not None else form.train_no
     category = 'train_schedule'
 
     async def empty_cb():
-        return await fetch_train_schedule(form)
+        _train_schedule = await fetch_train_schedule(form)
+        if _train_schedule:
+            try:
+                await save_stop_times(_train_schedule)
+            except Exception as e:
+                logger.warning(f'Failed to save stop times of {form.train_no}: {extract_exception_traceback(e)}')
+        return _train_schedule
 
     train_schedule: TrainSchedule = await query_cached_result(query_key=query_key, category=category, empty_cb=empty_cb,
                                                               _date=form.train_date, pydantic_class=TrainSchedule)
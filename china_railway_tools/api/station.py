@@ -1,11 +1,39 @@
+import logging
 import re
-from typing import List
+from typing import List, Callable
 
 from sqlalchemy import or_, select, asc
 
 from china_railway_tools.database.connection import AsyncSessionLocal
 from china_railway_tools.database.schema import MStation
-from china_railway_tools.schemas.station import Station
+from china_railway_tools.schemas.station import Station, StationChanges
+from china_railway_tools.utils.exception_utils import extract_exception_traceback
+from china_railway_tools.utils.fast_models import model_columns, validate_rows
+
+logger = logging.getLogger(__name__)
+
+_station_observers: List[Callable[[StationChanges], None]] = []
+
+
+def add_station_observer(observer: Callable[[StationChanges], None]):
+    """
+    车站表更新后调用 observer(changes), 用于增量刷新内存中的车站索引
+    """
+    if observer not in _station_observers:
+        _station_observers.append(observer)
+
+
+def remove_station_observer(observer: Callable[[StationChanges], None]):
+    if observer in _station_observers:
+        _station_observers.remove(observer)
+
+
+def notify_station_changes(changes: StationChanges):
+    for observer in _station_observers:
+        try:
+            observer(changes)
+        except Exception as e:
+            logger.warning(f'Station observer failed: {extract_exception_traceback(e)}')
 
 
 async def query_station(keyword: str, **kwargs) -> List[Station]:
@@ -13,16 +41,17 @@ async def query_station(keyword: str, **kwargs) -> List[Station]:
     if keyword == '':
         return []
     limit = min(kwargs.get('limit', 500), 500)
+    columns = model_columns(MStation, Station)
     async with AsyncSessionLocal() as session:
         if kwargs.get('exact', False):
-            stmt = select(MStation).where(or_(
+            stmt = select(*columns).where(or_(
                 MStation.name == keyword,
                 MStation.code == keyword,
             ))
         else:
             # 根据英文名(拼音)查询
             if re.match(r'^[a-zA-Z]+', keyword):
-                stmt = select(MStation).where(
+                stmt = select(*columns).where(
                     or_(
                         MStation.pinyin.like(f'%{keyword}%'),
                         MStation.pinyin_abbr.like(f'%{keyword}%')
@@ -31,7 +60,7 @@ async def query_station(keyword: str, **kwargs) -> List[Station]:
 
             # 根据城市或者站名查询
             else:
-                stmt = select(MStation).where(
+                stmt = select(*columns).where(
                     or_(
                         MStation.city.startswith(keyword),
                         MStation.name.like(f'%{keyword}%')
@@ -39,6 +68,5 @@ async def query_station(keyword: str, **kwargs) -> List[Station]:
                 )
         stmt = stmt.order_by(asc(MStation.name)).limit(limit)
         result = await session.execute(stmt)
-        station_models = result.scalars().all()
-        stations: List[Station] = [Station.model_validate(x) for x in station_models]
+        stations: List[Station] = validate_rows(Station, result.all())
         return stations
@@ -1,15 +1,24 @@
 import asyncio
 import logging
+from typing import AsyncIterator
+from weakref import WeakKeyDictionary
 
-from china_railway_tools.api.common import get_station, get_station_by_names, query_train_schedule
+from china_railway_tools.api.common import get_station, get_station_by_names, query_train_schedule, train_code2no
+from china_railway_tools.config import get_config
+from china_railway_tools.database.curd import query_stop_names, query_cached_results
 from china_railway_tools.schemas.query import *
 from china_railway_tools.schemas.response import TrainTicketResponse
 from china_railway_tools.schemas.station import Station
 from china_railway_tools.schemas.train import *
-from china_railway_tools.utils.DataStore import DataStore
-from china_railway_tools.utils.cr_fetcher import fetch_trains
+from china_railway_tools.utils.circuit_breaker import FetchRejectedError
+from china_railway_tools.utils.cr_fetcher import fetch_train_stocks
 from china_railway_tools.utils.cr_utils import train_data_filter, filter_trains
 from china_railway_tools.utils.decorators import validate_query_train
+from china_railway_tools.utils.metrics import inc, span, timed, record_cache
+from china_railway_tools.utils.prefetcher import PrefetchScheduler, notify_query
+from china_railway_tools.utils.schedule_cache import SCHEDULE_CACHE
+from china_railway_tools.utils.shared_cache import SharedCache, get_cache
+from china_railway_tools.utils.ticket_watcher import ChangeCallback, TicketSubscription, TicketWatcher
 
 logger = logging.getLogger(__name__)
 
@@ -45,8 +54,9 @@ def divide_trip(train_schedule: TrainSchedule, form: QueryTrainTicket):
     if form.partition >= len(stations) - 1:
         return [x.station_name for x in stations[1:-1]]
 
-    durations = [stations[index + 1].get_arr_time_in_minute() - x.get_dep_time_in_minute() for index, x in
-                 enumerate(stations[0:-1])]
+    compact = train_schedule.compact()
+    from_index = compact.get_index(form.from_station_name, fuzzy=False) or 0
+    durations = [compact.get_duration(index, index + 1) for index in range(from_index, from_index + len(stations) - 1)]
     partitions = partition_array(durations, form.partition)
     break_points = [stations[x[1]].station_name for x in partitions[0:-1]]
     logger.info(f'{form.from_station_name}-{form.to_station_name}: Transfer stations: {','.join(break_points)}')
@@ -91,11 +101,16 @@ async def query_train_prices(form: QueryTrainTicket) -> TrainTicketResponse:
         raise Exception(
             f'Query station result is not matched station names. Station names:{station_names} Result:{stations}')
     stations = [next((obj for obj in stations if obj.name == name), None) for name in station_names]
+    compact = train_schedule.compact()
 
     async def ticket_task(_station: Station, _next_station: Station):
-        dep_stop_info = train_schedule.get_stop_info(_station.name)
+        index = compact.get_index(_station.name)
+        if index is None:
+            logger.warning(f'{_station.name} is not a stop of train {form.train_no}, skip')
+            return None
+        dep_day_diff = compact.get_dep_day_diff(index)
         q_ticket = QueryTrains(from_station_code=_station.code, to_station_code=_next_station.code,
-                               dep_date=train_date + timedelta(days=dep_stop_info.get_dep_day_diff()), )
+                               dep_date=train_date + timedelta(days=dep_day_diff), )
         train_info_list = await query_tickets(q_ticket)
         train_info_list = list(
             filter(lambda x: train_data_filter(x, from_code=_station.code, to_code=_next_station.code,
@@ -103,7 +118,8 @@ async def query_train_prices(form: QueryTrainTicket) -> TrainTicketResponse:
         if len(train_info_list) != 1:
             logger.warning(f'{_station}-{_next_station} ticket result is not expected, expect only one train')
             return None
-        train_info: TrainInfo = train_info_list[0]
+        # 余票结果会被缓存, 复制后再修改
+        train_info: TrainInfo = train_info_list[0].model_copy()
         train_info.from_stop_info = train_schedule.get_stop_info(_station.name)
         train_info.to_stop_info = train_schedule.get_stop_info(_next_station.name)
         return train_info
@@ -127,43 +143,272 @@ async def query_train_prices(form: QueryTrainTicket) -> TrainTicketResponse:
     return response
 
 
+@timed('query_tickets')
 @validate_query_train(get_station=get_station)
 async def query_tickets(form: QueryTrains, **kwargs) -> List[TrainInfo]:
-    ds = DataStore()
+    cache = get_cache()
     dep_date_str = form.dep_date.strftime('%Y-%m-%d')
-    train_info_list: List[TrainInfo] = []
+    # 缓存中只保存各席位余票, 车次静态信息在多次查询间共享
+    train_stocks: TrainStocks | None = None
     query_key = f'{form.from_station_code}-{form.to_station_code}-{dep_date_str}'
+    cache_key = f'tickets.{query_key}'
+    cache_ttl = kwargs.get('cache_ttl', get_config('ticket_cache_seconds', 60))
 
     if not form.force_update:
-        train_info_list = ds.get(query_key)
+        train_stocks = cache.get(cache_key)
+    if not kwargs.get('prefetch', False):
+        notify_query(query_key, hit=train_stocks is not None)
+        record_cache('tickets', train_stocks is not None)
 
-    if train_info_list is None:
-        train_info_list = await fetch_trains(form)
-    elif isinstance(train_info_list, List) and len(train_info_list) == 0:
+    if train_stocks is None:
+        stale_key = f'tickets_stale.{query_key}'
+        try:
+            if isinstance(cache, SharedCache):
+                # 多进程共享缓存: 同一线路只由一个进程请求
+                train_stocks = await cache.get_or_fetch(cache_key, lambda: fetch_train_stocks(form),
+                                                        ttl_seconds=cache_ttl, empty_ttl_seconds=300,
+                                                        force=form.force_update)
+            else:
+                train_stocks = await fetch_train_stocks(form)
+                if train_stocks:
+                    cache.set(train_stocks, cache_key, cache_ttl)
+        except FetchRejectedError as e:
+            # 12306 熔断或排队已满时返回过期的结果
+            train_stocks = cache.get(stale_key)
+            if train_stocks is None:
+                raise
+            logger.warning(f'{e}, serving stale tickets of {query_key}')
+            inc('stale_served', cache='tickets')
+        else:
+            if train_stocks:
+                cache.set(train_stocks, stale_key, get_config('circuit_breaker.stale_ttl', 1800))
+    elif len(train_stocks) == 0:
         return []
 
-    if not train_info_list:
-        ds.set([], query_key, 300)
+    if not train_stocks:
+        cache.set(TrainStocks(), cache_key, 300)
         return []
+    # 筛选只用到车次静态信息, 只为筛选后的车次填入余票
+    static_trains: List[TrainInfo] = train_stocks.static_trains()
 
-    filtered_trains: List[TrainInfo] = filter_trains(form, train_info_list)
+    with span('filter_trains'):
+        filtered_trains: List[TrainInfo] = train_stocks.select(filter_trains(form, static_trains))
 
     # 筛选必须经过的车站
     if form.via_station:
-        query_to_via_station_form = form.model_copy()
-        query_to_via_station_form.via_station = None
-        query_to_via_station_form.to_station_name = form.via_station
-        query_to_via_station_form.to_station_code = None
-        target_stations = [form.via_station]
-        if form.exact:
-            target_stations.append(form.from_station_name)
-        query_to_via_station_form.stations = target_stations
-
-        via_result = await query_tickets(query_to_via_station_form)
-        if via_result:
-            via_codes = [x.train_code for x in via_result]
-            form.train_codes = via_codes
-            filtered_trains: List[TrainInfo] = filter_trains(form, train_info_list)
+        via_strategy = get_config('via_strategy', 'schedule')
+        with span('via_station', strategy=via_strategy):
+            if via_strategy == 'schedule':
+                filtered_trains = await filter_trains_via_station(form, filtered_trains)
+            else:
+                via_codes = await query_via_train_codes(form)
+                if via_codes:
+                    form.train_codes = via_codes
+                    filtered_trains = train_stocks.select(filter_trains(form, static_trains))
 
     filtered_trains = sorted(filtered_trains, key=lambda x: x.from_stop_info.dep_time if x.from_stop_info else None)
     return filtered_trains
+
+
+def match_via_stations(stop_names: Set[str], via_and: Set[str], via_or: Set[str]) -> bool:
+    """
+    :param stop_names: 时刻表的全部经停站名
+    """
+    if via_and and not via_and <= stop_names:
+        return False
+    return not via_or or not via_or.isdisjoint(stop_names)
+
+
+async def resolve_schedule_trains(form: QueryTrainSchedules) -> List[tuple[str, str]]:
+    """
+    查询 form 对应的车次
+    :return: 去重后的 [(train_no, train_date)], train_date 为始发日期 %Y-%m-%d
+    """
+    if form.train_condition is not None:
+        condition = form.train_condition.model_copy()
+        if form.train_codes and not condition.train_codes:
+            condition.train_codes = form.train_codes
+        trains = await query_tickets(condition)
+        keys = [(x.train_no, x.train_date) for x in trains]
+    else:
+        train_date = form.train_date.strftime('%Y-%m-%d')
+        train_codes = list(dict.fromkeys(form.train_codes))
+        train_nos = await asyncio.gather(*[train_code2no(x, form.train_date) for x in train_codes])
+        keys = [(x, train_date) for x in train_nos if x]
+    return list(dict.fromkeys(keys))
+
+
+async def query_train_schedules(form: QueryTrainSchedules) -> AsyncIterator[TrainSchedule]:
+    """
+    批量查询时刻表, 按查询完成的顺序返回经停站满足 via_stations_and/via_stations_or 的时刻表:
+
+        async for train_schedule in query_train_schedules(form):
+            ...
+    """
+    via_and, via_or = set(form.via_stations_and), set(form.via_stations_or)
+    train_keys = await resolve_schedule_trains(form)
+    async for _, train_schedule in iter_train_schedules(train_keys, via_and, via_or):
+        if train_schedule is not None and match_via_stations(set(train_schedule.name_index), via_and, via_or):
+            yield train_schedule
+
+
+ScheduleResult = tuple[tuple[str, str], Optional[TrainSchedule]]
+
+
+async def iter_train_schedules(train_keys: List[tuple[str, str]], via_and: Set[str] = None,
+                               via_or: Set[str] = None) -> AsyncIterator[ScheduleResult]:
+    """
+    批量查询 [(train_no, train_date)] 的时刻表, 按查询完成的顺序返回 ((train_no, train_date), 时刻表),
+    查询不到或查询失败时时刻表为 None.
+    内存中缓存的时刻表直接使用, 其余按日期批量读取 SQLite 缓存; 传入 via_and/via_or 时,
+    已存储经停站且不满足条件的车次不再查询, 也不返回; 其余车次并发查询, 并发数不超过 train_schedules.concurrency
+    """
+    via_and, via_or = via_and or set(), via_or or set()
+    train_keys = list(dict.fromkeys(train_keys))
+    cached: Dict[tuple[str, str], Optional[TrainSchedule]] = {}
+    for train_no, train_date in train_keys:
+        found, train_schedule = SCHEDULE_CACHE.get(train_date, train_no=train_no)
+        if found:
+            cached[(train_no, train_date)] = train_schedule
+    uncached = [x for x in train_keys if x not in cached]
+    for train_date in dict.fromkeys(x[1] for x in uncached):
+        results = await query_cached_results([x[0] for x in uncached if x[1] == train_date], 'train_schedule',
+                                             _date=train_date, pydantic_class=TrainSchedule)
+        for train_no, train_schedule in results.items():
+            SCHEDULE_CACHE.set(train_date, train_no, train_schedule)
+            cached[(train_no, train_date)] = train_schedule
+    missing = [x for x in train_keys if x not in cached]
+    if missing and (via_and or via_or):
+        stop_names = await query_stop_names(missing)
+        missing = [x for x in missing
+                   if x not in stop_names or match_via_stations(set(stop_names[x]), via_and, via_or)]
+
+    for key in train_keys:
+        if key in cached:
+            yield key, cached[key]
+    if not missing:
+        return
+
+    semaphore = asyncio.Semaphore(get_config('train_schedules.concurrency', 8))
+
+    async def fetch(train_no: str, train_date: str) -> ScheduleResult:
+        async with semaphore:
+            try:
+                return (train_no, train_date), await query_train_schedule(
+                    QueryTrainSchedule(train_no=train_no, train_date=datetime.strptime(train_date, '%Y-%m-%d')))
+            except Exception as e:
+                logger.warning(f'Failed to query train schedule of {train_no}: {e}')
+                return (train_no, train_date), None
+
+    tasks = [asyncio.create_task(fetch(*x)) for x in missing]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        # 调用方提前退出迭代时取消未完成的查询
+        for task in tasks:
+            task.cancel()
+
+
+def create_prefetch_scheduler(routes: List[tuple[str, str]] = None, **kwargs) -> PrefetchScheduler:
+    """
+    创建热门线路预取任务, 调用 start() 后在后台运行
+    :param routes: 线路列表, 如 [('广州南', '南京南')], 为空时从 query_tickets 的查询记录学习
+    """
+    return PrefetchScheduler(query_tickets, routes=routes, **kwargs)
+
+
+def create_ticket_watcher(**kwargs) -> TicketWatcher:
+    """
+    创建余票订阅, 参数见 TicketWatcher
+    """
+    return TicketWatcher(query_tickets, get_station, **kwargs)
+
+
+# 每个事件循环一个默认的余票订阅, 使同一线路的订阅合并轮询
+_ticket_watchers: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def get_ticket_watcher() -> TicketWatcher:
+    loop = asyncio.get_running_loop()
+    watcher = _ticket_watchers.get(loop)
+    if watcher is None:
+        watcher = _ticket_watchers[loop] = create_ticket_watcher()
+    return watcher
+
+
+async def watch_tickets(form: QueryTrains, callback: ChangeCallback = None) -> TicketSubscription:
+    """
+    订阅余票变化, 有变化时调用 callback(TicketChanges); callback 为空时返回的订阅可用 async for 迭代.
+    调用返回值的 cancel() 取消订阅
+    """
+    return await get_ticket_watcher().watch(form, callback)
+
+
+async def query_via_train_codes(form: QueryTrains) -> List[str]:
+    """
+    查询出发站到途经站的车次, 返回车次号
+    """
+    query_to_via_station_form = form.model_copy()
+    query_to_via_station_form.via_station = None
+    query_to_via_station_form.to_station_name = form.via_station
+    query_to_via_station_form.to_station_code = None
+    target_stations = [form.via_station]
+    if form.exact:
+        target_stations.append(form.from_station_name)
+    query_to_via_station_form.stations = target_stations
+
+    via_result = await query_tickets(query_to_via_station_form)
+    return [x.train_code for x in via_result or []]
+
+
+def is_via_station(stop_names: List[str], from_station: str, to_station: str, via_station: str) -> bool | None:
+    """
+    :return: 时刻表中 from_station 与 to_station 之间是否经停 via_station, 无法判断时返回None
+    """
+    try:
+        from_index = stop_names.index(from_station)
+        to_index = stop_names.index(to_station, from_index)
+    except ValueError:
+        return None
+    return via_station in stop_names[from_index + 1:to_index]
+
+
+async def filter_trains_via_station(form: QueryTrains, trains: List[TrainInfo]) -> List[TrainInfo]:
+    """
+    使用时刻表筛选途经 form.via_station 的车次: 先读取已存储的经停站, 其余车次批量查询时刻表,
+    只有时刻表查询失败的车次才查询出发站到途经站的余票
+    """
+    stop_names = await query_stop_names([(x.train_no, x.train_date) for x in trains])
+    matched: List[TrainInfo] = []
+    unknown: List[TrainInfo] = []
+    for train in trains:
+        names = stop_names.get((train.train_no, train.train_date))
+        via = is_via_station(names, train.from_station, train.to_station, form.via_station) if names else None
+        if via is None:
+            unknown.append(train)
+        elif via:
+            matched.append(train)
+
+    if unknown:
+        # 批量查询未存储的时刻表(按 train_no, train_date 去重), 仍无法判断的车次才查询出发站到途经站的余票
+        train_keys = [(x.train_no, x.train_date) for x in unknown]
+        schedules = {key: x async for key, x in iter_train_schedules(train_keys)}
+        still_unknown: List[TrainInfo] = []
+        for train in unknown:
+            train_schedule = schedules.get((train.train_no, train.train_date))
+            names = [x.station_name for x in train_schedule.schedule] if train_schedule else None
+            via = is_via_station(names, train.from_station, train.to_station, form.via_station) if names else None
+            if via is None:
+                still_unknown.append(train)
+            elif via:
+                matched.append(train)
+        unknown = still_unknown
+
+    if unknown:
+        logger.debug(f'{len(unknown)} trains have no schedule, querying via station {form.via_station}')
+        via_codes = set(await query_via_train_codes(form))
+        if via_codes:
+            unknown = [x for x in unknown if x.train_code in via_codes]
+        matched.extend(unknown)
+    return matched
@@ -28,11 +28,15 @@ def get_config(key: str, default=None):
     return current
 
 
-def get_default_db_url():
-    sqlite_dir = get_config("sqlite_dir")
+def get_data_dir():
+    sqlite_dir = get_config("sqlite_dir") or os.environ.get('CR_TOOLS_SQLITE_DIR')
     if not sqlite_dir:
         sqlite_dir = user_data_dir(APP_NAME, APP_AUTHOR)
-    db_path = os.path.join(sqlite_dir, 'data.db')
-    if not os.path.exists(os.path.dirname(db_path)):
-        os.makedirs(os.path.dirname(db_path))
+    if not os.path.exists(sqlite_dir):
+        os.makedirs(sqlite_dir)
+    return sqlite_dir
+
+
+def get_default_db_url():
+    db_path = os.path.join(get_data_dir(), 'data.db')
     return f"sqlite:///{db_path}"
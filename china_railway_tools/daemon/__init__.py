@@ -0,0 +1,8 @@
+"""
+守护进程模式: 一个常驻进程通过本地 HTTP 或 Unix socket 提供 api 函数, 多个进程共享 cookie、连接池、余票缓存与并发限制.
+
+    python -m china_railway_tools.daemon --unix-socket /tmp/cr_tools.sock
+
+客户端进程设置环境变量 CR_TOOLS_DAEMON=unix:/tmp/cr_tools.sock (或 http://127.0.0.1:8306),
+导入时不再初始化, 使用 china_railway_tools.daemon.client 中同名同参数的函数
+"""
@@ -0,0 +1,5 @@
+import sys
+
+from china_railway_tools.daemon.server import main
+
+sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+守护进程的客户端, 函数与 china_railway_tools.api 中的同名函数参数和返回值一致.
+地址取自环境变量 CR_TOOLS_DAEMON, 如 unix:/tmp/cr_tools.sock 或 http://127.0.0.1:8306
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Any, List, Optional
+from weakref import WeakKeyDictionary
+
+import asyncio
+import httpx
+
+from china_railway_tools.daemon.protocol import DEFAULT_PORT, dump_arg, get_return_adapter
+from china_railway_tools.schemas.query import QueryTrains, QueryTrainSchedule, QueryTrainTicket
+from china_railway_tools.schemas.response import TrainTicketResponse
+from china_railway_tools.schemas.station import Station
+from china_railway_tools.schemas.train import TrainInfo, TrainSchedule, TrainNo
+from china_railway_tools.utils.serialization_utils import get_serializer
+
+
+class DaemonError(Exception):
+    def __init__(self, status_code: int, error: str, message: str):
+        super().__init__(f'{error}: {message}')
+        self.status_code = status_code
+        self.error = error
+        self.message = message
+
+
+class DaemonClient:
+    def __init__(self, address: str = None, timeout: float = 60):
+        """
+        :param address: unix:/path/to.sock 或 http://host:port, 默认取环境变量 CR_TOOLS_DAEMON
+        """
+        address = address or os.environ.get('CR_TOOLS_DAEMON') or f'http://127.0.0.1:{DEFAULT_PORT}'
+        self.address = address
+        self.timeout = timeout
+        if address.startswith('unix:'):
+            self.uds = address.removeprefix('unix:')
+            self.base_url = 'http://cr-tools-daemon'
+        else:
+            self.uds = None
+            self.base_url = address.rstrip('/')
+        # httpx.AsyncClient 不能跨事件循环使用, 每个事件循环一个
+        self._clients: WeakKeyDictionary = WeakKeyDictionary()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            transport = httpx.AsyncHTTPTransport(uds=self.uds) if self.uds else None
+            client = self._clients[loop] = httpx.AsyncClient(base_url=self.base_url, transport=transport,
+                                                             timeout=self.timeout)
+        return client
+
+    async def call(self, name: str, *args, **kwargs) -> Any:
+        payload = {'args': [dump_arg(x) for x in args], 'kwargs': {k: dump_arg(v) for k, v in kwargs.items()}}
+        response = await self._get_client().post(f'/api/{name}', content=get_serializer().dumps(payload),
+                                                 headers={'Content-Type': 'application/json'})
+        if response.status_code != 200:
+            try:
+                error = response.json()
+            except ValueError:
+                error = {'error': 'HTTPError', 'message': response.text}
+            raise DaemonError(response.status_code, error.get('error'), error.get('message'))
+        return get_return_adapter(name).validate_json(response.content)
+
+    async def aclose(self):
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def query_tickets(self, form: QueryTrains, **kwargs) -> List[TrainInfo]:
+        return await self.call('query_tickets', form, **kwargs)
+
+    async def query_train_prices(self, form: QueryTrainTicket) -> TrainTicketResponse:
+        return await self.call('query_train_prices', form)
+
+    async def query_train_schedule(self, form: QueryTrainSchedule) -> Optional[TrainSchedule]:
+        return await self.call('query_train_schedule', form)
+
+    async def query_station(self, keyword: str, **kwargs) -> List[Station]:
+        return await self.call('query_station', keyword, **kwargs)
+
+    async def get_station(self, code_or_name: str) -> Optional[Station]:
+        return await self.call('get_station', code_or_name)
+
+    async def get_station_by_names(self, names: List[str]) -> List[Station]:
+        return await self.call('get_station_by_names', names)
+
+    async def query_train_no(self, train_code: str, train_date: datetime = None, **kwargs) -> List[TrainNo]:
+        return await self.call('query_train_no', train_code, train_date or datetime.now(), **kwargs)
+
+    async def train_code2no(self, train_code: str, train_date: datetime = None) -> Optional[str]:
+        return await self.call('train_code2no', train_code, train_date or datetime.now())
+
+
+_default_client: Optional[DaemonClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_daemon_client() -> DaemonClient:
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = DaemonClient()
+        return _default_client
+
+
+async def query_tickets(form: QueryTrains, **kwargs) -> List[TrainInfo]:
+    return await get_daemon_client().query_tickets(form, **kwargs)
+
+
+async def query_train_prices(form: QueryTrainTicket) -> TrainTicketResponse:
+    return await get_daemon_client().query_train_prices(form)
+
+
+async def query_train_schedule(form: QueryTrainSchedule) -> Optional[TrainSchedule]:
+    return await get_daemon_client().query_train_schedule(form)
+
+
+async def query_station(keyword: str, **kwargs) -> List[Station]:
+    return await get_daemon_client().query_station(keyword, **kwargs)
+
+
+async def get_station(code_or_name: str) -> Optional[Station]:
+    return await get_daemon_client().get_station(code_or_name)
+
+
+async def get_station_by_names(names: List[str]) -> List[Station]:
+    return await get_daemon_client().get_station_by_names(names)
+
+
+async def query_train_no(train_code: str, train_date: datetime = None, **kwargs) -> List[TrainNo]:
+    return await get_daemon_client().query_train_no(train_code, train_date, **kwargs)
+
+
+async def train_code2no(train_code: str, train_date: datetime = None) -> Optional[str]:
+    return await get_daemon_client().train_code2no(train_code, train_date)
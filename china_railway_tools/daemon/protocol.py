@@ -0,0 +1,38 @@
+from typing import List, Optional, Any, Dict
+
+from pydantic import BaseModel, TypeAdapter
+
+from china_railway_tools.schemas.response import TrainTicketResponse
+from china_railway_tools.schemas.station import Station
+from china_railway_tools.schemas.train import TrainInfo, TrainSchedule, TrainNo
+
+DEFAULT_PORT = 8306
+
+# 守护进程提供的函数及返回类型, 客户端据此还原结果
+RETURN_TYPES: Dict[str, Any] = {
+    'query_tickets': List[TrainInfo],
+    'query_train_prices': TrainTicketResponse,
+    'query_train_schedule': Optional[TrainSchedule],
+    'query_station': List[Station],
+    'get_station': Optional[Station],
+    'get_station_by_names': List[Station],
+    'query_train_no': List[TrainNo],
+    'train_code2no': Optional[str],
+}
+
+_adapters: Dict[str, TypeAdapter] = {name: TypeAdapter(x) for name, x in RETURN_TYPES.items()}
+
+
+def get_return_adapter(name: str) -> TypeAdapter:
+    return _adapters[name]
+
+
+def dump_result(name: str, result: Any) -> bytes:
+    # 模型中有默认值为 None 但类型不允许 None 的字段, 省略默认值使客户端能够重新校验
+    return _adapters[name].dump_json(result, exclude_defaults=True)
+
+
+def dump_arg(arg: Any) -> Any:
+    if isinstance(arg, BaseModel):
+        return arg.model_dump(mode='json', warnings=False)
+    return arg
@@ -0,0 +1,180 @@
+import argparse
+import inspect
+import json
+import logging
+import os
+import socketserver
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
+
+from pydantic import TypeAdapter, ValidationError
+
+from china_railway_tools.api.common import query_train_schedule, get_station, get_station_by_names, \
+    query_train_no, train_code2no
+from china_railway_tools.api.station import query_station
+from china_railway_tools.api.train import query_tickets, query_train_prices
+from china_railway_tools.daemon.protocol import DEFAULT_PORT, RETURN_TYPES, dump_result
+from china_railway_tools.sync_client import SyncClient, get_sync_client
+from china_railway_tools.utils.exception_utils import extract_exception_traceback
+
+logger = logging.getLogger(__name__)
+
+DAEMON_FUNCTIONS: Dict[str, Callable] = {
+    'query_tickets': query_tickets,
+    'query_train_prices': query_train_prices,
+    'query_train_schedule': query_train_schedule,
+    'query_station': query_station,
+    'get_station': get_station,
+    'get_station_by_names': get_station_by_names,
+    'query_train_no': query_train_no,
+    'train_code2no': train_code2no,
+}
+assert DAEMON_FUNCTIONS.keys() == RETURN_TYPES.keys()
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class RemoteFunction:
+    """
+    按函数签名把 JSON 参数还原为对应类型(如 QueryTrains)后调用
+    """
+
+    def __init__(self, func: Callable):
+        self.func = func
+        self.signature = inspect.signature(func)
+        self.adapters: Dict[str, TypeAdapter] = {
+            name: TypeAdapter(param.annotation) for name, param in self.signature.parameters.items()
+            if param.annotation is not inspect.Parameter.empty
+            and param.kind not in (inspect.Parameter.VAR_KEYWORD, inspect.Parameter.VAR_POSITIONAL)
+        }
+
+    def bind(self, args: list, kwargs: dict):
+        bound = self.signature.bind(*args, **kwargs)
+        for name, value in bound.arguments.items():
+            if name in self.adapters:
+                bound.arguments[name] = self.adapters[name].validate_python(value)
+        return bound
+
+    def __call__(self, args: list, kwargs: dict):
+        bound = self.bind(args, kwargs)
+        return self.func(*bound.args, **bound.kwargs)
+
+
+REMOTE_FUNCTIONS: Dict[str, RemoteFunction] = {name: RemoteFunction(x) for name, x in DAEMON_FUNCTIONS.items()}
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /api/<函数名>  body: {"args": [...], "kwargs": {...}}  返回函数结果的 JSON
+    GET /health
+    """
+    protocol_version = 'HTTP/1.1'
+    server_version = 'cr_tools_daemon'
+
+    @property
+    def sync_client(self) -> SyncClient:
+        return self.server.sync_client
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, b'{"status":"ok"}')
+        else:
+            self.send_error_json(404, 'NotFound', self.path)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self.send_error_json(413, 'PayloadTooLarge', f'body exceeds {MAX_BODY_BYTES} bytes')
+            return
+        # 先读完请求体, 保证长连接上的下一个请求不受影响
+        body = self.rfile.read(length)
+        name = self.path.removeprefix('/api/')
+        remote_function = REMOTE_FUNCTIONS.get(name)
+        if remote_function is None or not self.path.startswith('/api/'):
+            self.send_error_json(404, 'NotFound', f'Unknown function: {self.path}')
+            return
+        try:
+            payload = json.loads(body or b'{}')
+            coro = remote_function(payload.get('args') or [], payload.get('kwargs') or {})
+        except (ValueError, TypeError, ValidationError) as e:
+            self.send_error_json(400, type(e).__name__, str(e))
+            return
+        try:
+            result = self.sync_client.run(coro)
+            body = dump_result(name, result)
+        except Exception as e:
+            logger.warning(f'Daemon call {name} failed: {extract_exception_traceback(e)}')
+            self.send_error_json(500, type(e).__name__, str(e))
+            return
+        self.send_json(200, body)
+
+    def send_json(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, error: str, message: str):
+        self.send_json(status, json.dumps({'error': error, 'message': message}, ensure_ascii=False).encode())
+
+    def address_string(self):
+        # Unix socket 的 client_address 为空字符串
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class DaemonHTTPServer(ThreadingHTTPServer):
+    def __init__(self, server_address, sync_client: SyncClient):
+        self.sync_client = sync_client
+        super().__init__(server_address, DaemonRequestHandler)
+
+
+class DaemonUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, sync_client: SyncClient):
+        self.sync_client = sync_client
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, DaemonRequestHandler)
+
+
+def create_server(host: str = '127.0.0.1', port: int = DEFAULT_PORT, unix_socket: str = None,
+                  sync_client: SyncClient = None) -> DaemonHTTPServer | DaemonUnixServer:
+    """
+    创建守护进程服务, 调用 serve_forever() 开始处理请求; 所有请求在同一个 SyncClient 的事件循环中执行
+    """
+    sync_client = sync_client or get_sync_client()
+    if unix_socket:
+        return DaemonUnixServer(unix_socket, sync_client)
+    return DaemonHTTPServer((host, port), sync_client)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='china_railway_tools query daemon')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix-socket', default=None, help='监听 Unix socket 路径, 指定后忽略 host/port')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    sync_client = SyncClient(init=bool(os.environ.get('CR_TOOLS_SKIP_INIT')))
+    server = create_server(args.host, args.port, args.unix_socket, sync_client=sync_client.start())
+    logger.info(f'china_railway_tools daemon listening on {args.unix_socket or f"{args.host}:{args.port}"}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        sync_client.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
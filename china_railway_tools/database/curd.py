@@ -1,40 +1,59 @@
 import json
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Dict
 
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, insert, delete
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import aliased
 
 from china_railway_tools.database.connection import AsyncSessionLocal
-from china_railway_tools.database.schema import MTrainNo, QueryResult
+from china_railway_tools.database.partitions import get_partition_table, ensure_partition, forget_partition
+from china_railway_tools.database.schema import MTrainNo, MStopTime
+from china_railway_tools.schemas.train import TrainSchedule, StopInfo
 from china_railway_tools.utils.decorators import validate_date_param
-from china_railway_tools.utils.serialization_utils import to_json, to_obj
+from china_railway_tools.utils.metrics import inc, record_cache
+from china_railway_tools.utils.serialization_utils import to_json_bytes, to_obj
+
+# 旧版本 SQLite 单条语句最多 999 个参数
+IN_CLAUSE_CHUNK_SIZE = 500
 
 
 async def batch_add_train_no(train_no_list: List[MTrainNo], train_date: datetime):
-    train_codes = {x.train_code for x in train_no_list}
+    await insert_or_ignore_train_no([
+        {'date': train_date.strftime('%Y-%m-%d'), 'train_no': x.train_no, 'train_code': x.train_code,
+         'from_station': x.from_station, 'to_station': x.to_station}
+        for x in train_no_list])
+
+
+async def insert_or_ignore_train_no(rows: List[dict]):
+    """
+    在一个事务中写入车次编号, (date, train_code) 已存在的行忽略
+    """
+    if not rows:
+        return
     async with AsyncSessionLocal() as session:
-        stmt = select(MTrainNo).filter(and_(
-            MTrainNo.date == train_date.strftime('%Y-%m-%d'),
-            MTrainNo.train_code.in_(train_codes)))
-        result = await session.execute(stmt)
-        existed_train_no: List[MTrainNo] = result.scalars().all()
-        excluded_codes = {x.train_code for x in existed_train_no}
-        filtered_train_no_list = filter(lambda x: x.train_code not in excluded_codes, train_no_list)
-        session.add_all(filtered_train_no_list)
+        await session.execute(insert(MTrainNo).prefix_with('OR IGNORE'), rows)
         await session.commit()
 
 
 @validate_date_param(date_param_name='_date')
 async def query_cached_result(query_key: str, category: str, empty_cb, expire: int = None, **kwargs):
     _date: str = kwargs.get('_date')
+    table = get_partition_table(_date)
     async with AsyncSessionLocal() as session:
-        stmt = select(QueryResult).filter(and_(
-            QueryResult.query_key == query_key,
-            QueryResult.category == category,
-            QueryResult.date == _date,
-        ))
-        result = await session.execute(stmt)
-        cached: QueryResult = result.scalars().first()
+        try:
+            await ensure_partition(session, table)
+            stmt = select(table.c.id, table.c.result, table.c.created_at).where(and_(
+                table.c.query_key == query_key,
+                table.c.category == category,
+            )).limit(1)
+            cached = (await session.execute(stmt)).first()
+        except OperationalError:
+            # 分表已被清理任务删除, 重建后视为未命中
+            forget_partition(table.name)
+            await session.rollback()
+            await ensure_partition(session, table)
+            cached = None
         now = datetime.utcnow()
 
         # 检查是否存在缓存且未过期
@@ -43,25 +62,152 @@ async def query_cached_result(query_key: str, category: str, empty_cb, expire: i
                 expire_time = cached.created_at + timedelta(minutes=expire)
                 if now >= expire_time:
                     # 删除过期记录
-                    await session.delete(cached)
+                    await session.execute(delete(table).where(table.c.id == cached.id))
                     await session.commit()
                     cached = None
             else:
+                record_cache(category, True)
                 return to_obj(cached.result, kwargs.get('pydantic_class'))
 
+        record_cache(category, cached is not None)
         # 如果没有缓存或已过期，调用回调生成
         if not cached:
             new_data = await empty_cb()
             if new_data:
-                query_result = QueryResult(
+                await session.execute(insert(table).values(
                     query_key=query_key,
                     category=category,
-                    date=_date,
-                    result=to_json(new_data),
-                )
-                session.add(query_result)
+                    # 直接保存 JSON bytes, 读取时由 to_obj 解析, 不经过 str 编解码; 旧版本写入的 str 同样可以读取
+                    result=to_json_bytes(new_data),
+                ))
                 await session.commit()
                 return new_data
             else:
                 return None
         return to_obj(cached.result, kwargs.get('pydantic_class'))
+
+
+@validate_date_param(date_param_name='_date')
+async def query_cached_results(query_keys: List[str], category: str, **kwargs) -> Dict[str, object]:
+    """
+    批量读取 query_cached_result 写入的未设置过期时间的缓存, 未命中的 query_key 不在结果中
+    """
+    table = get_partition_table(kwargs.get('_date'))
+    query_keys = list(set(query_keys))
+    result: Dict[str, object] = {}
+    async with AsyncSessionLocal() as session:
+        try:
+            await ensure_partition(session, table)
+            for i in range(0, len(query_keys), IN_CLAUSE_CHUNK_SIZE):
+                stmt = select(table.c.query_key, table.c.result).where(and_(
+                    table.c.query_key.in_(query_keys[i:i + IN_CLAUSE_CHUNK_SIZE]),
+                    table.c.category == category,
+                ))
+                for query_key, cached in (await session.execute(stmt)).all():
+                    result.setdefault(query_key, to_obj(cached, kwargs.get('pydantic_class')))
+        except OperationalError:
+            # 分表已被清理任务删除, 视为全部未命中
+            forget_partition(table.name)
+            return {}
+    if result:
+        # 未命中的由调用方逐个查询时记录
+        inc('cache_requests', len(result), cache=category, result='hit')
+    return result
+
+
+def to_stop_time_rows(train_schedule: TrainSchedule) -> List[dict]:
+    compact = train_schedule.compact()
+    rows = []
+    for index, stop in enumerate(train_schedule.schedule):
+        stop: StopInfo
+        rows.append({
+            'date': train_schedule.train_date,
+            'train_no': train_schedule.train_no,
+            'station_index': index,
+            'station_name': stop.station_name,
+            'station_train_code': stop.station_train_code,
+            'arr_time': stop.arr_time,
+            'dep_time': stop.dep_time,
+            'arr_minutes': compact.arr_minutes[index],
+            'dep_minutes': compact.dep_minutes[index],
+        })
+    return rows
+
+
+async def save_stop_times(train_schedule: TrainSchedule):
+    """
+    将时刻表写入 tb_stop_time, 已存在的同车次同日期数据会被替换
+    """
+    rows = to_stop_time_rows(train_schedule)
+    if not rows:
+        return
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(MStopTime).where(and_(
+            MStopTime.date == train_schedule.train_date,
+            MStopTime.train_no == train_schedule.train_no,
+        )))
+        await session.execute(insert(MStopTime), rows)
+        await session.commit()
+
+
+@validate_date_param(date_param_name='train_date')
+async def query_train_nos_by_station_pair(from_station: str, to_station: str, **kwargs) -> List[str]:
+    """
+    查询已存储时刻表中先经停 from_station 再经停 to_station 的车次编号
+    :param train_date: 列车始发日期
+    """
+    train_date: str = kwargs.get('train_date')
+    from_stop = aliased(MStopTime)
+    to_stop = aliased(MStopTime)
+    async with AsyncSessionLocal() as session:
+        stmt = select(from_stop.train_no).join(to_stop, and_(
+            to_stop.date == from_stop.date,
+            to_stop.train_no == from_stop.train_no,
+            to_stop.station_index > from_stop.station_index,
+        )).where(and_(
+            from_stop.station_name == from_station,
+            from_stop.date == train_date,
+            to_stop.station_name == to_station,
+        )).order_by(from_stop.dep_minutes)
+        result = await session.execute(stmt)
+        return list(result.scalars().all())
+
+
+@validate_date_param(date_param_name='train_date')
+async def query_train_nos_via_station(station_name: str, **kwargs) -> List[str]:
+    """
+    查询已存储时刻表中经停某站的车次编号
+    :param train_date: 列车始发日期
+    """
+    train_date: str = kwargs.get('train_date')
+    async with AsyncSessionLocal() as session:
+        stmt = select(MStopTime.train_no).where(and_(
+            MStopTime.station_name == station_name,
+            MStopTime.date == train_date,
+        )).order_by(MStopTime.dep_minutes)
+        result = await session.execute(stmt)
+        return list(result.scalars().all())
+
+
+async def query_stop_names(train_keys: List[tuple[str, str]]) -> Dict[tuple[str, str], List[str]]:
+    """
+    批量查询已存储时刻表的经停站名
+    :param train_keys: [(train_no, train_date)], train_date 格式 %Y-%m-%d
+    :return: {(train_no, train_date): [按经停顺序排列的站名]}, 未存储时刻表的车次不在结果中
+    """
+    train_keys = list(set(train_keys))
+    result: Dict[tuple[str, str], List[str]] = {}
+    if not train_keys:
+        return result
+    async with AsyncSessionLocal() as session:
+        for train_date in {x[1] for x in train_keys}:
+            train_nos = [x[0] for x in train_keys if x[1] == train_date]
+            for i in range(0, len(train_nos), IN_CLAUSE_CHUNK_SIZE):
+                stmt = select(MStopTime.train_no, MStopTime.station_name).where(and_(
+                    MStopTime.date == train_date,
+                    MStopTime.train_no.in_(train_nos[i:i + IN_CLAUSE_CHUNK_SIZE]),
+                )).order_by(MStopTime.train_no, MStopTime.station_index)
+                rows = await session.execute(stmt)
+                for train_no, station_name in rows.all():
+                    result.setdefault((train_no, train_date), []).append(station_name)
+    return result
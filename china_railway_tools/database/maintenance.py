@@ -0,0 +1,142 @@
+"""
+后台数据库维护: 分批删除过期的车次编号、时刻表和查询缓存, 删除过期日期的缓存分表, 并分批归还空闲页.
+每批在单独的短事务中执行, 批之间让出事件循环, 不会长时间持有写锁.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import Table, delete, select
+
+from china_railway_tools.config import get_config
+from china_railway_tools.database.connection import async_engine
+from china_railway_tools.database.partitions import drop_partitions_before, list_partitions, get_partition_table, \
+    partition_date
+from china_railway_tools.database.schema import MTrainNo, MStopTime, QueryResult, enable_incremental_vacuum
+from china_railway_tools.utils.exception_utils import extract_exception_traceback
+from china_railway_tools.utils.metrics import inc
+from china_railway_tools.utils.train_no_directory import TRAIN_NO_DIRECTORY
+
+logger = logging.getLogger(__name__)
+
+
+class DbMaintenance:
+    def __init__(self, **kwargs):
+        self.interval_seconds: int = kwargs.get('interval_seconds',
+                                                get_config('db_maintenance.interval_seconds', 3600))
+        self.chunk_size: int = kwargs.get('chunk_size', get_config('db_maintenance.chunk_size', 500))
+        # 两批删除之间的间隔, 让其他写入有机会获得锁
+        self.chunk_pause: float = kwargs.get('chunk_pause', get_config('db_maintenance.chunk_pause', 0.05))
+        # 单次运行最多删除的批数, 剩余的留到下次运行
+        self.max_chunks: int = kwargs.get('max_chunks', get_config('db_maintenance.max_chunks_per_run', 100))
+        self.vacuum_pages: int = kwargs.get('vacuum_pages', get_config('db_maintenance.vacuum_pages', 1000))
+        self._chunks = 0
+        # 启动时未能开启 incremental auto_vacuum(如 VACUUM 时数据库被占用)的, 每次运行时重试
+        self._auto_vacuum_enabled = False
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event = asyncio.Event()
+
+    async def delete_in_chunks(self, table: Table, condition) -> int:
+        """
+        按主键分批删除满足 condition 的行
+        """
+        deleted = 0
+        chunk = select(table.c.id).where(condition).limit(self.chunk_size)
+        while self._chunks < self.max_chunks and not self._stop_event.is_set():
+            async with async_engine.begin() as conn:
+                result = await conn.execute(delete(table).where(table.c.id.in_(chunk)))
+            self._chunks += 1
+            deleted += result.rowcount
+            if result.rowcount < self.chunk_size:
+                break
+            await asyncio.sleep(self.chunk_pause)
+        if deleted:
+            inc('db_maintenance_deleted_rows', deleted, table=table.name)
+        return deleted
+
+    async def clean_train_no(self) -> int:
+        max_days = get_config('max_saved_train_no_days', 7)
+        target_date = (datetime.now() - timedelta(days=max_days)).strftime('%Y-%m-%d')
+        deleted = await self.delete_in_chunks(MTrainNo.__table__, MTrainNo.date < target_date)
+        deleted += await self.delete_in_chunks(MStopTime.__table__, MStopTime.date < target_date)
+        return deleted
+
+    async def clean_cache_result(self, drop_partitions: bool = True) -> int:
+        # created_at 由 SQLite 的 CURRENT_TIMESTAMP 写入, 为不带时区的 UTC 时间
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        target_time = now - timedelta(days=get_config('max_cached_days', 3))
+        deleted = await self.delete_in_chunks(QueryResult.__table__, QueryResult.created_at < target_time)
+        async with async_engine.begin() as conn:
+            dropped = []
+            if drop_partitions:
+                # 日期早于保留期的分表整表删除
+                dropped = await drop_partitions_before(conn, target_time.replace(hour=0, minute=0, second=0,
+                                                                                 microsecond=0))
+            partitions = await list_partitions(conn)
+        if dropped:
+            inc('db_maintenance_dropped_partitions', len(dropped))
+            logger.info(f'Dropped query result partitions: {dropped}')
+        for name in partitions:
+            table = get_partition_table(partition_date(name).strftime('%Y-%m-%d'))
+            deleted += await self.delete_in_chunks(table, table.c.created_at < target_time)
+        return deleted
+
+    async def incremental_vacuum(self):
+        async with async_engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+            await conn.exec_driver_sql(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)})')
+
+    async def run_once(self, full: bool = True) -> dict:
+        """
+        :param full: 为 False 时只分批删除过期行, 不删除过期分表、不切换 auto_vacuum、不归还空闲页, 用于启动时
+        """
+        started = time.time()
+        self._chunks = 0
+        stats = {'train_no': 0, 'cache_result': 0}
+        try:
+            if full and not self._auto_vacuum_enabled:
+                self._auto_vacuum_enabled = await enable_incremental_vacuum()
+            # 内存中的车次目录与 tb_train_no 使用相同的保留天数
+            max_days = get_config('max_saved_train_no_days', 7)
+            TRAIN_NO_DIRECTORY.evict_before(datetime.now() - timedelta(days=max_days))
+            if get_config('auto_clean_train_no'):
+                stats['train_no'] = await self.clean_train_no()
+            stats['cache_result'] = await self.clean_cache_result(drop_partitions=full)
+            if full:
+                await self.incremental_vacuum()
+        except Exception as e:
+            logger.warning(f'Database maintenance failed: {extract_exception_traceback(e)}')
+        logger.info(f'Database maintenance finished in {time.time() - started:.2f}s, deleted: {stats}')
+        return stats
+
+    async def _run_forever(self):
+        while not self._stop_event.is_set():
+            await self.run_once()
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._stop_event.clear()
+            self._task = asyncio.create_task(self._run_forever())
+        return self._task
+
+    async def stop(self):
+        self._stop_event.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+
+async def start_db_maintenance(**kwargs) -> DbMaintenance:
+    """
+    在当前事件循环中启动后台维护任务, 每 db_maintenance.interval_seconds 秒运行一次, 参数同 DbMaintenance.
+    退出前 await 返回值的 stop()
+    """
+    maintenance = DbMaintenance(**kwargs)
+    maintenance.start()
+    return maintenance
@@ -0,0 +1,82 @@
+"""
+查询结果缓存按日期分表: 日期为 2025-01-01 的缓存保存在 tb_query_result_20250101.
+过期日期的缓存整表 DROP, 不需要逐行 DELETE; 释放的页由 incremental_vacuum 归还给文件系统
+"""
+import re
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import Table, MetaData, Column, Integer, String, TEXT, DateTime, Index, func, text
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+
+PARTITION_PREFIX = 'tb_query_result_'
+PARTITION_PATTERN = re.compile(rf'^{PARTITION_PREFIX}(\d{{8}})$')
+
+_metadata = MetaData()
+# 本进程已确认存在的分表
+_created: Dict[str, bool] = {}
+
+
+def partition_name(_date: str) -> str:
+    """
+    :param _date: %Y-%m-%d
+    """
+    return f'{PARTITION_PREFIX}{_date.replace("-", "")}'
+
+
+def partition_date(name: str) -> datetime | None:
+    match = PARTITION_PATTERN.match(name)
+    return datetime.strptime(match.group(1), '%Y%m%d') if match else None
+
+
+def get_partition_table(_date: str) -> Table:
+    name = partition_name(_date)
+    table = _metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name, _metadata,
+            Column('id', Integer, primary_key=True),
+            Column('query_key', String, nullable=False),
+            Column('category', String, nullable=False),
+            Column('result', TEXT, nullable=False),
+            Column('created_at', DateTime, nullable=False, server_default=func.now()),
+            Index(f'ix_{name}_key', 'query_key', 'category'),
+            Index(f'ix_{name}_created_at', 'created_at'),
+        )
+    return table
+
+
+async def ensure_partition(session: AsyncSession, table: Table):
+    if _created.get(table.name):
+        return
+    connection = await session.connection()
+    await connection.run_sync(table.create, checkfirst=True)
+    _created[table.name] = True
+
+
+def forget_partition(name: str):
+    """
+    分表被删除(可能由其他进程)后调用, 下次使用时重新创建
+    """
+    _created.pop(name, None)
+
+
+async def list_partitions(connection: AsyncConnection) -> List[str]:
+    # LIKE 中 _ 是通配符, 用 GLOB 精确匹配前缀
+    result = await connection.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB :pattern"),
+        {'pattern': f'{PARTITION_PREFIX}[0-9]*'})
+    return [x for x, in result.all() if PARTITION_PATTERN.match(x)]
+
+
+async def drop_partitions_before(connection: AsyncConnection, before: datetime) -> List[str]:
+    """
+    删除日期早于 before 的分表
+    """
+    dropped = []
+    for name in await list_partitions(connection):
+        if partition_date(name) < before:
+            await connection.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+            forget_partition(name)
+            dropped.append(name)
+    return dropped
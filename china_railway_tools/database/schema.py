@@ -4,7 +4,9 @@ from datetime import datetime
 from typing import Self
 
 from .connection import Base, async_engine
-from sqlalchemy import Column, Integer, String, DateTime, func, Date, UniqueConstraint, TEXT
+from ..config import get_config
+from sqlalchemy import Column, Integer, String, DateTime, func, Date, UniqueConstraint, TEXT, Index
+from sqlalchemy.exc import OperationalError
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +47,8 @@ class MTrainNo(Base):
     )
     __table_args__ = (
         UniqueConstraint('date', 'train_code', name='uix_date_train_code'),
+        # LIKE 在 SQLite 中默认大小写不敏感, 只有 NOCASE 索引才能用于 train_code LIKE 'G1%' 的前缀查询
+        Index('ix_train_no_date_code_nocase', 'date', train_code.collate('NOCASE')),
     )
 
     @classmethod
@@ -55,6 +59,9 @@ class MTrainNo(Base):
 
 
 class QueryResult(Base):
+    """
+    旧版本的查询结果缓存表, 新的缓存按日期分表保存(见 partitions), 这里的数据由维护任务逐步清理
+    """
     __tablename__ = 'tb_query_result'
 
     id = Column(Integer, primary_key=True)
@@ -62,9 +69,83 @@ class QueryResult(Base):
     query_key = Column(String, nullable=False)
     category = Column(String, nullable=False)
     result = Column(TEXT, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
+
+
+def create_missing_indexes(sync_conn):
+    """
+    create_all 只会为新建的表创建索引, 已存在的表需要单独补建
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+class MStopTime(Base):
+    """
+    列车时刻表的规范化存储, 每个经停站一行, 支持按车站查询经停车次
+    """
+    __tablename__ = 'tb_stop_time'
+
+    id = Column(Integer, primary_key=True)
+    date = Column(TEXT, nullable=False)
+    train_no = Column(String, nullable=False)
+    station_index = Column(Integer, nullable=False)
+    station_name = Column(String, nullable=False)
+    station_train_code = Column(String)
+    arr_time = Column(String)
+    dep_time = Column(String)
+    # 距始发站出发日 00:00 的分钟数, 已计入跨天
+    arr_minutes = Column(Integer)
+    dep_minutes = Column(Integer)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
+    __table_args__ = (
+        UniqueConstraint('date', 'train_no', 'station_index', name='uix_stop_time_date_train_index'),
+        Index('ix_stop_time_station_date', 'station_name', 'date'),
+    )
+
+
+# PRAGMA auto_vacuum 的取值
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+async def configure_sqlite():
+    """
+    WAL 模式下读不会被写阻塞. incremental auto_vacuum 由维护任务(DbMaintenance)开启, 不在启动时 VACUUM
+    """
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+
+
+async def enable_incremental_vacuum() -> bool:
+    """
+    已有数据库切换 auto_vacuum 需要一次完整的 VACUUM, 只在文件不超过 db_maintenance.convert_max_mb 时进行.
+    VACUUM 在有其他连接读写时会失败, 失败时由维护任务(DbMaintenance)下次运行时重试
+    :return: 是否已开启 incremental auto_vacuum
+    """
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            auto_vacuum = (await conn.exec_driver_sql('PRAGMA auto_vacuum')).scalar()
+            if auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+                return True
+            page_count = (await conn.exec_driver_sql('PRAGMA page_count')).scalar()
+            page_size = (await conn.exec_driver_sql('PRAGMA page_size')).scalar()
+            size_mb = page_count * page_size / 1024 / 1024
+            if size_mb > get_config('db_maintenance.convert_max_mb', 50):
+                logger.info(f'Database is {size_mb:.0f}MB, skip enabling incremental auto_vacuum')
+                return False
+            await conn.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+            await conn.exec_driver_sql('VACUUM')
+        except OperationalError as e:
+            logger.warning(f'Failed to enable incremental auto_vacuum, will retry in next maintenance run: {e}')
+            return False
+    return True
 
 
 async def init_db_async():
+    await configure_sqlite()
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_missing_indexes)
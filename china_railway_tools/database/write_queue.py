@@ -0,0 +1,146 @@
+import asyncio
+import atexit
+import logging
+import sqlite3
+import threading
+from typing import List, Optional
+
+from china_railway_tools.config import get_config, get_default_db_url
+from china_railway_tools.database.curd import insert_or_ignore_train_no
+from china_railway_tools.database.schema import MTrainNo
+from china_railway_tools.utils.exception_utils import extract_exception_traceback
+
+logger = logging.getLogger(__name__)
+
+TRAIN_NO_COLUMNS = ('date', 'train_no', 'train_code', 'from_station', 'to_station')
+
+
+def to_row(train_no: MTrainNo) -> dict:
+    return {k: getattr(train_no, k) for k in TRAIN_NO_COLUMNS}
+
+
+class TrainNoWriteQueue:
+    """
+    tb_train_no 的写后队列: 合并多次写入, 定期用单个 INSERT OR IGNORE 事务落库.
+    进程退出时未落库的数据通过 sqlite3 同步写入, 不会丢失.
+    """
+
+    def __init__(self, flush_interval: float = None, batch_size: int = None):
+        self.flush_interval = flush_interval or get_config('train_no_write_queue.flush_interval', 2.0)
+        self.batch_size = batch_size or get_config('train_no_write_queue.batch_size', 500)
+        self._pending: List[dict] = []
+        # 已从队列取出、正在写入的数据, 写入完成前仍可被 search 查到
+        self._flushing: List[dict] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, train_no_list: List[MTrainNo]):
+        if not train_no_list:
+            return
+        with self._lock:
+            self._pending.extend(to_row(x) for x in train_no_list)
+            pending_count = len(self._pending)
+        self._ensure_worker()
+        if pending_count >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def search(self, train_code: str, train_date: str, exact: bool = True, limit: int = 200) -> List[dict]:
+        """
+        查询尚未落库的车次编号, 条件和排序与 query_train_no 的 SQL 一致.
+        落库前 query_train_no 在 SQLite 中查不到, 需先查询这里, 避免再次请求 12306
+        """
+        with self._lock:
+            rows = [x for x in (*self._flushing, *self._pending) if x['date'] == train_date and (
+                x['train_code'] == train_code if exact else x['train_code'].startswith(train_code))]
+        if not rows:
+            return rows
+        # 同一车次可能被多次写入
+        unique = {x['train_code']: x for x in rows}
+        return sorted(unique.values(), key=lambda x: (len(x['train_code']), x['train_code']))[:limit]
+
+    def _take(self) -> List[dict]:
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._flushing = rows
+        return rows
+
+    def _ensure_worker(self):
+        if self._closed or (self._task is not None and not self._task.done()):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环, 等待下一次 flush 或退出时同步落库
+            return
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        rows = self._take()
+        if not rows:
+            return 0
+        try:
+            await insert_or_ignore_train_no(rows)
+        except BaseException as e:
+            # 取消(如 asyncio.run 结束时)也放回队列, 由下一次 flush 或退出时写入
+            with self._lock:
+                self._pending[:0] = rows
+                self._flushing = []
+            if not isinstance(e, Exception):
+                raise
+            logger.warning(f'Failed to flush train no queue, rows:{len(rows)} err:{extract_exception_traceback(e)}')
+            return 0
+        with self._lock:
+            self._flushing = []
+        return len(rows)
+
+    async def close(self):
+        """
+        停止后台任务并写入剩余数据, 应在事件循环关闭前调用.
+        之后在新的事件循环中 put 时重新启动后台任务
+        """
+        self._closed = True
+        try:
+            if self._task is not None:
+                self._wakeup.set()
+                await self._task
+            await self.flush()
+        finally:
+            self._task = None
+            self._wakeup = None
+            self._closed = False
+
+    def flush_sync(self):
+        """
+        进程退出时的兜底: 事件循环可能已关闭, 直接用 sqlite3 写入
+        """
+        rows = self._take()
+        if not rows:
+            return
+        db_path = get_default_db_url().replace('sqlite:///', '')
+        columns = ', '.join(TRAIN_NO_COLUMNS)
+        placeholders = ', '.join(f':{x}' for x in TRAIN_NO_COLUMNS)
+        try:
+            with sqlite3.connect(db_path) as conn:
+                conn.executemany(f'INSERT OR IGNORE INTO {MTrainNo.__tablename__} ({columns}) '
+                                 f'VALUES ({placeholders})', rows)
+        except Exception as e:
+            logger.warning(f'Failed to flush train no queue at exit, rows:{len(rows)} err:{e}')
+
+
+TRAIN_NO_WRITE_QUEUE = TrainNoWriteQueue()
+atexit.register(TRAIN_NO_WRITE_QUEUE.flush_sync)
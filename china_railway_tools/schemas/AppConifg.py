@@ -10,4 +10,91 @@ class AppConfig(BaseModel):
         'fetch_train_schedule': 5,
         'fetch_train_no': 10,
     })
+    fetch_scheduler: dict = Field({
+        'background_share': 0.2,
+        'max_background_queue': None,
+    }, title='12306请求优先级调度',
+        description='用户查询优先获得并发额度; 有后台任务(预取、订阅轮询、批量加载)等待时至少为其保留'
+                    'background_share比例的额度; max_background_queue:后台任务排队上限, None不限制')
+    circuit_breaker: dict = Field({
+        'failure_threshold': 5,
+        'reset_timeout': 30,
+        'half_open_max_calls': 1,
+        'max_queue': 50,
+        'stale_ttl': 1800,
+    }, title='12306接口熔断与排队配置',
+        description='连续失败failure_threshold次后熔断reset_timeout秒; 每个接口最多max_queue个请求等待并发额度; '
+                    '熔断或排队已满时余票查询返回stale_ttl秒内的过期结果')
     sqlite_dir: str = Field(None, title='sqlite存放路径')
+    db_maintenance: dict = Field({
+        'interval_seconds': 3600,
+        'chunk_size': 500,
+        'chunk_pause': 0.05,
+        'max_chunks_per_run': 100,
+        'vacuum_pages': 1000,
+        'convert_max_mb': 50,
+    }, title='数据库后台维护配置',
+        description='SyncClient/守护进程/start_db_maintenance每interval_seconds秒分批删除过期数据, 为空时SyncClient不启动; '
+                    '每批chunk_size行, 单次最多max_chunks_per_run批; 每次归还最多vacuum_pages个空闲页; '
+                    '已有数据库不超过convert_max_mb时由维护任务切换为incremental auto_vacuum, 失败时下次运行重试')
+    station_check_interval: int = Field(86400, title='车站列表检查更新间隔秒数', ge=0,
+                                        description='间隔内启动时直接使用本地车站快照, 不请求12306')
+    train_no_sweep: dict = Field({
+        'page_size': 100,
+        'max_prefix_length': 4,
+    }, title='批量加载车次编号配置', description='page_size:搜索接口单次返回上限, 达到时细分车次前缀继续查询')
+    train_no_write_queue: dict = Field({
+        'flush_interval': 2.0,
+        'batch_size': 500,
+    }, title='车次编号批量写入配置')
+    via_strategy: str = Field('schedule', title='途经站筛选方式',
+                              description='schedule:优先使用已存储的时刻表, query:查询出发站到途经站的余票')
+    parse_executor: dict = Field({
+        'mode': None,
+        'max_workers': None,
+        'min_ticket_rows': 200,
+        'min_station_js_chars': 100000,
+    }, title='解析线程池/进程池配置',
+        description='mode:None不开启, thread或process; 余票条数/车站js长度达到阈值时才放到线程池或进程池中解析')
+    serializer: str = Field('auto', title='JSON序列化实现', description='auto/orjson/json, auto在安装orjson时使用orjson')
+    http_shared_client: bool = Field(False, title='同一事件循环内共享httpx客户端',
+                                     description='复用连接池, 关闭时每次请求新建客户端; 开启后需在事件循环结束前调用'
+                                                 'init_script.shutdown()关闭共享客户端. SyncClient/守护进程总是共享')
+    http_debug_stack: bool = Field(False, title='非200响应是否记录调用栈', description='记录调用栈开销较大, 仅排查问题时开启')
+    shared_cache: dict = Field({
+        'enabled': False,
+        'path': None,
+        'lock_timeout': 30,
+        'poll_interval': 0.05,
+        'busy_timeout': 0.05,
+    }, title='多进程共享余票缓存',
+        description='path为空时使用数据目录下的shared_cache.db; lock_timeout:等待其他进程请求的最长秒数, '
+                    '超时后返回过期结果或报错; busy_timeout:事件循环中读写缓存等待写锁的秒数, 超时视为未命中')
+    ticket_cache_seconds: int = Field(60, title='余票查询结果缓存秒数', gt=0)
+    train_static_cache_seconds: int = Field(6 * 3600, title='车次票价等静态信息缓存秒数', gt=0,
+                                            description='余票每次查询都会更新, 票价、时间等信息未变化时复用缓存, 不重复解码')
+    ticket_watch: dict = Field({
+        'min_interval': 15,
+        'max_interval': 300,
+        'backoff': 1.5,
+        'departure_factor': 0.02,
+        'min_fetch_interval': 1.0,
+    }, title='余票订阅轮询配置',
+        description='轮询间隔在min_interval和max_interval秒之间, 无变化时乘以backoff, 有变化时减半; '
+                    '不超过距发车时间的departure_factor倍; 所有线路的请求至少间隔min_fetch_interval秒')
+    schedule_cache: dict = Field({
+        'max_size': 2000,
+        'ttl': 3600,
+        'negative_ttl': 60,
+    }, title='时刻表内存缓存', description='最多保存max_size个时刻表, ttl秒后过期; 查询不到的车次negative_ttl秒内不再查询')
+    train_schedules: dict = Field({
+        'concurrency': 8,
+    }, title='批量时刻表查询', description='query_train_schedules 同时查询未缓存时刻表的最大数量')
+    prefetch: dict = Field({
+        'learn': None,
+        'top_routes': 20,
+        'days_ahead': 3,
+        'interval_seconds': 300,
+        'min_fetch_interval': 1.0,
+        'cache_ttl': 600,
+    }, title='热门线路预取配置')
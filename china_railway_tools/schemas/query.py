@@ -24,6 +24,16 @@ dep_date: datetime = Field((datetime.now() + timedelta(days=1)), title='出发
 train_date: datetime = Field((datetime.now() + timedelta(days=1)), description='车次日期')
 
 
+def parse_hhmm_or_iso(value: str) -> datetime:
+    """
+    解析 HH:MM, 也接受 model_dump(mode='json') 输出的 ISO 格式
+    """
+    try:
+        return hhmm_to_datetime(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
 class QueryTrains(BaseModel):
     from_station_code: Optional[str] = from_station_code
     from_station_name: Optional[str] = from_station_name
@@ -47,14 +57,14 @@ class QueryTrains(BaseModel):
         start_time = values.get('start_time')
         if isinstance(start_time, str):
             try:
-                values['start_time'] = hhmm_to_datetime(start_time)
+                values['start_time'] = parse_hhmm_or_iso(start_time)
             except ValueError:
                 raise ValueError(f"Invalid start_time format: {start_time}, expected HH:MM")
 
         end_time = values.get('end_time')
         if isinstance(end_time, str):
             try:
-                values['end_time'] = hhmm_to_datetime(end_time)
+                values['end_time'] = parse_hhmm_or_iso(end_time)
             except ValueError:
                 raise ValueError(f"Invalid end_time format: {end_time}, expected HH:MM")
 
@@ -26,3 +26,9 @@ class TrainTicketResponse(BaseModel):
             detail_trains=detail_trains,
             raw_price=train_info.get_lowest_price(),
         )
+
+    def to_json_bytes(self) -> bytes:
+        """
+        JSON bytes, 可直接作为 HTTP 响应体返回
+        """
+        return self.__pydantic_serializer__.to_json(self)
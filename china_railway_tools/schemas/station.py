@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel, ConfigDict
 
 
@@ -8,3 +10,21 @@ class Station(BaseModel):
     code: str
     city: str
     model_config = ConfigDict(from_attributes=True)
+
+
+class StationSnapshot(BaseModel):
+    js_url: str
+    etag: str | None = None
+    last_modified: str | None = None
+    content_hash: str
+    checked_at: float = 0
+    stations: List[Station] = []
+
+
+class StationChanges(BaseModel):
+    added: List[Station] = []
+    updated: List[Station] = []
+    removed: List[Station] = []
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.updated or self.removed)
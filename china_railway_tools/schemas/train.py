@@ -1,8 +1,9 @@
+from array import array
 from datetime import datetime
 from decimal import Decimal
 from typing import List, Optional, Dict
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 
 class Ticket(BaseModel):
@@ -81,29 +82,38 @@ class TrainInfo(BaseModel):
         """
         :param depart_date: date of current station departure
         :param raw_data: raw data queried from 12306
+        :param from_stop_info: StopInfo or dict
+        :param to_stop_info: StopInfo or dict
         """
-        return cls(
-            depart_date=depart_date,
-            train_date=datetime.strptime(raw_data['start_train_date'], '%Y%m%d').strftime('%Y-%m-%d'),
-            train_no=raw_data['train_no'],
-            train_code=raw_data['station_train_code'],
-            tickets=[
-                Ticket(
-                    stock=x['stock'],
-                    seat_type=x['seatType'],
-                    price=str(x['price'])
-                )
+        start_train_date: str = raw_data['start_train_date']
+        if len(start_train_date) != 8 or not start_train_date.isdigit():
+            raise ValueError(f'Invalid start_train_date: {start_train_date}, expected %Y%m%d')
+        # 嵌套数据以 dict 传入, 由 pydantic-core 一次完成整个模型的校验
+        data = {
+            'depart_date': depart_date,
+            # 比 strptime/strftime 快一个数量级
+            'train_date': f'{start_train_date[0:4]}-{start_train_date[4:6]}-{start_train_date[6:8]}',
+            'train_no': raw_data['train_no'],
+            'train_code': raw_data['station_train_code'],
+            'tickets': [
+                {
+                    'stock': x['stock'],
+                    'seat_type': x['seatType'],
+                    'price': str(x['price'])
+                }
                 for x in raw_data.get('prices', [])
             ],
-            from_station=raw_data['from_station_name'],
-            from_station_code=raw_data['from_station_telecode'],
-            to_station=raw_data['to_station_name'],
-            to_station_code=raw_data['to_station_telecode'],
-            first_station_code=raw_data['start_station_telecode'],
-            end_station_code=raw_data['end_station_telecode'],
-            from_stop_info=kwargs.get('from_stop_info', None),
-            to_stop_info=kwargs.get('to_stop_info', None),
-        )
+            'from_station': raw_data['from_station_name'],
+            'from_station_code': raw_data['from_station_telecode'],
+            'to_station': raw_data['to_station_name'],
+            'to_station_code': raw_data['to_station_telecode'],
+            'first_station_code': raw_data['start_station_telecode'],
+            'end_station_code': raw_data['end_station_telecode'],
+        }
+        for key in ('from_stop_info', 'to_stop_info'):
+            if kwargs.get(key) is not None:
+                data[key] = kwargs[key]
+        return cls.model_validate(data)
 
     def get_lowest_price(self) -> Decimal:
         ticket = min(self.tickets, key=lambda t: Decimal(t.price))
@@ -113,11 +123,170 @@ class TrainInfo(BaseModel):
         return datetime.strptime(self.train_date, '%Y-%m-%d')
 
 
+class TrainStatic:
+    """
+    车次在某一出发日期、区间内基本不变的部分: 票价、车次号、时间、站码.
+    train 中各席位的 stock 为空, 由 with_stocks 填入余票
+    """
+    __slots__ = ('train', 'seat_codes', 'fingerprint')
+
+    def __init__(self, train: TrainInfo, seat_codes: tuple, fingerprint: tuple):
+        self.train = train
+        # 与 train.tickets 一一对应的席位代码, 如 ZE_, 用于读取原始数据中的余票字段
+        self.seat_codes = seat_codes
+        # 原始数据中决定静态部分的字段, 不一致时需要重新解析
+        self.fingerprint = fingerprint
+
+    def with_stocks(self, stocks: tuple) -> TrainInfo:
+        tickets = [Ticket.model_construct(stock=stock, seat_type=x.seat_type, price=x.price)
+                   for x, stock in zip(self.train.tickets, stocks)]
+        return self.train.model_copy(update={'tickets': tickets})
+
+    def __reduce__(self):
+        # 跨进程缓存(SharedCache)反序列化时优先使用本进程已缓存的同一车次;
+        # 车次以 JSON 保存, 只在本进程未缓存时才校验, 命中时不构建模型
+        from china_railway_tools.utils.train_statics import restore_train_static
+        train = self.train
+        key = (train.from_station_code, train.to_station_code, train.train_no)
+        return restore_train_static, (train.depart_date, key, self.seat_codes, self.fingerprint,
+                                      train.model_dump_json(exclude_unset=True))
+
+
+class TrainStocks:
+    """
+    一次余票查询结果的紧凑表示: 车次静态信息在多次查询间共享, 每次只保存各席位的余票
+    """
+    __slots__ = ('statics', 'stocks')
+
+    def __init__(self, statics: List[TrainStatic] = None, stocks: List[tuple] = None):
+        self.statics = statics or []
+        self.stocks = stocks or []
+
+    def append(self, static: TrainStatic, stocks: tuple):
+        self.statics.append(static)
+        self.stocks.append(stocks)
+
+    def to_train_infos(self) -> List[TrainInfo]:
+        return [static.with_stocks(stocks) for static, stocks in zip(self.statics, self.stocks)]
+
+    def static_trains(self) -> List[TrainInfo]:
+        """
+        不含余票的车次, 可先用于筛选, 再由 select 只为筛选结果填入余票
+        """
+        return [x.train for x in self.statics]
+
+    def select(self, trains: List[TrainInfo]) -> List[TrainInfo]:
+        """
+        :param trains: static_trains() 中的车次
+        :return: 填入余票后的车次, 顺序与 trains 一致
+        """
+        index = {id(static.train): i for i, static in enumerate(self.statics)}
+        return [self.statics[i].with_stocks(self.stocks[i]) for i in (index[id(x)] for x in trains)]
+
+    def __len__(self):
+        return len(self.statics)
+
+
+class TicketChange(BaseModel):
+    train_no: str
+    train_code: str
+    from_station: str
+    to_station: str
+    seat_type: str
+    # None 表示该席位(或车次)新出现
+    old_stock: Optional[str] = None
+    # None 表示该席位(或车次)已不在查询结果中
+    new_stock: Optional[str] = None
+
+
+class TicketChanges(BaseModel):
+    query_key: str
+    changes: List[TicketChange] = []
+
+    def is_empty(self) -> bool:
+        return not self.changes
+
+
+def hhmm_to_minutes(hhmm: str | None) -> int | None:
+    if not hhmm or hhmm == '----':
+        return None
+    hours, minutes = map(int, hhmm.split(':'))
+    return hours * 60 + minutes
+
+
+class CompactSchedule:
+    """
+    时刻表的紧凑表示, 由 TrainSchedule 构建一次:
+    到发时间为距始发日 00:00 的分钟数(已计入跨天), 区间历时与跨天数均为 O(1) 查询.
+    精确站名 -> 下标直接使用 TrainSchedule 构建时预先计算的 name_index, 不另外保存.
+    模糊站名(站名的任意子串)无法预先枚举: 为每个站的所有子串建索引会使每个时刻表多占用约 10KB,
+    因此只在查询时按经停顺序扫描 name_index, 并记录最多 MAX_FUZZY_ENTRIES 个查询过的结果
+    """
+    __slots__ = ('arr_minutes', 'dep_minutes', 'name_index', 'fuzzy_index')
+
+    # 每个时刻表最多记录的模糊查询结果数
+    MAX_FUZZY_ENTRIES = 16
+
+    def __init__(self, schedule: List[StopInfo], name_index: Dict[str, int]):
+        self.arr_minutes = array('i')
+        self.dep_minutes = array('i')
+        for stop in schedule:
+            arr = hhmm_to_minutes(stop.arr_time)
+            dep = hhmm_to_minutes(stop.dep_time)
+            arr_day_diff = stop.arr_day_diff or 0
+            if arr is not None:
+                arr += arr_day_diff * 24 * 60
+            if dep is not None:
+                dep += arr_day_diff * 24 * 60
+                if arr is not None and dep < arr:
+                    dep += 24 * 60
+            self.arr_minutes.append(arr if arr is not None else dep or 0)
+            self.dep_minutes.append(dep if dep is not None else arr or 0)
+        self.name_index = name_index
+        # 查询过的模糊站名 -> 下标, 首次查询时创建
+        self.fuzzy_index: Optional[Dict[str, int | None]] = None
+
+    def __len__(self):
+        return len(self.arr_minutes)
+
+    def get_index(self, station_name: str, fuzzy: bool = True) -> int | None:
+        index = self.name_index.get(station_name)
+        if index is not None or not fuzzy:
+            return index
+        if self.fuzzy_index is None:
+            self.fuzzy_index = {}
+        elif station_name in self.fuzzy_index:
+            return self.fuzzy_index[station_name]
+        # 按经停顺序取第一个包含 station_name 的站
+        index = next((i for name, i in self.name_index.items() if station_name in name), None)
+        if len(self.fuzzy_index) < self.MAX_FUZZY_ENTRIES:
+            self.fuzzy_index[station_name] = index
+        return index
+
+    def get_duration(self, from_index: int, to_index: int) -> int:
+        """
+        :return: 从 from_index 站出发到 to_index 站到达的分钟数
+        """
+        return self.arr_minutes[to_index] - self.dep_minutes[from_index]
+
+    def get_dep_day_diff(self, index: int) -> int:
+        return self.dep_minutes[index] // (24 * 60)
+
+    def get_arr_day_diff(self, index: int) -> int:
+        return self.arr_minutes[index] // (24 * 60)
+
+
 class TrainSchedule(BaseModel):
     train_no: str
     train_date: str
     name_index: Dict[str, int]
     schedule: List[StopInfo]
+    _compact: Optional[CompactSchedule] = PrivateAttr(None)
+
+    def compact(self) -> CompactSchedule:
+        if self._compact is None:
+            self._compact = CompactSchedule(self.schedule, self.name_index)
+        return self._compact
 
     @classmethod
     def from_raw_dict(cls, raw_dict: dict, ):
@@ -130,14 +299,10 @@ class TrainSchedule(BaseModel):
         )
 
     def get_stop_info(self, station_name: str) -> Optional[StopInfo]:
-        index = self.name_index.get(station_name)
+        # 精确匹配失败时模糊匹配
+        index = self.compact().get_index(station_name)
         if index is None:
-            # 模糊匹配
-            names = [x for x in self.name_index.keys() if station_name in x]
-            if len(names) == 0:
-                return None
-            else:
-                index = self.name_index.get(names[0])
+            return None
         return self.schedule[index]
 
     def get_stop_index(self, station_name: str) -> int | None:
@@ -1,47 +1,70 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta, date
+import time
 from typing import List
 
-from sqlalchemy import select, func, delete
-from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy import select, func, delete, update, insert, bindparam
 
+from china_railway_tools.api.station import notify_station_changes
 from china_railway_tools.config import get_config
 from china_railway_tools.database.connection import AsyncSessionLocal
-from china_railway_tools.database.schema import MStation, MTrainNo, QueryResult, init_db_async
-from china_railway_tools.schemas.station import Station
+from china_railway_tools.database.maintenance import DbMaintenance
+from china_railway_tools.database.schema import MStation, init_db_async
+from china_railway_tools.database.write_queue import TRAIN_NO_WRITE_QUEUE
+from china_railway_tools.schemas.station import Station, StationChanges
 from china_railway_tools.utils.cr_fetcher import fetch_all_stations
 from china_railway_tools.utils.exception_utils import extract_exception_traceback
+from china_railway_tools.utils.fast_models import model_columns, validate_rows
+from china_railway_tools.utils.http_utils import close_shared_client
+from china_railway_tools.utils.parse_executor import shutdown_parse_executors
+from china_railway_tools.utils.station_snapshot import load_station_snapshot, save_station_snapshot, \
+    fetch_station_snapshot
 
 logger = logging.getLogger(__name__)
 
+STATION_WRITE_CHUNK_SIZE = 500
+
 
 async def main():
     await init_db_async()
     await check_update_stations()
-    if get_config('auto_clean_train_no'):
-        await clean_train_no()
-    await clean_cache_result()
+    # 启动时只删除一批过期数据; 删除过期分表、切换 auto_vacuum 和积压数据的清理
+    # 由后台维护任务(SyncClient/守护进程或 start_db_maintenance())完成
+    await DbMaintenance(max_chunks=1).run_once(full=False)
 
 
 async def check_update_stations():
     try:
+        snapshot = load_station_snapshot()
         async with AsyncSessionLocal() as session:
             result = await session.execute(select(func.count()).select_from(MStation))
             cur_station_count = result.scalar_one()
-            stations: List[Station] = await fetch_all_stations()
-            if cur_station_count == len(stations):
-                return
+        if snapshot and snapshot.stations and cur_station_count != len(snapshot.stations):
+            # 数据库与快照不一致(如数据库被删除), 直接使用快照恢复, 无需请求12306
+            logger.info('Restoring stations from snapshot')
+            await save_stations(snapshot.stations, cur_station_count)
+            cur_station_count = len(snapshot.stations)
+
+        check_interval = get_config('station_check_interval', 86400)
+        if snapshot and cur_station_count and time.time() - snapshot.checked_at < check_interval:
+            return
+        snapshot, changed = await fetch_station_snapshot(snapshot)
+        if changed or cur_station_count == 0:
             logger.info('Updating stations')
-            if cur_station_count == 0:
-                await init_stations(stations)
-            else:
-                await update_stations(stations)
-            logger.info(f'ALL Stations are up to date, total:{len(stations)}')
+            await save_stations(snapshot.stations, cur_station_count)
+            logger.info(f'ALL Stations are up to date, total:{len(snapshot.stations)}')
+        save_station_snapshot(snapshot)
     except Exception as e:
         logger.warning(f'Failed to check update stations: {extract_exception_traceback(e)}')
 
 
+async def save_stations(stations: List[Station], cur_station_count: int):
+    if cur_station_count == 0:
+        await init_stations(stations)
+    else:
+        await update_stations(stations)
+
+
 async def init_stations(stations) -> List[Station]:
     if not stations:
         stations = await fetch_all_stations()
@@ -49,51 +72,72 @@ async def init_stations(stations) -> List[Station]:
         station_models: List[MStation] = [MStation(**x.model_dump()) for x in stations]
         session.add_all(station_models)
         await session.commit()
-        return stations
+    notify_station_changes(StationChanges(added=stations))
+    return stations
+
+
+def diff_stations(stored: List[Station], stations: List[Station]) -> StationChanges:
+    """
+    按车站代码比较数据库中的车站与最新车站列表
+    """
+    stored_by_code = {x.code: x for x in stored}
+    changes = StationChanges()
+    for station in stations:
+        old = stored_by_code.pop(station.code, None)
+        if old is None:
+            changes.added.append(station)
+        elif old != station:
+            changes.updated.append(station)
+    changes.removed = list(stored_by_code.values())
+    return changes
 
 
 async def update_stations(stations: List[Station] = None) -> List[Station]:
+    """
+    只写入新增/修改/删除的车站, 分批执行避免超出 sqlite 的变量数限制
+    """
     if not stations:
         stations = await fetch_all_stations()
     async with AsyncSessionLocal() as session:
-        payloads = [x.model_dump() for x in stations]
-        base_stmt = insert(MStation).values(payloads)
-        stmt = (
-            base_stmt.on_conflict_do_update(
-                index_elements=[MStation.code],
-                set_={  # 冲突时要更新的列
-                    MStation.name: base_stmt.excluded.name,
-                    MStation.pinyin: base_stmt.excluded.pinyin,
-                    MStation.pinyin_abbr: base_stmt.excluded.pinyin_abbr,
-                    MStation.city: base_stmt.excluded.city,
-                }
-            )
-        )
-        await session.execute(stmt)
-
+        result = await session.execute(select(*model_columns(MStation, Station)))
+        changes = diff_stations(validate_rows(Station, result.all()), stations)
+        if changes.is_empty():
+            return stations
+        logger.info(f'Station changes, added:{len(changes.added)} updated:{len(changes.updated)} '
+                    f'removed:{len(changes.removed)}')
+        for i in range(0, len(changes.added), STATION_WRITE_CHUNK_SIZE):
+            await session.execute(insert(MStation), [x.model_dump() for x in
+                                                     changes.added[i:i + STATION_WRITE_CHUNK_SIZE]])
+        update_stmt = update(MStation).where(MStation.code == bindparam('b_code'))
+        connection = await session.connection()
+        for i in range(0, len(changes.updated), STATION_WRITE_CHUNK_SIZE):
+            payloads = [{**x.model_dump(exclude={'code'}), 'b_code': x.code} for x in
+                        changes.updated[i:i + STATION_WRITE_CHUNK_SIZE]]
+            await connection.execute(update_stmt, payloads)
+        removed_codes = [x.code for x in changes.removed]
+        for i in range(0, len(removed_codes), STATION_WRITE_CHUNK_SIZE):
+            await session.execute(delete(MStation).where(
+                MStation.code.in_(removed_codes[i:i + STATION_WRITE_CHUNK_SIZE])))
         await session.commit()
-        return stations
+    notify_station_changes(changes)
+    return stations
 
 
 async def clean_train_no():
-    async with AsyncSessionLocal() as session:
-        max_days = get_config('max_saved_train_no_days', 7)
-        target_date: date = (datetime.now() - timedelta(days=max_days)).date()
-        target_date: str = target_date.strftime('%Y-%m-%d')
-        async with session.begin():
-            await session.execute(
-                delete(MTrainNo).where(MTrainNo.date < target_date)
-            )
+    await DbMaintenance().clean_train_no()
 
 
 async def clean_cache_result():
-    async with AsyncSessionLocal() as session:
-        max_days = get_config('max_cached_days', 3)
-        target_date: datetime = (datetime.now() - timedelta(days=max_days))
-        async with session.begin():
-            await session.execute(
-                delete(QueryResult).where(QueryResult.created_at < target_date)
-            )
+    await DbMaintenance().clean_cache_result()
+
+
+async def shutdown():
+    """
+    退出前调用, 写入尚未落库的数据
+    """
+    await TRAIN_NO_WRITE_QUEUE.close()
+    await close_shared_client()
+    shutdown_parse_executors()
 
 
 def run():
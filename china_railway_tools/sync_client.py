@@ -0,0 +1,139 @@
+"""
+同步调用接口: 在独立线程中运行一个常驻事件循环, 多次调用之间复用连接池、cookie、缓存和并发限制.
+
+    with SyncClient() as client:
+        trains = client.query_tickets(form)
+        futures = [client.submit_query_tickets(x) for x in forms]
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Coroutine, List, Optional, TypeVar
+
+from china_railway_tools.api.common import query_train_schedule
+from china_railway_tools.api.station import query_station
+from china_railway_tools.api.train import query_tickets
+from china_railway_tools.config import get_config
+from china_railway_tools.database.maintenance import DbMaintenance, start_db_maintenance
+from china_railway_tools.schemas.query import QueryTrains, QueryTrainSchedule
+from china_railway_tools.schemas.station import Station
+from china_railway_tools.schemas.train import TrainInfo, TrainSchedule
+from china_railway_tools.scrpits import init_script
+from china_railway_tools.utils.http_utils import share_client_in_loop
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class SyncClient:
+    def __init__(self, init: bool = False):
+        """
+        :param init: 启动时是否执行初始化(建表/更新车站/清理), 设置 CR_TOOLS_SKIP_INIT 跳过导入时初始化时使用
+        """
+        self.init = init
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._maintenance: Optional[DbMaintenance] = None
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> 'SyncClient':
+        with self._lock:
+            if self.started:
+                return self
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                # 常驻事件循环内复用连接池, 由 close() 中的 init_script.shutdown() 关闭
+                share_client_in_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=run_loop, name='cr_tools_loop', daemon=True)
+            self._thread.start()
+            ready.wait()
+        if self.init:
+            self.run(init_script.main())
+        if get_config('db_maintenance.interval_seconds', 3600):
+            # 常驻事件循环中定期分批清理过期数据
+            self._maintenance = self.run(start_db_maintenance())
+        return self
+
+    def submit(self, coro: Coroutine[None, None, T]) -> Future[T]:
+        """
+        在后台事件循环中执行协程, 返回 concurrent.futures.Future
+        """
+        if not self.started:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Coroutine[None, None, T], timeout: float = None) -> T:
+        """
+        在后台事件循环中执行协程并等待结果
+        """
+        return self.submit(coro).result(timeout)
+
+    def close(self, timeout: float = None):
+        with self._lock:
+            if not self.started:
+                return
+            loop, thread = self._loop, self._thread
+            try:
+                if self._maintenance is not None:
+                    asyncio.run_coroutine_threadsafe(self._maintenance.stop(), loop).result(timeout)
+                    self._maintenance = None
+                asyncio.run_coroutine_threadsafe(init_script.shutdown(), loop).result(timeout)
+            except Exception as e:
+                logger.warning(f'Failed to shutdown china_railway_tools: {e}')
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            loop.close()
+            self._loop = None
+            self._thread = None
+
+    def __enter__(self) -> 'SyncClient':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def query_tickets(self, form: QueryTrains, **kwargs) -> List[TrainInfo]:
+        return self.run(query_tickets(form, **kwargs))
+
+    def submit_query_tickets(self, form: QueryTrains, **kwargs) -> Future[List[TrainInfo]]:
+        return self.submit(query_tickets(form, **kwargs))
+
+    def query_train_schedule(self, form: QueryTrainSchedule) -> Optional[TrainSchedule]:
+        return self.run(query_train_schedule(form))
+
+    def submit_query_train_schedule(self, form: QueryTrainSchedule) -> Future[Optional[TrainSchedule]]:
+        return self.submit(query_train_schedule(form))
+
+    def query_station(self, keyword: str, **kwargs) -> List[Station]:
+        return self.run(query_station(keyword, **kwargs))
+
+    def submit_query_station(self, keyword: str, **kwargs) -> Future[List[Station]]:
+        return self.submit(query_station(keyword, **kwargs))
+
+
+_sync_client: Optional[SyncClient] = None
+_sync_client_lock = threading.Lock()
+
+
+def get_sync_client() -> SyncClient:
+    """
+    进程内共享的 SyncClient
+    """
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is None:
+            _sync_client = SyncClient()
+        return _sync_client.start()
@@ -0,0 +1,139 @@
+"""
+12306 接口的熔断: 连续失败达到 failure_threshold 次后熔断(open), 期间请求直接失败, 不再占用并发额度等待超时.
+reset_timeout 秒后进入半开(half_open), 放行 half_open_max_calls 个探测请求, 成功则恢复(closed), 失败则重新熔断.
+"""
+import logging
+import threading
+import time
+from typing import Dict
+
+import httpx
+
+from china_railway_tools.config import get_config
+from china_railway_tools.utils.metrics import inc, set_gauge
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+# 导出到 metrics 的数值
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class FetchRejectedError(Exception):
+    """
+    请求未发往 12306 即被拒绝
+    """
+
+    def __init__(self, endpoint: str, message: str):
+        super().__init__(f'{endpoint}: {message}')
+        self.endpoint = endpoint
+
+
+class CircuitOpenError(FetchRejectedError):
+    pass
+
+
+class QueueFullError(FetchRejectedError):
+    pass
+
+
+def is_upstream_status(status_code: int) -> bool:
+    """
+    5xx 和 429(限流)表示 12306 不可用或过载
+    """
+    return status_code >= 500 or status_code == 429
+
+
+def is_upstream_failure(e: BaseException) -> bool:
+    """
+    超时、连接失败、5xx 和 429 视为 12306 不可用, 其余异常(如解析失败)不计入熔断
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        return is_upstream_status(e.response.status_code)
+    return isinstance(e, httpx.TransportError)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = None, reset_timeout: float = None,
+                 half_open_max_calls: int = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or get_config('circuit_breaker.failure_threshold', 5)
+        self.reset_timeout = reset_timeout or get_config('circuit_breaker.reset_timeout', 30)
+        self.half_open_max_calls = half_open_max_calls or get_config('circuit_breaker.half_open_max_calls', 1)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        self._lock = threading.Lock()
+        set_gauge('circuit_breaker_state', STATE_VALUES[CLOSED], endpoint=name)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f'Circuit breaker {self.name}: {self.state} -> {state}')
+            self.state = state
+            set_gauge('circuit_breaker_state', STATE_VALUES[state], endpoint=self.name)
+
+    def _reject(self):
+        inc('fetch_rejected', endpoint=self.name, reason='circuit_open')
+        retry_after = max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+        raise CircuitOpenError(self.name, f'circuit open, retry after {retry_after:.1f}s')
+
+    def check(self):
+        """
+        熔断且未到半开时间时抛出 CircuitOpenError, 不改变状态, 用于排队前快速失败
+        """
+        if self.state == OPEN and time.monotonic() - self.opened_at < self.reset_timeout:
+            self._reject()
+
+    def before_call(self):
+        """
+        发出请求前调用, 之后必须调用一次 after_call
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self._reject()
+                self._set_state(HALF_OPEN)
+                self.half_open_calls = 0
+            if self.state == HALF_OPEN:
+                if self.half_open_calls >= self.half_open_max_calls:
+                    self._reject()
+                self.half_open_calls += 1
+
+    def after_call(self, failed: bool | None):
+        """
+        :param failed: 是否为 12306 不可用导致的失败, None 表示请求被取消, 没有结果
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.half_open_calls = max(0, self.half_open_calls - 1)
+            if failed is None:
+                return
+            if not failed:
+                self.failures = 0
+                self._set_state(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def get_circuit_states() -> Dict[str, str]:
+    return {name: x.state for name, x in _breakers.items()}
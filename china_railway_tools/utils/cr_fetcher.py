@@ -2,8 +2,10 @@ import asyncio
 import logging
 import time
 import urllib.parse
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Callable, Awaitable, List
+from weakref import WeakKeyDictionary
 
 from lxml import html
 
@@ -11,11 +13,17 @@ from china_railway_tools.config import get_config
 from china_railway_tools.database.schema import MTrainNo
 from china_railway_tools.schemas.query import QueryTrainSchedule
 from china_railway_tools.schemas.station import Station
-from china_railway_tools.schemas.train import TrainSchedule
-from china_railway_tools.utils import exception_utils
+from china_railway_tools.schemas.train import TrainSchedule, TrainStocks
 from china_railway_tools.utils.DataStore import DataStore
-from china_railway_tools.utils.cr_utils import parse_ticket_data, parse_stop_info_list
+from china_railway_tools.utils.circuit_breaker import CircuitOpenError, QueueFullError, get_circuit_breaker, \
+    is_upstream_failure, is_upstream_status
+from china_railway_tools.utils.cr_utils import parse_train_stocks, parse_stop_info_list
+from china_railway_tools.utils.fast_models import validate_rows
 from china_railway_tools.utils.http_utils import HeadersBuilder, get_async_client
+from china_railway_tools.utils.metrics import inc, span
+from china_railway_tools.utils.parse_executor import run_parse
+from china_railway_tools.utils.upstream_scheduler import INTERACTIVE, PRIORITY_NAMES, PriorityLimiter, \
+    get_upstream_priority
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +40,16 @@ FETCH_URLS = {
 }
 data_store: DataStore = DataStore()
 
-fetch_cookie_semaphore = asyncio.Semaphore()
+# asyncio.Semaphore 会绑定到首次等待它的事件循环, 每个事件循环使用各自的实例
+_loop_semaphores: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def get_loop_semaphore(key: str, value: int = 1) -> asyncio.Semaphore:
+    semaphores: dict = _loop_semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = semaphores.get(key)
+    if semaphore is None:
+        semaphore = semaphores[key] = asyncio.Semaphore(value)
+    return semaphore
 
 
 class CookieStore:
@@ -49,30 +66,72 @@ class CookieStore:
         return time.time() - self.cookie_time > self.timeout
 
     async def get_valid_cookie(self):
-        async with fetch_cookie_semaphore:
-            if self.is_cookie_expired():
-                self.logger.info("Cookie expired, fetching...")
-                self.cookie = await self.cookie_getter()
-                self.cookie_time = time.time()  # 更新获取cookie的时间
-            return self.cookie
+        with span('cookie_wait'):
+            async with get_loop_semaphore('fetch_cookie'):
+                if self.is_cookie_expired():
+                    self.logger.info("Cookie expired, fetching...")
+                    self.cookie = await self.cookie_getter()
+                    self.cookie_time = time.time()  # 更新获取cookie的时间
+                return self.cookie
 
 
 COOKIE_STORE = None
-store_semaphore = asyncio.Semaphore()
 
 
 def get_url(key: str):
     return FETCH_URLS.get(key)
 
 
-async def get_semaphore(key: str, max_concurrency: int = None) -> bool:
-    key_path = f'check.query.{key}'
-    semaphore = data_store.get(key_path)
-    max_concurrency = get_config(f'fetch_concurrency.{key}', max_concurrency or 5)
-    if not semaphore:
-        semaphore = asyncio.Semaphore(max_concurrency)
-        data_store.set(semaphore, key_path=key_path, ttl_seconds=86400)
-    return semaphore
+# 各接口的优先级调度器, 与 asyncio.Semaphore 一样绑定到事件循环
+_loop_limiters: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def get_limiter(key: str, max_concurrency: int = None) -> PriorityLimiter:
+    limiters: dict = _loop_limiters.setdefault(asyncio.get_running_loop(), {})
+    limiter = limiters.get(key)
+    if limiter is None:
+        max_concurrency = get_config(f'fetch_concurrency.{key}', max_concurrency or 5)
+        limiter = limiters[key] = PriorityLimiter(max_concurrency,
+                                                  get_config('fetch_scheduler.background_share', 0.2))
+    return limiter
+
+
+@asynccontextmanager
+async def acquire_semaphore(key: str):
+    """
+    按当前优先级(见 upstream_scheduler)获取 key 对应的并发额度, 并记录等待耗时.
+    熔断时直接抛出 CircuitOpenError; 同优先级等待的请求数达到上限时抛出 QueueFullError
+    """
+    breaker = get_circuit_breaker(key)
+    breaker.check()
+    priority = get_upstream_priority()
+    limiter = get_limiter(key)
+    if priority == INTERACTIVE:
+        max_queue = get_config('circuit_breaker.max_queue', 50)
+    else:
+        # 后台任务默认不限制排队, 批量加载时可能一次提交大量请求
+        max_queue = get_config('fetch_scheduler.max_background_queue')
+    if max_queue is not None and limiter.locked() and limiter.waiting(priority) >= max_queue:
+        inc('fetch_rejected', endpoint=key, reason='queue_full')
+        raise QueueFullError(key, f'{limiter.waiting(priority)} requests waiting')
+    with span('semaphore_wait', endpoint=key, priority=PRIORITY_NAMES.get(priority, str(priority))):
+        await limiter.acquire(priority)
+    try:
+        # 排队期间可能已经熔断
+        breaker.before_call()
+    except CircuitOpenError:
+        limiter.release(priority)
+        raise
+    failed = None
+    try:
+        yield
+        failed = False
+    except Exception as e:
+        failed = is_upstream_failure(e)
+        raise
+    finally:
+        breaker.after_call(failed)
+        limiter.release(priority)
 
 
 async def fetch_cookie() -> str:
@@ -90,15 +149,19 @@ async def fetch_cookie() -> str:
 
 async def get_cookie_store() -> CookieStore:
     global COOKIE_STORE
-    async with store_semaphore:
+    async with get_loop_semaphore('cookie_store'):
         if not COOKIE_STORE:
             COOKIE_STORE = CookieStore(60 * 180, fetch_cookie)
         return COOKIE_STORE
 
 
 async def fetch_trains(form, **kwargs) -> list:
-    semaphore = await get_semaphore('fetch_trains')
-    async with semaphore:
+    train_stocks = await fetch_train_stocks(form, **kwargs)
+    return train_stocks.to_train_infos() if train_stocks is not None else None
+
+
+async def fetch_train_stocks(form, **kwargs) -> TrainStocks:
+    async with acquire_semaphore('fetch_trains'):
         _url = get_url('QUERY_TICKETS')
         _params = {
             'leftTicketDTO.train_date': form.dep_date.strftime('%Y-%m-%d'),
@@ -112,20 +175,20 @@ async def fetch_trains(form, **kwargs) -> list:
             .add_header('Cookie', cookies) \
             .add_header('if-modified-since', '0').build()
         async with get_async_client() as client:
-            response = await client.get(_url, params=_params, headers=_headers, cookies=None)
-            if response.status_code == 302:
-                _url = get_url('QUERY_TICKETS2')
+            with span('http', endpoint='fetch_trains'):
                 response = await client.get(_url, params=_params, headers=_headers, cookies=None)
+                if response.status_code == 302:
+                    _url = get_url('QUERY_TICKETS2')
+                    response = await client.get(_url, params=_params, headers=_headers, cookies=None)
             response.raise_for_status()
             _raw_data = response.json()
             _x = _raw_data['data']
-            _result = await parse_ticket_data(_x, dep_date=form.dep_date.strftime('%Y-%m-%d'))
+            _result = await parse_train_stocks(_x, dep_date=form.dep_date.strftime('%Y-%m-%d'))
         return _result
 
 
 async def fetch_train_schedule(form: QueryTrainSchedule):
-    semaphore = await get_semaphore('fetch_train_schedule')
-    async with semaphore:
+    async with acquire_semaphore('fetch_train_schedule'):
         _url = get_url('QUERY_TRAIN_SCHEDULE')
         _params = {
             'leftTicketDTO.train_no': form.train_no,
@@ -137,7 +200,8 @@ async def fetch_train_schedule(form: QueryTrainSchedule):
             .add_header('Cookie', await (await get_cookie_store()).get_valid_cookie()) \
             .add_header('Referer', 'https://kyfw.12306.cn/otn/queryTrainInfo/init').build()
         async with get_async_client() as client:
-            response = await client.get(_url, params=_params, headers=_headers)
+            with span('http', endpoint='fetch_train_schedule'):
+                response = await client.get(_url, params=_params, headers=_headers)
             response.raise_for_status()
         raw_data = response.json()
         stop_info_list = raw_data.get('data', {}).get('data')
@@ -150,8 +214,7 @@ async def fetch_train_schedule(form: QueryTrainSchedule):
 
 
 async def fetch_train_no(train_code: str, train_date: str = (datetime.now()).strftime("%Y%m%d"), **kwargs):
-    semaphore = await get_semaphore('fetch_train_no')
-    async with semaphore:
+    async with acquire_semaphore('fetch_train_no'):
         train_date = train_date.replace("-", "")
         _url = get_url('QUERY_TRAIN_NO')
         _params = {
@@ -162,8 +225,12 @@ async def fetch_train_no(train_code: str, train_date: str = (datetime.now()).str
             .add_header('Cookie', await (await get_cookie_store()).get_valid_cookie()) \
             .add_header('Referer', 'https://kyfw.12306.cn/').build()
         async with get_async_client() as client:
-            response = await client.get(_url, params=_params, headers=_headers)
+            with span('http', endpoint='fetch_train_no'):
+                response = await client.get(_url, params=_params, headers=_headers)
             if response.status_code != 200:
+                # 5xx 和限流需要抛出, 由 acquire_semaphore 计入熔断; 其余视为查询不到
+                if is_upstream_status(response.status_code):
+                    response.raise_for_status()
                 return None
             _raw_data = response.json()
             _result = _raw_data.get('data')
@@ -171,36 +238,74 @@ async def fetch_train_no(train_code: str, train_date: str = (datetime.now()).str
             return train_no_model_list
 
 
+STATION_INDEX_URL = 'https://www.12306.cn/index/'
+
+
 async def fetch_all_stations() -> List[Station]:
     logger.info('fetch_all_stations')
+    station_name_js_url = await fetch_station_js_url()
+    response = await fetch_station_js(station_name_js_url)
+    return await parse_station_names_js_async(response.text)
+
+
+async def fetch_station_js_url() -> str:
+    """
+    从 12306 首页解析最新的车站js地址, 文件名带版本号, 如 station_name_v10001.js
+    """
     _headers = HeadersBuilder().build()
     async with get_async_client() as client:
-        response = await client.get('https://www.12306.cn/index/', headers=_headers)
+        response = await client.get(STATION_INDEX_URL, headers=_headers)
         response.raise_for_status()
-        tree = html.fromstring(response.text)
-        station_name_js_src = tree.xpath("//script[contains(@src, './script/core/common/station_name_')]/@src")[
-            0].strip('.')
-        if station_name_js_src:
-            station_name_js_url = urllib.parse.urljoin('https://www.12306.cn/', f'index{station_name_js_src}')
-            response = await client.get(station_name_js_url, headers=_headers)
-            response.raise_for_status()
-            text: str = response.text.strip("var station_names =").strip("';")
-            station_names = text.split("|||")
-            if station_names[-1] == '':
-                station_names = station_names[:-1]
-            stations = []
-            for station_name in station_names:
-                parts = station_name.strip("@").split('|')
-                if len(parts) < 8:
-                    logger.warning(f"解析车站失败:{station_name}")
-                    continue
-                try:
-                    station = Station(name=parts[1], pinyin_abbr=parts[0], pinyin=parts[3], code=parts[2],
-                                      city=parts[7])
-
-                except Exception as e:
-                    logger.warning(f'解析车站失败: {station_name} err:{exception_utils.extract_exception_traceback(e)}')
-                    continue
-                stations.append(station)
-            return stations
+    tree = html.fromstring(response.text)
+    station_name_js_src = tree.xpath("//script[contains(@src, './script/core/common/station_name_')]/@src")
+    if not station_name_js_src:
         raise Exception("获取所有车站失败, 解析最新车站js失败")
+    return urllib.parse.urljoin('https://www.12306.cn/', 'index' + station_name_js_src[0].strip('.'))
+
+
+async def fetch_station_js(station_name_js_url: str, etag: str = None, last_modified: str = None):
+    """
+    下载车站js, 传入上次的 ETag/Last-Modified 时使用条件请求, 未变化时返回 None
+    """
+    _headers = HeadersBuilder().build()
+    if etag:
+        _headers['If-None-Match'] = etag
+    if last_modified:
+        _headers['If-Modified-Since'] = last_modified
+    async with get_async_client() as client:
+        response = await client.get(station_name_js_url, headers=_headers)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    return response
+
+
+async def parse_station_names_js_async(js_text: str) -> List[Station]:
+    # 进程池模式下子进程只返回字符串元组, 模型在本进程中构建
+    rows = await run_parse(parse_station_rows, js_text, size=len(js_text), threshold='min_station_js_chars')
+    return validate_rows(Station, rows)
+
+
+def parse_station_names_js(js_text: str) -> List[Station]:
+    """
+    解析 station_name_*.js, 内容如 var station_names ='@bjb|北京北|VAP|beijingbei|bjb|0|0357|北京|||@...';
+    """
+    return validate_rows(Station, parse_station_rows(js_text))
+
+
+def parse_station_rows(js_text: str) -> List[tuple]:
+    """
+    :return: 按 Station 字段顺序排列的 (name, pinyin, pinyin_abbr, code, city)
+    """
+    text: str = js_text.strip("var station_names =").strip("';")
+    station_names = text.split("|||")
+    if station_names[-1] == '':
+        station_names = station_names[:-1]
+    rows = []
+    for station_name in station_names:
+        parts = station_name.strip("@").split('|')
+        if len(parts) < 8:
+            logger.warning(f"解析车站失败:{station_name}")
+            continue
+        rows.append((parts[1], parts[3], parts[0], parts[2], parts[7]))
+    return rows
@@ -5,6 +5,9 @@ from china_railway_tools.schemas.query import QueryTrains
 from china_railway_tools.schemas.train import *
 from china_railway_tools.utils.cr_decoder import decode_price, decode_ticket_data
 from china_railway_tools.utils.exception_utils import extract_exception_traceback
+from china_railway_tools.utils.metrics import span
+from china_railway_tools.utils.parse_executor import get_offload_mode, run_parse
+from china_railway_tools.utils.train_statics import TRAIN_STATICS
 
 logger = logging.getLogger(__name__)
 
@@ -106,32 +109,119 @@ def filter_train_by_code(train_info_list: List[TrainInfo], train_code_patterns:
 
 
 async def parse_ticket_data(_data: dict, dep_date: str) -> List[TrainInfo]:
+    train_stocks = await parse_train_stocks(_data, dep_date)
+    return train_stocks.to_train_infos() if train_stocks is not None else None
+
+
+async def parse_train_stocks(_data: dict, dep_date: str) -> TrainStocks:
     try:
-        _result = decode_ticket_data(_data['result'], _data['map'])
-        _result = [x.get('queryLeftNewDTO') for x in _result]
-        train_info_list = []
-        for item in _result:
-            _seat_types = [str(key).strip('num').upper() for key, value in item.items() if
-                           '_num' in key and value != '--']
-            # _prices: [{'price': 214, 'seatType': '一等座'}]
-            _prices = []
-            from_stop_info = StopInfo(station_name=item.get("from_station_name"), dep_time=item.get('start_time'))
-            to_stop_info = StopInfo(station_name=item.get("to_station_name"), arr_time=item.get('arrive_time'))
-            for _seat in _seat_types:
-                _p = decode_price(item['yp_info_new'], _seat)
-                if not _p:
-                    continue
-                _p['stock'] = item.get(f'{_seat.lower()}num')
-                _prices.append(_p)
-            item['prices'] = _prices
-            train_info = TrainInfo.from_raw_dict(dep_date, item, from_stop_info=from_stop_info,
-                                                 to_stop_info=to_stop_info)
-            train_info_list.append(train_info)
-        return train_info_list
+        size = len(_data['result'])
+        if get_offload_mode(size, 'min_ticket_rows') == 'process':
+            # 子进程只返回元组, 车次静态信息在本进程中从缓存读取或构建, 使多次查询共享同一份
+            rows = await run_parse(decode_ticket_rows, _data, size=size, threshold='min_ticket_rows')
+            return build_train_stocks(rows, dep_date)
+        return await run_parse(parse_ticket_stocks, _data, dep_date, size=size, threshold='min_ticket_rows')
     except Exception as e:
         logger.error(extract_exception_traceback(e))
 
 
+# 构建 TrainInfo 需要的 queryLeftNewDTO 字段, 进程池模式下只传递这些字段
+TICKET_STATIC_FIELDS = ('train_no', 'station_train_code', 'start_train_date', 'start_time', 'arrive_time',
+                        'from_station_name', 'from_station_telecode', 'to_station_name', 'to_station_telecode',
+                        'start_station_telecode', 'end_station_telecode')
+
+
+def decode_ticket_items(_data: dict) -> List[dict]:
+    with span('decode_ticket_data'):
+        _result = decode_ticket_data(_data['result'], _data['map'])
+    return [x.get('queryLeftNewDTO') for x in _result]
+
+
+def ticket_fingerprint(item: dict) -> tuple[tuple, List[str]]:
+    """
+    :return: (静态信息指纹, 有余票字段的席位)
+    """
+    _seat_types = [str(key).strip('num').upper() for key, value in item.items() if '_num' in key and value != '--']
+    fingerprint = (item['yp_info_new'], tuple(_seat_types), item['station_train_code'],
+                   item['start_train_date'], item.get('start_time'), item.get('arrive_time'))
+    return fingerprint, _seat_types
+
+
+def parse_ticket_stocks(_data: dict, dep_date: str) -> TrainStocks:
+    """
+    票价解码和模型校验只在车次静态信息未缓存或发生变化时进行, 其余只读取各席位余票
+    """
+    _result = decode_ticket_items(_data)
+    train_stocks = TrainStocks()
+    with span('parse_ticket_data'):
+        for item in _result:
+            fingerprint, _seat_types = ticket_fingerprint(item)
+            key = (item['from_station_telecode'], item['to_station_telecode'], item['train_no'])
+            static = TRAIN_STATICS.get(dep_date, key)
+            if static is None or static.fingerprint != fingerprint:
+                seat_codes, prices = decode_seat_prices(item, _seat_types)
+                static = build_train_static(dep_date, item, seat_codes, prices, fingerprint)
+                TRAIN_STATICS.set(dep_date, key, static)
+            stocks = tuple(item.get(f'{x.lower()}num') for x in static.seat_codes)
+            train_stocks.append(static, stocks)
+    return train_stocks
+
+
+def decode_ticket_rows(_data: dict) -> List[tuple]:
+    """
+    进程池中执行: 解码余票和票价, 每个车次返回一个只包含 str/tuple 的元组
+    (指纹, 席位代码, 票价, 余票, TICKET_STATIC_FIELDS 的值), 由 build_train_stocks 在本进程中还原
+    """
+    rows = []
+    for item in decode_ticket_items(_data):
+        fingerprint, _seat_types = ticket_fingerprint(item)
+        seat_codes, prices = decode_seat_prices(item, _seat_types)
+        stocks = tuple(item.get(f'{x.lower()}num') for x in seat_codes)
+        rows.append((fingerprint, tuple(seat_codes), tuple((x['seatType'], x['price']) for x in prices), stocks,
+                     tuple(item.get(x) for x in TICKET_STATIC_FIELDS)))
+    return rows
+
+
+def build_train_stocks(rows: List[tuple], dep_date: str) -> TrainStocks:
+    train_stocks = TrainStocks()
+    with span('parse_ticket_data'):
+        for fingerprint, seat_codes, prices, stocks, values in rows:
+            item = dict(zip(TICKET_STATIC_FIELDS, values))
+            key = (item['from_station_telecode'], item['to_station_telecode'], item['train_no'])
+            static = TRAIN_STATICS.get(dep_date, key)
+            if static is None or static.fingerprint != fingerprint:
+                prices = [{'seatType': seat_type, 'price': price, 'stock': ''} for seat_type, price in prices]
+                static = build_train_static(dep_date, item, list(seat_codes), prices, fingerprint)
+                TRAIN_STATICS.set(dep_date, key, static)
+            train_stocks.append(static, stocks)
+    return train_stocks
+
+
+def decode_seat_prices(item: dict, seat_types: List[str]) -> tuple[List[str], List[dict]]:
+    """
+    :return: (有票价的席位代码, 票价) 票价如 [{'price': 214, 'seatType': '一等座', 'stock': ''}]
+    """
+    _prices = []
+    seat_codes = []
+    for _seat in seat_types:
+        _p = decode_price(item['yp_info_new'], _seat)
+        if not _p:
+            continue
+        _p['stock'] = ''
+        _prices.append(_p)
+        seat_codes.append(_seat)
+    return seat_codes, _prices
+
+
+def build_train_static(dep_date: str, item: dict, seat_codes: List[str], prices: List[dict],
+                       fingerprint: tuple) -> TrainStatic:
+    from_stop_info = {'station_name': item.get("from_station_name"), 'dep_time': item.get('start_time')}
+    to_stop_info = {'station_name': item.get("to_station_name"), 'arr_time': item.get('arrive_time')}
+    item['prices'] = prices
+    train = TrainInfo.from_raw_dict(dep_date, item, from_stop_info=from_stop_info, to_stop_info=to_stop_info)
+    return TrainStatic(train, tuple(seat_codes), fingerprint)
+
+
 def parse_time_to_minutes(dt: datetime) -> int:
     return dt.hour * 60 + dt.minute
 
@@ -3,6 +3,7 @@ from datetime import datetime
 from typing import Callable
 
 from china_railway_tools.schemas.query import QueryTrains
+from china_railway_tools.utils.metrics import span
 
 
 def validate_query_train(get_station: Callable) -> Callable:
@@ -10,7 +11,8 @@ def validate_query_train(get_station: Callable) -> Callable:
         @functools.wraps(func)
         async def wrapper(form: QueryTrains, *args, **kwargs):
             # 在调用目标函数前进行校验/转换
-            await form.parse_station_name2code(get_station)
+            with span('station_resolution'):
+                await form.parse_station_name2code(get_station)
             # 执行被装饰的函数
             return await func(form, *args, **kwargs)
 
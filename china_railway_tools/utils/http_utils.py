@@ -1,9 +1,15 @@
+import asyncio
 import logging
+import time
 import traceback
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from weakref import WeakKeyDictionary, WeakSet
 
 import httpx
 from httpx import Request, Response
 
+from china_railway_tools.config import get_config
+from china_railway_tools.utils import metrics
 from china_railway_tools.utils.exception_utils import extract_traceback
 
 logger = logging.getLogger(__name__)
@@ -24,22 +30,133 @@ class HeadersBuilder:
         return self.headers
 
 
-class LoggingEventHook:
-    async def __call__(self, event, **kwargs):
-        if type(event) is Request:
-            request = event
-            logger.debug(f"Fetching URL: {request.url}")
-        elif type(event) is Response:
-            response = event
-            request = response.request
-            if response.status_code != 200:
-                logger.warning(f"Response Code: {response.status_code} for fetch URL: {request.url} "
-                               f"Method: {request.method} {'Params:' + request.json() if request.method == 'POST' else ''} "
-                               f"Called by: {extract_traceback(traceback.extract_stack())}")
-            else:
-                pass
-
-
-def get_async_client():
-    event_hook = LoggingEventHook()
-    return httpx.AsyncClient(event_hooks={"request": [event_hook], "response": [event_hook]})
+class RequestStats:
+    __slots__ = ('start', 'traced', 'new_connection')
+
+    def __init__(self, start: float):
+        self.start = start
+        self.traced = False
+        self.new_connection = False
+
+    async def trace(self, event_name: str, info: dict):
+        # httpcore 的 trace 扩展, 出现建立连接事件说明没有复用连接池中的连接
+        self.traced = True
+        if event_name == 'connection.connect_tcp.started':
+            self.new_connection = True
+
+
+class HttpEventHook:
+    """
+    记录各接口耗时/状态码/流量/连接复用情况, 指标关闭时只检查状态码.
+    非 200 响应只记录 url 与状态码, 开启 http_debug_stack 时才附带调用栈;
+    queryU 的 302 是正常的接口切换, 条件请求的 304 表示未变化, 都只在 debug 级别记录
+    """
+    STATS_KEY = 'cr_tools.stats'
+
+    async def on_request(self, request: Request):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Fetching URL: %s", request.url)
+        if metrics.METRICS.enabled:
+            stats = RequestStats(time.perf_counter())
+            request.extensions[self.STATS_KEY] = stats
+            request.extensions['trace'] = stats.trace
+
+    async def on_response(self, response: Response):
+        request = response.request
+        status_code = response.status_code
+        if status_code != 200:
+            self.log_response(response)
+        stats: RequestStats | None = request.extensions.get(self.STATS_KEY)
+        if stats is None or not metrics.METRICS.enabled:
+            return
+        await response.aread()
+        endpoint = request.url.path
+        metrics.observe('http_request_seconds', time.perf_counter() - stats.start, endpoint=endpoint)
+        metrics.inc('http_responses', endpoint=endpoint, status=str(status_code))
+        metrics.inc('http_received_bytes', response.num_bytes_downloaded or len(response.content), endpoint=endpoint)
+        # 自定义 transport (如 MockTransport) 不经过 httpcore, 无法判断连接复用
+        if stats.traced:
+            metrics.inc('http_connections', endpoint=endpoint, reused='false' if stats.new_connection else 'true')
+
+    @staticmethod
+    def log_response(response: Response):
+        request = response.request
+        level = logging.DEBUG if response.status_code in (302, 304) else logging.WARNING
+        if not logger.isEnabledFor(level):
+            return
+        if get_config('http_debug_stack', False):
+            logger.log(level, "Response Code: %s for fetch URL: %s Method: %s Called by: %s", response.status_code,
+                       request.url, request.method, extract_traceback(traceback.extract_stack()))
+        else:
+            logger.log(level, "Response Code: %s for fetch URL: %s Method: %s", response.status_code, request.url,
+                       request.method)
+
+
+# 替换发送请求的 transport, 如测试或压测时使用 httpx.MockTransport 模拟 12306
+_transport: httpx.AsyncBaseTransport | None = None
+
+# 每个事件循环共享一个 AsyncClient, 复用连接池
+_shared_clients: WeakKeyDictionary = WeakKeyDictionary()
+# 由调用方负责关闭共享客户端的事件循环(如 SyncClient 的常驻事件循环)
+_sharing_loops: WeakSet = WeakSet()
+
+
+def set_transport(transport: httpx.AsyncBaseTransport | None):
+    global _transport
+    _transport = transport
+    _shared_clients.clear()
+
+
+HTTP_EVENT_HOOK = HttpEventHook()
+
+
+def new_async_client() -> httpx.AsyncClient:
+    # cookie 由调用方通过请求头传入, 不保存响应中的 Set-Cookie
+    return httpx.AsyncClient(event_hooks={"request": [HTTP_EVENT_HOOK.on_request],
+                                          "response": [HTTP_EVENT_HOOK.on_response]}, transport=_transport,
+                             cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])))
+
+
+class SharedClient:
+    """
+    async with get_async_client() as client 的共享版本, 退出时不关闭 client
+    """
+    __slots__ = ('client',)
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        return self.client
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+def share_client_in_loop(loop: asyncio.AbstractEventLoop = None):
+    """
+    loop(默认为当前事件循环)内的请求共享一个 AsyncClient, 不受 http_shared_client 配置影响.
+    调用方需在事件循环关闭前调用 close_shared_client(), 否则连接池不会被关闭
+    """
+    _sharing_loops.add(loop or asyncio.get_running_loop())
+
+
+def get_async_client() -> httpx.AsyncClient | SharedClient:
+    loop = asyncio.get_running_loop()
+    if loop not in _sharing_loops and not get_config('http_shared_client', False):
+        return new_async_client()
+    client = _shared_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _shared_clients[loop] = new_async_client()
+    return SharedClient(client)
+
+
+async def close_shared_client():
+    """
+    关闭当前事件循环的共享 AsyncClient, 应在事件循环关闭前调用
+    """
+    loop = asyncio.get_running_loop()
+    _sharing_loops.discard(loop)
+    client = _shared_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
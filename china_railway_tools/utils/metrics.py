@@ -0,0 +1,242 @@
+"""
+轻量的耗时与计数指标.
+默认关闭, 关闭时 span() 返回共享的空上下文管理器, inc()/observe() 直接返回, 几乎没有开销.
+
+    enable_metrics()
+    with span('http', endpoint='fetch_trains'):
+        ...
+    print(export_prometheus())
+"""
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from china_railway_tools.utils.exception_utils import extract_exception_traceback
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'cr_tools'
+# 各阶段耗时的直方图名称, span 的名称作为 stage 标签
+STAGE_HISTOGRAM = 'stage_seconds'
+
+
+def label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    """
+    Prometheus 格式的标签, 如 {endpoint="fetch_trains",stage="http"}, 没有标签时为空字符串
+    """
+    pairs = (*key, *extra)
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.enabled = False
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.callbacks: List[Callable[[str, float, dict], None]] = []
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges.setdefault(name, {})[label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+        for callback in self.callbacks:
+            # 回调出错不能影响被统计的查询(如 acquire_semaphore 中获取额度后的 span 退出)
+            try:
+                callback(name, value, labels)
+            except Exception as e:
+                logger.warning(f'Metrics callback failed: {extract_exception_traceback(e)}')
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> dict:
+        """
+        可直接 json 序列化的指标, 各序列以 format_labels 格式的标签为键, 分桶以上界(最后一个为 +Inf)为键
+        """
+        with self._lock:
+            return {
+                'counters': {name: {format_labels(key): v for key, v in series.items()}
+                             for name, series in self.counters.items()},
+                'gauges': {name: {format_labels(key): v for key, v in series.items()}
+                           for name, series in self.gauges.items()},
+                'histograms': {name: {format_labels(key): {'count': h.count, 'sum': h.sum,
+                                                           'buckets': dict(zip((*map(str, h.buckets), '+Inf'),
+                                                                               h.counts))}
+                                      for key, h in series.items()}
+                               for name, series in self.histograms.items()},
+            }
+
+    def export_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                metric = f'{METRIC_PREFIX}_{name}_total'
+                lines.append(f'# TYPE {metric} counter')
+                lines.extend(f'{metric}{format_labels(key)} {value}' for key, value in series.items())
+            for name, series in sorted(self.gauges.items()):
+                metric = f'{METRIC_PREFIX}_{name}'
+                lines.append(f'# TYPE {metric} gauge')
+                lines.extend(f'{metric}{format_labels(key)} {value}' for key, value in series.items())
+            for name, series in sorted(self.histograms.items()):
+                metric = f'{METRIC_PREFIX}_{name}'
+                lines.append(f'# TYPE {metric} histogram')
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{format_labels(key, (("le", str(bound)),))} {cumulative}')
+                    lines.append(f'{metric}_sum{format_labels(key)} {histogram.sum}')
+                    lines.append(f'{metric}_count{format_labels(key)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
+
+
+class Span:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.labels['error'] = exc_type.__name__
+        METRICS.observe(STAGE_HISTOGRAM, time.perf_counter() - self.start, stage=self.name, **self.labels)
+        return False
+
+
+class NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def span(name: str, **labels) -> Span | NoopSpan:
+    """
+    记录一个阶段的耗时, 同步与异步代码中均使用 with
+    """
+    if not METRICS.enabled:
+        return NOOP_SPAN
+    return Span(name, labels)
+
+
+def timed(name: str, **labels):
+    """
+    记录异步函数整体耗时的装饰器
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def inc(name: str, value: float = 1, **labels):
+    if METRICS.enabled:
+        METRICS.inc(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels):
+    if METRICS.enabled:
+        METRICS.set_gauge(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    if METRICS.enabled:
+        METRICS.observe(name, value, **labels)
+
+
+def record_cache(cache: str, hit: bool):
+    if METRICS.enabled:
+        METRICS.inc('cache_requests', cache=cache, result='hit' if hit else 'miss')
+
+
+def enable_metrics(enabled: bool = True):
+    METRICS.enabled = enabled
+
+
+def add_metrics_callback(callback: Callable[[str, float, dict], None]):
+    """
+    :param callback: 每次记录耗时时调用, callback(metric_name, seconds, labels)
+    """
+    METRICS.callbacks.append(callback)
+
+
+def remove_metrics_callback(callback: Callable[[str, float, dict], None]):
+    if callback in METRICS.callbacks:
+        METRICS.callbacks.remove(callback)
+
+
+def export_prometheus() -> str:
+    return METRICS.export_prometheus()
+
+
+if os.environ.get('CR_TOOLS_METRICS'):
+    enable_metrics()
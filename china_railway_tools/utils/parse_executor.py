@@ -0,0 +1,76 @@
+"""
+把较大的余票/车站数据解析放到线程池或进程池中执行, 避免长时间占用事件循环.
+由配置 parse_executor 控制, 默认关闭; 数据量小于阈值时仍在当前线程解析.
+
+进程池模式下只传递原始响应(字符串)给子进程, 子进程只返回由 str/tuple 组成的紧凑结果, 模型在本进程中构建
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+from china_railway_tools.config import get_config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_executors: Dict[str, Executor] = {}
+_lock = threading.Lock()
+
+
+def init_parse_worker():
+    """
+    子进程只做解析, 之后导入包时不需要初始化数据库和车站; 只修改子进程的环境变量
+    """
+    os.environ['CR_TOOLS_SKIP_INIT'] = '1'
+
+
+def get_parse_executor(mode: str) -> Executor:
+    with _lock:
+        executor = _executors.get(mode)
+        if executor is not None:
+            return executor
+        max_workers = get_config('parse_executor.max_workers')
+        if mode == 'thread':
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cr_tools_parse')
+        elif mode == 'process':
+            executor = ProcessPoolExecutor(max_workers=max_workers, initializer=init_parse_worker)
+        else:
+            raise ValueError(f'Unknown parse executor mode: {mode}, expected thread or process')
+        _executors[mode] = executor
+        return executor
+
+
+def get_offload_mode(size: int, threshold: str) -> Optional[str]:
+    """
+    :return: 数据量达到阈值时返回 thread/process, 否则返回 None(在当前线程解析)
+    """
+    mode = get_config('parse_executor.mode')
+    if not mode or size < get_config(f'parse_executor.{threshold}', 0):
+        return None
+    return mode
+
+
+async def run_parse(func: Callable[..., T], *args, size: int, threshold: str) -> T:
+    """
+    :param func: 同步的解析函数, 进程池模式下须可被 pickle(模块级函数), 且应返回 str/tuple 等紧凑结果
+    :param size: 数据量, 如余票条数或js长度
+    :param threshold: parse_executor 中对应的阈值配置名, size 小于阈值时直接调用 func
+    """
+    mode = get_offload_mode(size, threshold)
+    if mode is None:
+        return func(*args)
+    executor = get_parse_executor(mode)
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args))
+
+
+def shutdown_parse_executors(wait: bool = True):
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Awaitable, List, Tuple, Optional, Dict
+
+from china_railway_tools.config import get_config
+from china_railway_tools.schemas.query import QueryTrains
+from china_railway_tools.utils.exception_utils import extract_exception_traceback
+from china_railway_tools.utils.upstream_scheduler import BACKGROUND, upstream_priority
+
+logger = logging.getLogger(__name__)
+
+# 所有的查询观察者, 每次 query_tickets 调用后通知: observer(query_key, hit)
+_query_observers: List[Callable[[str, bool], None]] = []
+
+
+def add_query_observer(observer: Callable[[str, bool], None]):
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+
+
+def remove_query_observer(observer: Callable[[str, bool], None]):
+    if observer in _query_observers:
+        _query_observers.remove(observer)
+
+
+def notify_query(query_key: str, hit: bool):
+    for observer in _query_observers:
+        try:
+            observer(query_key, hit)
+        except Exception as e:
+            logger.warning(f'Query observer failed: {extract_exception_traceback(e)}')
+
+
+def split_query_key(query_key: str) -> Tuple[str, str, str]:
+    """
+    :param query_key: like GZQ-NJH-2025-01-01
+    :return: (from_station_code, to_station_code, dep_date)
+    """
+    from_code, to_code, dep_date = query_key.split('-', 2)
+    return from_code, to_code, dep_date
+
+
+class PrefetchScheduler:
+    """
+    热门线路余票预取: 按固定周期为未来若干天的热门线路预热缓存, 使用户请求直接命中缓存.
+    线路可以手动指定, 也可以从 query_tickets 的查询记录中学习.
+    """
+
+    def __init__(self, query_tickets: Callable[..., Awaitable], routes: List[Tuple[str, str]] = None, **kwargs):
+        """
+        :param query_tickets: 余票查询函数, 即 api.query_tickets
+        :param routes: 线路列表, 如 [('GZQ', 'NJH')], 元素为出发站/到达站的电报码或站名. 为空时从查询记录学习
+        """
+        self.query_tickets = query_tickets
+        self.routes: List[Tuple[str, str]] = list(routes or [])
+        self.learn: bool = kwargs.get('learn', get_config('prefetch.learn'))
+        if self.learn is None:
+            self.learn = not self.routes
+        self.top_routes: int = kwargs.get('top_routes', get_config('prefetch.top_routes', 20))
+        self.days_ahead: int = kwargs.get('days_ahead', get_config('prefetch.days_ahead', 3))
+        self.interval_seconds: int = kwargs.get('interval_seconds', get_config('prefetch.interval_seconds', 300))
+        # 两次预取请求之间的最小间隔, 保证预取不会挤占 fetch_trains 的并发额度
+        self.min_fetch_interval: float = kwargs.get('min_fetch_interval',
+                                                    get_config('prefetch.min_fetch_interval', 1.0))
+        self.cache_ttl: int = kwargs.get('cache_ttl', get_config('prefetch.cache_ttl', self.interval_seconds * 2))
+
+        self.observed_routes: Counter = Counter()
+        # 最近一次由预取写入缓存的 query_key -> 写入时间
+        self.warmed_keys: Dict[str, float] = {}
+        self.stats = {
+            'prefetched': 0,
+            'prefetch_failed': 0,
+            'cycles': 0,
+            'warmed_hits': 0,
+            'warmed_misses': 0,
+            'other_hits': 0,
+            'other_misses': 0,
+        }
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event = asyncio.Event()
+
+    def observe(self, query_key: str, hit: bool):
+        """
+        query_tickets 的观察者: 学习热门线路并统计缓存命中
+        """
+        try:
+            from_code, to_code, _ = split_query_key(query_key)
+        except ValueError:
+            return
+        if self.learn:
+            self.observed_routes[(from_code, to_code)] += 1
+        warmed = query_key in self.warmed_keys and time.time() - self.warmed_keys[query_key] < self.cache_ttl
+        prefix = 'warmed' if warmed else 'other'
+        self.stats[f'{prefix}_{"hits" if hit else "misses"}'] += 1
+
+    def get_routes(self) -> List[Tuple[str, str]]:
+        routes = list(self.routes)
+        if self.learn:
+            for route, _ in self.observed_routes.most_common(self.top_routes):
+                if route not in routes:
+                    routes.append(route)
+        return routes
+
+    def get_dates(self) -> List[datetime]:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return [today + timedelta(days=x) for x in range(self.days_ahead)]
+
+    def hit_rate_uplift(self) -> dict:
+        """
+        预取线路的缓存命中率与其他线路命中率的差值
+        """
+
+        def rate(hits: int, misses: int) -> Optional[float]:
+            total = hits + misses
+            return hits / total if total else None
+
+        warmed_rate = rate(self.stats['warmed_hits'], self.stats['warmed_misses'])
+        other_rate = rate(self.stats['other_hits'], self.stats['other_misses'])
+        uplift = None
+        if warmed_rate is not None and other_rate is not None:
+            uplift = warmed_rate - other_rate
+        return {
+            'warmed_hit_rate': warmed_rate,
+            'other_hit_rate': other_rate,
+            'uplift': uplift,
+            **self.stats,
+        }
+
+    async def prefetch_route(self, from_station: str, to_station: str, dep_date: datetime):
+        form = QueryTrains(dep_date=dep_date, force_update=True, exact=False)
+        if from_station.isupper() and from_station.isalpha():
+            form.from_station_code = from_station
+        else:
+            form.from_station_name = from_station
+        if to_station.isupper() and to_station.isalpha():
+            form.to_station_code = to_station
+        else:
+            form.to_station_name = to_station
+        try:
+            with upstream_priority(BACKGROUND):
+                await self.query_tickets(form, cache_ttl=self.cache_ttl, prefetch=True)
+            query_key = f'{form.from_station_code}-{form.to_station_code}-{dep_date.strftime("%Y-%m-%d")}'
+            self.warmed_keys[query_key] = time.time()
+            self.stats['prefetched'] += 1
+        except Exception as e:
+            self.stats['prefetch_failed'] += 1
+            logger.warning(f'Prefetch {from_station}-{to_station} failed: {extract_exception_traceback(e)}')
+
+    async def run_once(self):
+        now = time.time()
+        self.warmed_keys = {k: v for k, v in self.warmed_keys.items() if now - v < self.cache_ttl}
+        for from_station, to_station in self.get_routes():
+            for dep_date in self.get_dates():
+                if self._stop_event.is_set():
+                    return
+                await self.prefetch_route(from_station, to_station, dep_date)
+                # 低优先级: 让出事件循环并限制预取速率
+                await asyncio.sleep(self.min_fetch_interval)
+        self.stats['cycles'] += 1
+        logger.info(f'Prefetch cycle finished: {self.hit_rate_uplift()}')
+
+    async def _run_forever(self):
+        while not self._stop_event.is_set():
+            started = time.time()
+            await self.run_once()
+            wait_seconds = max(0.0, self.interval_seconds - (time.time() - started))
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=wait_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._stop_event.clear()
+            add_query_observer(self.observe)
+            self._task = asyncio.create_task(self._run_forever())
+        return self._task
+
+    async def stop(self):
+        self._stop_event.set()
+        remove_query_observer(self.observe)
+        if self._task is not None:
+            await self._task
+            self._task = None
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from china_railway_tools.config import get_config
+from china_railway_tools.schemas.train import TrainSchedule
+from china_railway_tools.utils.metrics import inc, record_cache, set_gauge
+
+# (train_no, train_date)
+ScheduleKey = Tuple[str, str]
+
+
+class ScheduleCache:
+    """
+    query_train_schedule 的内存缓存, 位于 SQLite 缓存(query_cached_result)之前.
+    按 (train_no, train_date) 保存, 最多 schedule_cache.max_size 条, 超出时淘汰最久未使用的; 每条 ttl 秒后过期.
+    查询不到的时刻表保存为 None, negative_ttl 秒内不再查询.
+    另外保存 (train_code, train_date) -> train_no, 按车次查询时不需要先查询车次编号.
+    返回的 TrainSchedule 在多次查询间共享, 调用方不应修改
+    """
+
+    def __init__(self):
+        self._entries: OrderedDict[ScheduleKey, Tuple[Optional[TrainSchedule], float]] = OrderedDict()
+        self._aliases: Dict[ScheduleKey, str] = {}
+        # 每条缓存对应的车次, 淘汰时删除别名
+        self._codes: Dict[ScheduleKey, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, train_date: str, train_no: str = None, train_code: str = None) -> \
+            Tuple[bool, Optional[TrainSchedule]]:
+        """
+        :return: (是否命中, 时刻表), 命中的 None 表示该车次没有时刻表
+        """
+        if not train_no and train_code:
+            train_no = self._aliases.get((train_code, train_date))
+        found, train_schedule = False, None
+        if train_no:
+            key = (train_no, train_date)
+            with self._lock:
+                record = self._entries.get(key)
+                if record is not None:
+                    if record[1] > time.monotonic():
+                        self._entries.move_to_end(key)
+                        found, train_schedule = True, record[0]
+                    else:
+                        self._remove(key)
+        record_cache('train_schedule_memory', found)
+        if found and train_schedule is None:
+            inc('schedule_cache_negative_hits')
+        return found, train_schedule
+
+    def set(self, train_date: str, train_no: str, train_schedule: Optional[TrainSchedule], train_code: str = None):
+        max_size = get_config('schedule_cache.max_size', 2000)
+        if train_schedule is not None:
+            ttl = get_config('schedule_cache.ttl', 3600)
+        else:
+            ttl = get_config('schedule_cache.negative_ttl', 60)
+        if not train_no or not max_size or not ttl:
+            return
+        key = (train_no, train_date)
+        with self._lock:
+            self._entries[key] = (train_schedule, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            if train_code:
+                self._aliases[(train_code, train_date)] = train_no
+                self._codes.setdefault(key, set()).add(train_code)
+            evicted = 0
+            while len(self._entries) > max_size:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            size = len(self._entries)
+        if evicted:
+            inc('schedule_cache_evictions', evicted)
+        set_gauge('schedule_cache_size', size)
+
+    def _remove(self, key: ScheduleKey):
+        self._entries.pop(key, None)
+        train_no, train_date = key
+        for train_code in self._codes.pop(key, ()):
+            if self._aliases.get((train_code, train_date)) == train_no:
+                del self._aliases[(train_code, train_date)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self._codes.clear()
+        set_gauge('schedule_cache_size', 0)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+SCHEDULE_CACHE = ScheduleCache()
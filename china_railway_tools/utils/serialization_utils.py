@@ -1,18 +1,95 @@
 import json
-from typing import Type
+from decimal import Decimal
+from functools import lru_cache
+from typing import Type, Any, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
+from china_railway_tools.config import get_config
 
-def to_json(_obj: dict | BaseModel):
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为可选依赖
+    orjson = None
+
+
+def json_default(_obj: Any):
     if isinstance(_obj, BaseModel):
-        return _obj.model_dump_json()
-    elif isinstance(_obj, dict):
-        return json.dumps(_obj, ensure_ascii=False)
-    return json.dumps(_obj, ensure_ascii=False)
+        return _obj.model_dump(mode='json')
+    if isinstance(_obj, Decimal):
+        return str(_obj)
+    if isinstance(_obj, (set, frozenset)):
+        return list(_obj)
+    raise TypeError(f'Object of type {type(_obj).__name__} is not JSON serializable')
+
+
+class JsonSerializer:
+    name = 'json'
+
+    def dumps(self, _obj: Any) -> bytes:
+        return json.dumps(_obj, ensure_ascii=False, default=json_default).encode()
+
+    def loads(self, data: bytes | str) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    name = 'orjson'
+
+    def dumps(self, _obj: Any) -> bytes:
+        return orjson.dumps(_obj, default=json_default)
+
+    def loads(self, data: bytes | str) -> Any:
+        return orjson.loads(data)
+
+
+SERIALIZERS = {
+    'json': JsonSerializer,
+    'orjson': OrjsonSerializer,
+}
+
+
+@lru_cache(maxsize=None)
+def _get_serializer(name: str):
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson' and orjson is None:
+        raise ImportError('orjson is not installed, run `pip install orjson` or set serializer to json')
+    return SERIALIZERS[name]()
+
+
+def get_serializer() -> JsonSerializer | OrjsonSerializer:
+    """
+    根据配置 serializer(auto/orjson/json) 获取序列化器, auto 在安装了 orjson 时使用 orjson
+    """
+    return _get_serializer(get_config('serializer', 'auto'))
+
+
+@lru_cache(maxsize=None)
+def list_adapter(pydantic_class: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[pydantic_class])
+
+
+def to_json_bytes(_obj: Any) -> bytes:
+    """
+    序列化为 JSON bytes, 可直接作为 HTTP 响应体或写入查询缓存.
+    pydantic 模型及模型列表由 pydantic-core 直接输出 bytes(比 model_dump 后交给 orjson 更快),
+    其他对象使用 get_serializer()
+    """
+    if isinstance(_obj, BaseModel):
+        return _obj.__pydantic_serializer__.to_json(_obj)
+    if isinstance(_obj, list) and _obj and all(type(x) is type(_obj[0]) for x in _obj) \
+            and isinstance(_obj[0], BaseModel):
+        return list_adapter(type(_obj[0])).dump_json(_obj)
+    return get_serializer().dumps(_obj)
+
+
+def to_json(_obj: dict | BaseModel) -> str:
+    return to_json_bytes(_obj).decode()
 
 
-def to_obj(_obj: dict | str, pydantic_class: Type[BaseModel]) -> BaseModel:
-    if isinstance(_obj, str):
-        _obj = json.loads(_obj)
+def to_obj(_obj: dict | str | bytes, pydantic_class: Type[BaseModel]) -> BaseModel:
+    if isinstance(_obj, (str, bytes)):
+        # 由 pydantic-core 直接解析 JSON, 不经过中间 dict
+        return pydantic_class.model_validate_json(_obj)
     return pydantic_class(**_obj)
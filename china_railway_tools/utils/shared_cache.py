@@ -0,0 +1,196 @@
+"""
+多进程共享的缓存, 接口与 DataStore 的 get/set/delete 一致, 数据保存在 WAL 模式的 sqlite 文件中.
+get_or_fetch 通过锁表实现跨进程的 single-flight: 同一个 key 只有一个进程请求 12306, 其他进程等待后读取缓存.
+
+get/set 在事件循环中直接调用, 只等待 busy_timeout 秒的写锁, 超时时视为未命中/不写入;
+get_or_fetch 中的读写和锁操作放到线程中执行, 不阻塞事件循环.
+
+缓存文件位于用户数据目录, 值使用 pickle 序列化, 只应在同一用户的进程间共享
+"""
+import asyncio
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from china_railway_tools.config import get_config, get_data_dir
+from china_railway_tools.utils.DataStore import DataStore
+from china_railway_tools.utils.circuit_breaker import FetchRejectedError
+from china_railway_tools.utils.metrics import inc
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_NAME = 'shared_cache.db'
+CLEAN_EVERY_SETS = 200
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS tb_cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)',
+    'CREATE TABLE IF NOT EXISTS tb_cache_lock (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)',
+)
+
+
+class SingleFlightTimeoutError(FetchRejectedError):
+    """
+    等待其他进程请求超过 lock_timeout 秒仍没有结果
+    """
+    pass
+
+
+class SharedCache:
+    def __init__(self, path: str = None, lock_timeout: float = None, poll_interval: float = None,
+                 busy_timeout: float = None):
+        self.path = path or get_config('shared_cache.path') or os.path.join(get_data_dir(), CACHE_FILE_NAME)
+        self.lock_timeout = lock_timeout or get_config('shared_cache.lock_timeout', 30)
+        self.poll_interval = poll_interval or get_config('shared_cache.poll_interval', 0.05)
+        self.busy_timeout = busy_timeout or get_config('shared_cache.busy_timeout', 0.05)
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._local = threading.local()
+        self._set_count = 0
+        with self._connect(10) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self, timeout: float) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # sqlite3 连接不能跨线程使用, 每个线程一个; 可能在事件循环中使用, 只短暂等待写锁
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect(self.busy_timeout)
+        return conn
+
+    @property
+    def blocking_conn(self) -> sqlite3.Connection:
+        """
+        只在 asyncio.to_thread 的线程中使用, 可以等待较长时间的写锁
+        """
+        conn = getattr(self._local, 'blocking_conn', None)
+        if conn is None:
+            conn = self._local.blocking_conn = self._connect(10)
+        return conn
+
+    @staticmethod
+    def _get(conn: sqlite3.Connection, key: str) -> Any:
+        row = conn.execute('SELECT value FROM tb_cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                           (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def _set(self, conn: sqlite3.Connection, value, key: str, ttl_seconds: int = None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None
+        conn.execute('INSERT OR REPLACE INTO tb_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                     (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at))
+        self._set_count += 1
+        if self._set_count % CLEAN_EVERY_SETS == 0:
+            self.clear_expired(conn)
+
+    def get(self, key: str) -> Any:
+        try:
+            return self._get(self.conn, key)
+        except sqlite3.OperationalError as e:
+            # 其他进程长时间持有写锁时视为未命中, 不阻塞事件循环
+            logger.debug(f'Shared cache get {key} failed: {e}')
+            inc('shared_cache_busy', op='get')
+            return None
+
+    def set(self, value, key_path: str = None, ttl_seconds: int = None, **kwargs):
+        try:
+            self._set(self.conn, value, key_path, ttl_seconds)
+        except sqlite3.OperationalError as e:
+            logger.debug(f'Shared cache set {key_path} failed: {e}')
+            inc('shared_cache_busy', op='set')
+
+    def delete(self, key_path: str):
+        self.conn.execute('DELETE FROM tb_cache WHERE key = ?', (key_path,))
+
+    def clear_expired(self, conn: sqlite3.Connection = None):
+        conn = conn or self.conn
+        now = time.time()
+        conn.execute('DELETE FROM tb_cache WHERE expires_at <= ?', (now,))
+        conn.execute('DELETE FROM tb_cache_lock WHERE expires_at <= ?', (now,))
+
+    def try_lock(self, key: str) -> bool:
+        """
+        原子地获取 key 的锁, 锁已过期(持有进程崩溃)时可被抢占. 阻塞调用, 在线程中执行
+        """
+        now = time.time()
+        cursor = self.blocking_conn.execute(
+            'INSERT INTO tb_cache_lock (key, owner, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+            'WHERE tb_cache_lock.expires_at <= ?',
+            (key, self.owner, now + self.lock_timeout, now))
+        return cursor.rowcount == 1
+
+    def unlock(self, key: str):
+        self.blocking_conn.execute('DELETE FROM tb_cache_lock WHERE key = ? AND owner = ?', (key, self.owner))
+
+    def is_locked(self, key: str) -> bool:
+        row = self.blocking_conn.execute('SELECT 1 FROM tb_cache_lock WHERE key = ? AND expires_at > ?',
+                                (key, time.time())).fetchone()
+        return row is not None
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl_seconds: int = None,
+                           empty_ttl_seconds: int = None, force: bool = False) -> Any:
+        """
+        :param fetch: 缓存不存在时调用, 同一时间只有一个进程调用
+        :param empty_ttl_seconds: fetch 返回空值时的缓存时间, None 不缓存
+        :param force: 不读取缓存, 仍然与其他进程合并请求
+        :raise SingleFlightTimeoutError: 等待其他进程超过 lock_timeout 秒仍没有结果, 不再自行请求,
+            避免所有等待者同时请求 12306
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            if not force and (value := await asyncio.to_thread(self._get_blocking, key)) is not None:
+                return value
+            if await asyncio.to_thread(self.try_lock, key):
+                try:
+                    value = await fetch()
+                    if value:
+                        await asyncio.to_thread(self._set_blocking, value, key, ttl_seconds)
+                    elif value is not None and empty_ttl_seconds is not None:
+                        await asyncio.to_thread(self._set_blocking, value, key, empty_ttl_seconds)
+                    return value
+                finally:
+                    await asyncio.shield(asyncio.to_thread(self.unlock, key))
+            # 其他进程正在请求, 等待其写入缓存
+            while time.monotonic() < deadline and await asyncio.to_thread(self.is_locked, key):
+                await asyncio.sleep(self.poll_interval)
+            force = False
+            if time.monotonic() >= deadline:
+                value = await asyncio.to_thread(self._get_blocking, key)
+                if value is not None:
+                    return value
+                inc('fetch_rejected', endpoint='shared_cache', reason='single_flight_timeout')
+                raise SingleFlightTimeoutError(key, f'waited {self.lock_timeout}s for another process')
+
+    def _get_blocking(self, key: str) -> Any:
+        return self._get(self.blocking_conn, key)
+
+    def _set_blocking(self, value, key: str, ttl_seconds: int = None):
+        self._set(self.blocking_conn, value, key, ttl_seconds)
+
+
+_shared_cache: Optional[SharedCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_cache() -> DataStore | SharedCache:
+    """
+    开启 shared_cache.enabled 时返回多进程共享的 SharedCache, 否则返回进程内的 DataStore
+    """
+    global _shared_cache
+    if not get_config('shared_cache.enabled', False):
+        return DataStore()
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SharedCache()
+    return _shared_cache
@@ -0,0 +1,75 @@
+"""
+车站列表快照: 本地保存车站js地址(带版本号)/ETag/内容哈希与解析结果,
+启动时直接读取快照, 只有js版本或内容变化时才重新下载解析
+"""
+import hashlib
+import logging
+import os
+import time
+
+from china_railway_tools.config import get_data_dir
+from china_railway_tools.schemas.station import StationSnapshot
+from china_railway_tools.utils.cr_fetcher import fetch_station_js_url, fetch_station_js, parse_station_names_js_async
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE_NAME = 'stations.json'
+
+
+def get_snapshot_path() -> str:
+    return os.path.join(get_data_dir(), SNAPSHOT_FILE_NAME)
+
+
+def hash_station_js(js_text: str) -> str:
+    return hashlib.sha256(js_text.encode('utf-8')).hexdigest()
+
+
+def load_station_snapshot(path: str = None) -> StationSnapshot | None:
+    path = path or get_snapshot_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return StationSnapshot.model_validate_json(f.read())
+    except Exception as e:
+        logger.warning(f'Failed to load station snapshot {path}: {e}')
+        return None
+
+
+def save_station_snapshot(snapshot: StationSnapshot, path: str = None):
+    path = path or get_snapshot_path()
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(snapshot.__pydantic_serializer__.to_json(snapshot))
+    os.replace(tmp_path, path)
+
+
+async def fetch_station_snapshot(previous: StationSnapshot | None = None) -> tuple[StationSnapshot, bool]:
+    """
+    检查车站列表是否有更新
+    :param previous: 上次保存的快照
+    :return: (最新快照, 车站是否有变化)
+    """
+    js_url = await fetch_station_js_url()
+    if previous and previous.js_url == js_url and not previous.etag and not previous.last_modified:
+        # js 文件名带版本号, 地址不变且没有可用于条件请求的校验信息时视为未变化
+        return previous.model_copy(update={'checked_at': time.time()}), False
+
+    same_url = previous is not None and previous.js_url == js_url
+    response = await fetch_station_js(js_url, etag=previous.etag if same_url else None,
+                                      last_modified=previous.last_modified if same_url else None)
+    if response is None:
+        return previous.model_copy(update={'checked_at': time.time()}), False
+
+    content_hash = hash_station_js(response.text)
+    snapshot_meta = {
+        'js_url': js_url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'content_hash': content_hash,
+        'checked_at': time.time(),
+    }
+    if previous and previous.content_hash == content_hash:
+        return previous.model_copy(update=snapshot_meta), False
+    snapshot = StationSnapshot(stations=await parse_station_names_js_async(response.text), **snapshot_meta)
+    return snapshot, True
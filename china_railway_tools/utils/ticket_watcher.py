@@ -0,0 +1,272 @@
+import asyncio
+import inspect
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Awaitable, Dict, List, Optional
+
+from china_railway_tools.config import get_config
+from china_railway_tools.schemas.query import QueryTrains
+from china_railway_tools.schemas.station import Station
+from china_railway_tools.schemas.train import TrainInfo, TicketChange, TicketChanges
+from china_railway_tools.utils.cr_utils import filter_trains
+from china_railway_tools.utils.exception_utils import extract_exception_traceback
+from china_railway_tools.utils.metrics import inc, set_gauge
+from china_railway_tools.utils.upstream_scheduler import BACKGROUND, upstream_priority
+
+logger = logging.getLogger(__name__)
+
+ChangeCallback = Callable[[TicketChanges], None | Awaitable[None]]
+
+
+def diff_trains(old: Dict[str, TrainInfo], new: Dict[str, TrainInfo]) -> List[tuple[TicketChange, TrainInfo]]:
+    """
+    按 train_no 和席位比较两次余票结果
+    :return: [(变化, 变化所属的车次)]
+    """
+    result = []
+    for train_no in old.keys() | new.keys():
+        old_train, new_train = old.get(train_no), new.get(train_no)
+        old_stocks = {x.seat_type: x.stock for x in old_train.tickets} if old_train else {}
+        new_stocks = {x.seat_type: x.stock for x in new_train.tickets} if new_train else {}
+        train = new_train or old_train
+        for seat_type in old_stocks.keys() | new_stocks.keys():
+            old_stock, new_stock = old_stocks.get(seat_type), new_stocks.get(seat_type)
+            if old_stock == new_stock:
+                continue
+            change = TicketChange(train_no=train_no, train_code=train.train_code, from_station=train.from_station,
+                                  to_station=train.to_station, seat_type=seat_type, old_stock=old_stock,
+                                  new_stock=new_stock)
+            result.append((change, train))
+    return result
+
+
+def next_departure(trains: List[TrainInfo], now: datetime) -> Optional[datetime]:
+    departures = []
+    for train in trains:
+        dep_time = train.from_stop_info.dep_time if train.from_stop_info else None
+        if not dep_time or dep_time == '----':
+            continue
+        departure = datetime.strptime(f'{train.depart_date} {dep_time}', '%Y-%m-%d %H:%M')
+        if departure > now:
+            departures.append(departure)
+    return min(departures) if departures else None
+
+
+class TicketSubscription:
+    """
+    watch 返回的订阅. 传入 callback 时每次有变化调用 callback(changes), 否则作为异步迭代器使用:
+
+        async for changes in await watcher.watch(form):
+            ...
+    """
+
+    def __init__(self, route: 'RouteWatch', form: QueryTrains, callback: ChangeCallback = None):
+        self.route = route
+        self.form = form
+        self.callback = callback
+        self._queue: Optional[asyncio.Queue] = None if callback else asyncio.Queue()
+        self.closed = False
+
+    async def deliver(self, changes: TicketChanges):
+        if self.closed:
+            return
+        if self._queue is not None:
+            self._queue.put_nowait(changes)
+            return
+        try:
+            result = self.callback(changes)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f'Ticket watch callback failed: {extract_exception_traceback(e)}')
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if self._queue is not None:
+                self._queue.put_nowait(None)
+
+    def cancel(self):
+        self.route.unsubscribe(self)
+        self.close()
+
+    def __aiter__(self):
+        if self._queue is None:
+            raise TypeError('Subscription with callback is not iterable')
+        return self
+
+    async def __anext__(self) -> TicketChanges:
+        changes = await self._queue.get()
+        if changes is None:
+            raise StopAsyncIteration
+        return changes
+
+
+class RouteWatch:
+    """
+    同一线路、日期的所有订阅共用一个轮询任务
+    """
+
+    def __init__(self, watcher: 'TicketWatcher', query_key: str, form: QueryTrains):
+        self.watcher = watcher
+        self.query_key = query_key
+        # 不带筛选条件的整条线路查询, 各订阅的筛选在比较结果后进行
+        self.form = QueryTrains(from_station_code=form.from_station_code, to_station_code=form.to_station_code,
+                                dep_date=form.dep_date, force_update=True)
+        self.subscriptions: List[TicketSubscription] = []
+        self.snapshot: Optional[Dict[str, TrainInfo]] = None
+        self.interval: float = watcher.min_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, subscription: TicketSubscription):
+        self.subscriptions.append(subscription)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def unsubscribe(self, subscription: TicketSubscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        if not self.subscriptions:
+            self.stop()
+
+    def stop(self):
+        self.watcher.routes.pop(self.query_key, None)
+        set_gauge('ticket_watch_routes', len(self.watcher.routes))
+        for subscription in self.subscriptions:
+            subscription.close()
+        self.subscriptions.clear()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._task = None
+
+    async def poll(self) -> bool:
+        """
+        查询一次并通知各订阅
+        :return: 是否有变化
+        """
+        await self.watcher.throttle()
+        with upstream_priority(BACKGROUND):
+            trains: List[TrainInfo] = await self.watcher.query_tickets(self.form.model_copy(), prefetch=True)
+        inc('ticket_watch_polls')
+        new_snapshot = {x.train_no: x for x in trains}
+        old_snapshot, self.snapshot = self.snapshot, new_snapshot
+        if old_snapshot is None:
+            # 第一次查询只作为比较的基准
+            return False
+        diff = diff_trains(old_snapshot, new_snapshot)
+        if not diff:
+            return False
+        inc('ticket_watch_changes', len(diff))
+        changed_trains = list({x.train_no: x for _, x in diff}.values())
+        for subscription in list(self.subscriptions):
+            # 按订阅自己的条件(车次、时间段、精确站名等)筛选
+            train_nos = {x.train_no for x in filter_trains(subscription.form, changed_trains)}
+            changes = [change for change, train in diff if train.train_no in train_nos]
+            if changes:
+                await subscription.deliver(TicketChanges(query_key=self.query_key, changes=changes))
+        return True
+
+    def next_interval(self, changed: bool) -> float:
+        """
+        有变化时缩短间隔, 无变化时逐渐放宽; 临近发车时不超过剩余时间的 departure_factor 倍
+        """
+        watcher = self.watcher
+        if changed:
+            interval = self.interval / 2
+        else:
+            interval = self.interval * watcher.backoff
+        interval = min(max(interval, watcher.min_interval), watcher.max_interval)
+        departure = next_departure(list(self.snapshot.values()), datetime.now()) if self.snapshot else None
+        if departure is not None:
+            remaining = (departure - datetime.now()).total_seconds()
+            interval = max(watcher.min_interval, min(interval, remaining * watcher.departure_factor))
+        return interval
+
+    def is_finished(self) -> bool:
+        now = datetime.now()
+        if self.form.dep_date.date() < now.date():
+            return True
+        # 所有车次均已发车
+        return bool(self.snapshot) and next_departure(list(self.snapshot.values()), now) is None
+
+    async def _run(self):
+        while self.subscriptions:
+            try:
+                changed = await self.poll()
+                self.interval = self.next_interval(changed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.interval = min(self.interval * 2, self.watcher.max_interval)
+                logger.warning(f'Ticket watch {self.query_key} failed: {extract_exception_traceback(e)}')
+            if self.is_finished():
+                logger.info(f'Ticket watch {self.query_key} finished, all trains departed')
+                self.stop()
+                return
+            await asyncio.sleep(self.interval)
+
+
+class TicketWatcher:
+    """
+    余票订阅: 同一线路、日期的订阅合并为一个轮询, 比较相邻两次结果, 只推送变化的车次席位.
+    轮询间隔在 [min_interval, max_interval] 内随变化频率和距发车时间调整,
+    所有线路的请求之间至少间隔 min_fetch_interval 秒.
+    """
+
+    def __init__(self, query_tickets: Callable[..., Awaitable[List[TrainInfo]]],
+                 get_station: Callable[[str], Awaitable[Station]], **kwargs):
+        """
+        :param query_tickets: 余票查询函数, 即 api.query_tickets
+        :param get_station: 站名 -> 车站, 用于把订阅的站名转为电报码以合并同一线路
+        """
+        self.query_tickets = query_tickets
+        self.get_station = get_station
+        self.min_interval: float = kwargs.get('min_interval', get_config('ticket_watch.min_interval', 15))
+        self.max_interval: float = kwargs.get('max_interval', get_config('ticket_watch.max_interval', 300))
+        self.backoff: float = kwargs.get('backoff', get_config('ticket_watch.backoff', 1.5))
+        self.departure_factor: float = kwargs.get('departure_factor',
+                                                  get_config('ticket_watch.departure_factor', 0.02))
+        self.min_fetch_interval: float = kwargs.get('min_fetch_interval',
+                                                    get_config('ticket_watch.min_fetch_interval', 1.0))
+        self.routes: Dict[str, RouteWatch] = {}
+        self._throttle_lock = asyncio.Lock()
+        self._last_fetch: float = 0
+
+    async def throttle(self):
+        async with self._throttle_lock:
+            wait_seconds = self._last_fetch + self.min_fetch_interval - time.monotonic()
+            if wait_seconds > 0:
+                await asyncio.sleep(wait_seconds)
+            self._last_fetch = time.monotonic()
+
+    async def watch(self, form: QueryTrains, callback: ChangeCallback = None) -> TicketSubscription:
+        """
+        订阅 form 对应线路的余票变化, form 中的车次、时间段等条件用于筛选推送的变化
+        :param callback: 为空时返回的订阅作为异步迭代器使用
+        """
+        form = form.model_copy()
+        await form.parse_station_name2code(self.get_station)
+        query_key = f'{form.from_station_code}-{form.to_station_code}-{form.dep_date.strftime("%Y-%m-%d")}'
+        route = self.routes.get(query_key)
+        if route is None:
+            route = self.routes[query_key] = RouteWatch(self, query_key, form)
+            set_gauge('ticket_watch_routes', len(self.routes))
+        subscription = TicketSubscription(route, form, callback)
+        route.subscribe(subscription)
+        return subscription
+
+    async def iter_changes(self, form: QueryTrains):
+        """
+        async for changes in watcher.iter_changes(form): ...  退出循环时取消订阅
+        """
+        subscription = await self.watch(form)
+        try:
+            async for changes in subscription:
+                yield changes
+        finally:
+            subscription.cancel()
+
+    def stop(self):
+        for route in list(self.routes.values()):
+            route.stop()
@@ -0,0 +1,88 @@
+import bisect
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Iterable
+
+from china_railway_tools.schemas.train import TrainNo
+
+
+class DateEntry:
+    __slots__ = ('by_code', 'sorted_codes')
+
+    def __init__(self, train_no_list: Iterable[TrainNo]):
+        self.by_code: Dict[str, TrainNo] = {x.train_code: x for x in train_no_list}
+        self.sorted_codes: List[str] = sorted(self.by_code.keys())
+
+
+class TrainNoDirectory:
+    """
+    按日期加载的 车次(train_code) -> 列车编号(train_no) 内存目录.
+    精确查询使用 dict, 前缀查询在有序车次数组上二分查找, 均不访问 SQLite.
+    """
+
+    def __init__(self):
+        self._dates: Dict[str, DateEntry] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _date_key(train_date: datetime | str) -> str:
+        if isinstance(train_date, datetime):
+            return train_date.strftime('%Y-%m-%d')
+        return train_date
+
+    def is_loaded(self, train_date: datetime | str) -> bool:
+        return self._date_key(train_date) in self._dates
+
+    def load(self, train_date: datetime | str, train_no_list: Iterable[TrainNo]):
+        entry = DateEntry(train_no_list)
+        with self._lock:
+            self._dates[self._date_key(train_date)] = entry
+
+    def add(self, train_date: datetime | str, train_no_list: Iterable[TrainNo]):
+        """
+        向已加载的日期追加车次, 未加载的日期忽略(避免把部分结果当作完整目录)
+        """
+        date_key = self._date_key(train_date)
+        with self._lock:
+            entry = self._dates.get(date_key)
+            if entry is None:
+                return
+            for x in train_no_list:
+                if x.train_code not in entry.by_code:
+                    bisect.insort(entry.sorted_codes, x.train_code)
+                entry.by_code[x.train_code] = x
+
+    def get(self, train_code: str, train_date: datetime | str) -> Optional[TrainNo]:
+        entry = self._dates.get(self._date_key(train_date))
+        if entry is None:
+            return None
+        return entry.by_code.get(train_code)
+
+    def search(self, train_code: str, train_date: datetime | str, exact: bool = True,
+               limit: int = 200) -> Optional[List[TrainNo]]:
+        """
+        :return: 日期未加载时返回None, 否则返回按车次长度、车次排序的结果(与 query_train_no 的SQL排序一致)
+        """
+        entry = self._dates.get(self._date_key(train_date))
+        if entry is None:
+            return None
+        if exact:
+            train_no = entry.by_code.get(train_code)
+            return [train_no] if train_no else []
+        codes = entry.sorted_codes
+        start = bisect.bisect_left(codes, train_code)
+        end = bisect.bisect_left(codes, train_code + '\uffff', lo=start)
+        matched = sorted(codes[start:end], key=lambda x: (len(x), x))[:limit]
+        return [entry.by_code[x] for x in matched]
+
+    def evict_before(self, train_date: datetime | str):
+        date_key = self._date_key(train_date)
+        with self._lock:
+            for k in [x for x in self._dates if x < date_key]:
+                del self._dates[k]
+
+    def __len__(self):
+        return len(self._dates)
+
+
+TRAIN_NO_DIRECTORY = TrainNoDirectory()
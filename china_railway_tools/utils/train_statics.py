@@ -0,0 +1,72 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from china_railway_tools.config import get_config
+from china_railway_tools.schemas.train import TrainStatic, TrainInfo
+
+# (出发站代码, 到达站代码, train_no)
+StaticKey = Tuple[str, str, str]
+
+PRUNE_EVERY_SETS = 1000
+
+
+class TrainStaticStore:
+    """
+    按出发日期保存的车次静态信息(TrainStatic), 每条在 train_static_cache_seconds 后过期.
+    余票轮询时票价、时间未变化的车次直接复用, 不重复解码票价和校验模型
+    """
+
+    def __init__(self):
+        self._dates: Dict[str, Dict[StaticKey, Tuple[TrainStatic, float]]] = {}
+        self._lock = threading.Lock()
+        self._set_count = 0
+
+    def get(self, dep_date: str, key: StaticKey) -> Optional[TrainStatic]:
+        entries = self._dates.get(dep_date)
+        if entries is None:
+            return None
+        record = entries.get(key)
+        if record is None or record[1] <= time.monotonic():
+            return None
+        return record[0]
+
+    def set(self, dep_date: str, key: StaticKey, static: TrainStatic):
+        expires_at = time.monotonic() + get_config('train_static_cache_seconds', 6 * 3600)
+        with self._lock:
+            self._dates.setdefault(dep_date, {})[key] = (static, expires_at)
+            self._set_count += 1
+            if self._set_count % PRUNE_EVERY_SETS == 0:
+                self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
+        for dep_date in list(self._dates):
+            entries = {k: v for k, v in self._dates[dep_date].items() if v[1] > now}
+            if entries:
+                self._dates[dep_date] = entries
+            else:
+                del self._dates[dep_date]
+
+    def clear(self):
+        with self._lock:
+            self._dates.clear()
+
+    def __len__(self):
+        return sum(len(x) for x in self._dates.values())
+
+
+TRAIN_STATICS = TrainStaticStore()
+
+
+def restore_train_static(dep_date: str, key: StaticKey, seat_codes: tuple, fingerprint: tuple,
+                         train_json: str) -> TrainStatic:
+    """
+    TrainStatic 的反序列化: 本进程已缓存指纹相同的车次时直接使用, 否则校验 train_json 并缓存
+    """
+    static = TRAIN_STATICS.get(dep_date, key)
+    if static is not None and static.fingerprint == fingerprint:
+        return static
+    static = TrainStatic(TrainInfo.model_validate_json(train_json), seat_codes, fingerprint)
+    TRAIN_STATICS.set(dep_date, key, static)
+    return static
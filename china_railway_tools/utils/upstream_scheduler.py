@@ -0,0 +1,106 @@
+"""
+12306 请求的优先级调度: 替代普通的 asyncio.Semaphore 限制每个接口的并发.
+用户的实时查询(INTERACTIVE)优先获得空闲额度, 预取、订阅轮询、批量加载等后台任务(BACKGROUND)
+在有后台请求等待时至少保有 background_share 比例的额度, 不会被完全饿死.
+
+优先级通过 contextvars 传递, 在后台任务中:
+
+    with upstream_priority(BACKGROUND):
+        await query_tickets(form)
+"""
+import asyncio
+from collections import Counter, deque, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+_upstream_priority: ContextVar[int] = ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+def get_upstream_priority() -> int:
+    return _upstream_priority.get()
+
+
+@contextmanager
+def upstream_priority(priority: int):
+    """
+    块内(包括其中创建的 Task)发出的 12306 请求使用 priority
+    """
+    token = _upstream_priority.set(priority)
+    try:
+        yield
+    finally:
+        _upstream_priority.reset(token)
+
+
+class PriorityLimiter:
+    """
+    按优先级分配的并发额度, 数值越小优先级越高; 同一优先级先到先得
+    """
+
+    def __init__(self, capacity: int, background_share: float = 0.0):
+        self.capacity = capacity
+        # 有后台请求等待时为其保留的最少额度
+        self.reserved_background = max(1, int(capacity * background_share)) if background_share > 0 else 0
+        self.in_flight: Counter = Counter()
+        self.waiters: Dict[int, Deque[asyncio.Future]] = defaultdict(deque)
+
+    @property
+    def active(self) -> int:
+        return sum(self.in_flight.values())
+
+    def locked(self) -> bool:
+        return self.active >= self.capacity
+
+    def waiting(self, priority: int = None) -> int:
+        if priority is None:
+            return sum(len(x) for x in self.waiters.values())
+        return len(self.waiters[priority])
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        if not self.locked() and not self.waiting():
+            self.in_flight[priority] += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        queue = self.waiters[priority]
+        queue.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分配到额度后被取消, 转交给下一个等待者
+                self.release(priority)
+            elif future in queue:
+                queue.remove(future)
+            raise
+
+    def release(self, priority: int = INTERACTIVE):
+        self.in_flight[priority] -= 1
+        self._wake()
+
+    def _next_priority(self) -> Optional[int]:
+        pending = [p for p, queue in self.waiters.items() if queue]
+        if not pending:
+            return None
+        background_pending = [p for p in pending if p >= BACKGROUND]
+        if background_pending:
+            background_in_flight = sum(n for p, n in self.in_flight.items() if p >= BACKGROUND)
+            if background_in_flight < self.reserved_background:
+                return min(background_pending)
+        return min(pending)
+
+    def _wake(self):
+        while not self.locked():
+            priority = self._next_priority()
+            if priority is None:
+                return
+            future = self.waiters[priority].popleft()
+            if future.done():
+                # 等待时已被取消
+                continue
+            self.in_flight[priority] += 1
+            future.set_result(None)
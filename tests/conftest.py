@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# 测试不访问 12306, 跳过导入时的初始化
+os.environ.setdefault('CR_TOOLS_SKIP_INIT', '1')
+# 数据库连接在导入时创建, 需在导入 china_railway_tools 之前指定临时目录, 避免写入用户的数据库
+if 'CR_TOOLS_SQLITE_DIR' not in os.environ:
+    os.environ['CR_TOOLS_SQLITE_DIR'] = tempfile.mkdtemp(prefix='cr_tools_test_')
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if os.environ['CR_TOOLS_SQLITE_DIR'].startswith(os.path.join(tempfile.gettempdir(), 'cr_tools_test_')):
+        shutil.rmtree(os.environ['CR_TOOLS_SQLITE_DIR'], ignore_errors=True)
+
+
+@pytest.fixture
+def app_config():
+    """
+    临时修改配置, 测试结束后恢复
+    """
+    from china_railway_tools import config
+    from china_railway_tools.schemas.AppConifg import AppConfig
+    saved = config.PERSONAL_CONFIG
+
+    def apply(**kwargs):
+        config.set_config(AppConfig(**kwargs))
+
+    yield apply
+    config.PERSONAL_CONFIG = saved
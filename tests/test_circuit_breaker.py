@@ -0,0 +1,106 @@
+import asyncio
+
+import httpx
+import pytest
+
+from china_railway_tools.utils import circuit_breaker, cr_fetcher, http_utils
+from china_railway_tools.utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', fake)
+    return fake
+
+
+def fail(breaker: CircuitBreaker, times: int):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.after_call(True)
+
+
+def test_open_half_open_closed(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30, half_open_max_calls=1)
+    fail(breaker, 1)
+    assert breaker.state == CLOSED
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 30
+    breaker.check()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # 探测请求未完成时不再放行其他请求
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.after_call(False)
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    breaker.before_call()
+    breaker.after_call(False)
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30, half_open_max_calls=1)
+    fail(breaker, 2)
+    clock.now += 30
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    breaker.after_call(True)
+    assert breaker.state == OPEN
+    # 重新计算熔断时间
+    assert breaker.opened_at == clock.now
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 1
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+
+def test_cancelled_probe_frees_half_open_slot(clock):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=30, half_open_max_calls=1)
+    fail(breaker, 1)
+    clock.now += 30
+    breaker.before_call()
+    breaker.after_call(None)
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    breaker.after_call(False)
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.parametrize('status_code, failed', [(503, True), (429, True), (404, False)])
+def test_fetch_train_no_status_counts_as_failure(monkeypatch, app_config, status_code, failed):
+    app_config(circuit_breaker={'failure_threshold': 1, 'reset_timeout': 30, 'half_open_max_calls': 1})
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == '/search/v1/train/search':
+            return httpx.Response(status_code)
+        return httpx.Response(200)
+
+    monkeypatch.setattr(cr_fetcher, 'COOKIE_STORE', None)
+    monkeypatch.setattr(circuit_breaker, '_breakers', {})
+    http_utils.set_transport(httpx.MockTransport(handler))
+    try:
+        if failed:
+            with pytest.raises(httpx.HTTPStatusError):
+                asyncio.run(cr_fetcher.fetch_train_no('G1', '2025-01-01'))
+        else:
+            assert asyncio.run(cr_fetcher.fetch_train_no('G1', '2025-01-01')) is None
+    finally:
+        http_utils.set_transport(None)
+    assert circuit_breaker.get_circuit_breaker('fetch_train_no').state == (OPEN if failed else CLOSED)
@@ -0,0 +1,36 @@
+from china_railway_tools.schemas.train import TrainSchedule, StopInfo, CompactSchedule
+
+
+def make_schedule() -> TrainSchedule:
+    return TrainSchedule.from_raw_dict({'train_no': 'T1', 'train_date': '2025-01-01', 'stop_info_list': [
+        StopInfo(station_name='北京南', dep_time='23:00', arr_day_diff=0),
+        StopInfo(station_name='济南西', arr_time='01:00', dep_time='01:05', arr_day_diff=1),
+        StopInfo(station_name='上海虹桥', arr_time='04:00', arr_day_diff=1),
+    ]})
+
+
+def test_minutes_and_day_diff():
+    compact = make_schedule().compact()
+    assert compact.get_duration(0, 2) == 5 * 60
+    assert compact.get_dep_day_diff(0) == 0
+    assert compact.get_dep_day_diff(1) == 1
+    assert compact.get_arr_day_diff(2) == 1
+
+
+def test_get_index():
+    schedule = make_schedule()
+    compact = schedule.compact()
+    # 精确站名使用 TrainSchedule 的 name_index
+    assert compact.name_index is schedule.name_index
+    assert compact.get_index('济南西') == 1
+    assert compact.get_index('上海') == 2
+    assert compact.get_index('上海', fuzzy=False) is None
+    assert compact.get_index('广州') is None
+    assert compact.fuzzy_index == {'上海': 2, '广州': None}
+
+
+def test_fuzzy_index_is_bounded():
+    compact = make_schedule().compact()
+    for i in range(CompactSchedule.MAX_FUZZY_ENTRIES * 2):
+        assert compact.get_index(f'无此站{i}') is None
+    assert len(compact.fuzzy_index) == CompactSchedule.MAX_FUZZY_ENTRIES
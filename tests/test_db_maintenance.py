@@ -0,0 +1,75 @@
+import asyncio
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from china_railway_tools.database.connection import async_engine
+from china_railway_tools.database.maintenance import DbMaintenance, start_db_maintenance
+from china_railway_tools.database.schema import AUTO_VACUUM_INCREMENTAL, configure_sqlite, init_db_async
+
+
+async def get_auto_vacuum() -> int:
+    async with async_engine.connect() as conn:
+        return (await conn.exec_driver_sql('PRAGMA auto_vacuum')).scalar()
+
+
+async def disable_auto_vacuum():
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.exec_driver_sql('PRAGMA auto_vacuum=NONE')
+        await conn.exec_driver_sql('VACUUM')
+
+
+def test_failed_vacuum_is_retried_by_maintenance(monkeypatch, app_config):
+    app_config(db_maintenance={'interval_seconds': 3600, 'convert_max_mb': 50})
+    exec_driver_sql = AsyncConnection.exec_driver_sql
+
+    async def locked_vacuum(self, statement, *args, **kwargs):
+        if statement == 'VACUUM':
+            raise OperationalError(statement, None, Exception('database is locked'))
+        return await exec_driver_sql(self, statement, *args, **kwargs)
+
+    async def run():
+        await init_db_async()
+        await disable_auto_vacuum()
+        monkeypatch.setattr(AsyncConnection, 'exec_driver_sql', locked_vacuum)
+        maintenance = DbMaintenance()
+        await maintenance.run_once()
+        assert await get_auto_vacuum() != AUTO_VACUUM_INCREMENTAL
+
+        monkeypatch.setattr(AsyncConnection, 'exec_driver_sql', exec_driver_sql)
+        await maintenance.run_once()
+        assert await get_auto_vacuum() == AUTO_VACUUM_INCREMENTAL
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_start_db_maintenance(app_config):
+    app_config(db_maintenance={'interval_seconds': 3600})
+
+    async def run():
+        await init_db_async()
+        maintenance = await start_db_maintenance()
+        await asyncio.sleep(0.1)
+        assert not maintenance._task.done()
+        await maintenance.stop()
+        assert maintenance._task is None
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_startup_does_not_vacuum(app_config):
+    app_config(db_maintenance={'interval_seconds': 3600, 'convert_max_mb': 50})
+
+    async def run():
+        await init_db_async()
+        await disable_auto_vacuum()
+        # init_script.main() 中的初始化与启动时清理
+        await configure_sqlite()
+        await DbMaintenance(max_chunks=1).run_once(full=False)
+        assert await get_auto_vacuum() != AUTO_VACUUM_INCREMENTAL
+        await async_engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+import asyncio
+
+import httpx
+
+from china_railway_tools.utils.http_utils import get_async_client, share_client_in_loop, close_shared_client, \
+    SharedClient
+
+
+def test_client_not_shared_by_default(app_config):
+    app_config()
+
+    async def run():
+        client = get_async_client()
+        assert isinstance(client, httpx.AsyncClient)
+        async with client:
+            pass
+        assert client.is_closed
+        assert get_async_client() is not client
+
+    asyncio.run(run())
+
+
+def test_shared_client_in_loop_closed_by_close_shared_client(app_config):
+    app_config()
+
+    async def run():
+        share_client_in_loop()
+        shared = get_async_client()
+        assert isinstance(shared, SharedClient)
+        async with shared as client:
+            pass
+        assert not client.is_closed
+        assert get_async_client().client is client
+        await close_shared_client()
+        assert client.is_closed
+        # 关闭后不再共享
+        assert isinstance(get_async_client(), httpx.AsyncClient)
+
+    asyncio.run(run())
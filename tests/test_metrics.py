@@ -0,0 +1,29 @@
+import json
+
+from china_railway_tools.utils.metrics import MetricsRegistry
+
+
+def test_snapshot_is_json_serializable():
+    registry = MetricsRegistry()
+    registry.inc('cache_requests', cache='train_schedule', result='hit')
+    registry.inc('cache_requests', cache='train_schedule', result='hit')
+    registry.inc('retries')
+    registry.set_gauge('schedule_cache_size', 3)
+    registry.observe('stage_seconds', 0.02, stage='http', endpoint='fetch_trains')
+
+    snapshot = json.loads(json.dumps(registry.snapshot()))
+    assert snapshot['counters']['cache_requests'] == {'{cache="train_schedule",result="hit"}': 2}
+    assert snapshot['counters']['retries'] == {'': 1}
+    assert snapshot['gauges']['schedule_cache_size'] == {'': 3}
+    histogram = snapshot['histograms']['stage_seconds']['{endpoint="fetch_trains",stage="http"}']
+    assert histogram['count'] == 1
+    assert histogram['buckets']['0.025'] == 1
+    assert sum(histogram['buckets'].values()) == 1
+    assert '+Inf' in histogram['buckets']
+
+
+def test_snapshot_labels_match_prometheus_export():
+    registry = MetricsRegistry()
+    registry.inc('fetch_rejected', endpoint='query "x"', reason='circuit_open')
+    label = next(iter(registry.snapshot()['counters']['fetch_rejected']))
+    assert f'cr_tools_fetch_rejected_total{label} 1' in registry.export_prometheus()
@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+import pytest
+
+from benchmarks.fixtures import load_left_ticket_response, load_station_names_js
+from china_railway_tools.schemas.AppConifg import AppConfig
+from china_railway_tools.utils.cr_fetcher import parse_station_names_js_async
+from china_railway_tools.utils.cr_utils import parse_ticket_data, decode_ticket_rows
+from china_railway_tools.utils.parse_executor import shutdown_parse_executors
+from china_railway_tools.utils.train_statics import TRAIN_STATICS
+
+
+def test_parse_executor_default_is_dict():
+    assert isinstance(AppConfig().parse_executor, dict)
+
+
+def test_decode_ticket_rows_is_compact():
+    rows = decode_ticket_rows(load_left_ticket_response()['data'])
+    assert rows
+
+    def is_plain(value):
+        if isinstance(value, tuple):
+            return all(is_plain(x) for x in value)
+        return value is None or isinstance(value, (str, int, float))
+
+    assert all(is_plain(x) for x in rows)
+
+
+async def parse_all():
+    TRAIN_STATICS.clear()
+    data = load_left_ticket_response()['data']
+    trains = await parse_ticket_data(data, '2025-01-01')
+    # 第二次解析使用缓存的静态信息
+    cached_trains = await parse_ticket_data(data, '2025-01-01')
+    stations = await parse_station_names_js_async(load_station_names_js())
+    return ([x.model_dump() for x in trains], [x.model_dump() for x in cached_trains],
+            [x.model_dump() for x in stations])
+
+
+@pytest.mark.parametrize('mode', ['thread', 'process'])
+def test_offloaded_parse_matches_inline(app_config, monkeypatch, mode):
+    monkeypatch.delenv('CR_TOOLS_SKIP_INIT')
+    app_config(parse_executor={'mode': None})
+    expected = asyncio.run(parse_all())
+    app_config(parse_executor={'mode': mode, 'max_workers': 1, 'min_ticket_rows': 1, 'min_station_js_chars': 1})
+    try:
+        assert asyncio.run(parse_all()) == expected
+    finally:
+        shutdown_parse_executors()
+    # 只在子进程中设置 CR_TOOLS_SKIP_INIT
+    assert 'CR_TOOLS_SKIP_INIT' not in os.environ
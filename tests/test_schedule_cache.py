@@ -0,0 +1,76 @@
+import pytest
+
+from china_railway_tools.schemas.train import TrainSchedule
+from china_railway_tools.utils import schedule_cache
+from china_railway_tools.utils.schedule_cache import ScheduleCache
+
+TRAIN_DATE = '2025-01-01'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(schedule_cache.time, 'monotonic', fake)
+    return fake
+
+
+def make_schedule(train_no: str) -> TrainSchedule:
+    return TrainSchedule.model_construct(train_no=train_no, train_date=TRAIN_DATE, name_index={}, schedule=[])
+
+
+def test_alias_removed_on_eviction(app_config):
+    app_config(schedule_cache={'max_size': 2, 'ttl': 3600, 'negative_ttl': 60})
+    cache = ScheduleCache()
+    cache.set(TRAIN_DATE, 'no1', make_schedule('no1'), train_code='G1')
+    cache.set(TRAIN_DATE, 'no2', make_schedule('no2'), train_code='G2')
+    found, schedule = cache.get(TRAIN_DATE, train_code='G1')
+    assert found and schedule.train_no == 'no1'
+
+    # no1 刚被访问过, 淘汰 no2
+    cache.set(TRAIN_DATE, 'no3', make_schedule('no3'), train_code='G3')
+    assert len(cache) == 2
+    assert cache.get(TRAIN_DATE, train_code='G2') == (False, None)
+    assert ('G2', TRAIN_DATE) not in cache._aliases
+    assert cache.get(TRAIN_DATE, train_code='G1')[0]
+    assert cache.get(TRAIN_DATE, train_code='G3')[0]
+
+
+def test_alias_kept_when_reassigned(app_config):
+    app_config(schedule_cache={'max_size': 1, 'ttl': 3600, 'negative_ttl': 60})
+    cache = ScheduleCache()
+    cache.set(TRAIN_DATE, 'old', make_schedule('old'), train_code='G1')
+    # 同一车次对应的 train_no 变化后, 淘汰旧的 train_no 不删除新的别名
+    cache.set(TRAIN_DATE, 'new', make_schedule('new'), train_code='G1')
+    found, schedule = cache.get(TRAIN_DATE, train_code='G1')
+    assert found and schedule.train_no == 'new'
+
+
+def test_negative_ttl_expiry(app_config, clock):
+    app_config(schedule_cache={'max_size': 10, 'ttl': 3600, 'negative_ttl': 60})
+    cache = ScheduleCache()
+    cache.set(TRAIN_DATE, 'missing', None, train_code='G9')
+    cache.set(TRAIN_DATE, 'no1', make_schedule('no1'))
+    assert cache.get(TRAIN_DATE, 'missing') == (True, None)
+
+    clock.now += 60
+    assert cache.get(TRAIN_DATE, 'missing') == (False, None)
+    assert cache.get(TRAIN_DATE, train_code='G9') == (False, None)
+    assert ('G9', TRAIN_DATE) not in cache._aliases
+    assert len(cache) == 1
+    # 时刻表仍在 ttl 内
+    assert cache.get(TRAIN_DATE, 'no1')[0]
+
+
+def test_disabled_negative_ttl(app_config):
+    app_config(schedule_cache={'max_size': 10, 'ttl': 3600, 'negative_ttl': 0})
+    cache = ScheduleCache()
+    cache.set(TRAIN_DATE, 'missing', None)
+    assert cache.get(TRAIN_DATE, 'missing') == (False, None)
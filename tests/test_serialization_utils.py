@@ -0,0 +1,59 @@
+import asyncio
+
+from sqlalchemy import insert, select
+
+from china_railway_tools.database.connection import AsyncSessionLocal, async_engine
+from china_railway_tools.database.curd import query_cached_result, query_cached_results
+from china_railway_tools.database.partitions import get_partition_table, ensure_partition
+from china_railway_tools.database.schema import init_db_async
+from china_railway_tools.schemas.train import TrainSchedule, StopInfo
+from china_railway_tools.utils.serialization_utils import to_json, to_json_bytes, to_obj
+
+TRAIN_DATE = '2025-01-01'
+
+
+def make_schedule(train_no: str) -> TrainSchedule:
+    return TrainSchedule.from_raw_dict({'train_no': train_no, 'train_date': TRAIN_DATE, 'stop_info_list': [
+        StopInfo(station_name='北京南', arr_time='----', dep_time='08:00', stopover_time=0, duration='00:00',
+                 arr_day_diff=0, station_train_code='G1'),
+        StopInfo(station_name='上海虹桥', arr_time='12:30', dep_time='----', stopover_time=0, duration='04:30',
+                 arr_day_diff=0, station_train_code='G1'),
+    ]})
+
+
+def test_to_json_bytes_round_trip():
+    schedule = make_schedule('T1')
+    data = to_json_bytes(schedule)
+    assert isinstance(data, bytes)
+    assert to_obj(data, TrainSchedule) == schedule
+    assert to_json_bytes([schedule, schedule]).startswith(b'[{')
+    assert to_obj(to_json(schedule), TrainSchedule) == schedule
+
+
+def test_cached_result_stored_as_bytes():
+    schedule = make_schedule('T2')
+
+    async def empty_cb():
+        return schedule
+
+    async def run():
+        await init_db_async()
+        assert await query_cached_result(query_key='T2', category='test_schedule', empty_cb=empty_cb,
+                                         _date=TRAIN_DATE, pydantic_class=TrainSchedule) == schedule
+        table = get_partition_table(TRAIN_DATE)
+        async with AsyncSessionLocal() as session:
+            stored = (await session.execute(select(table.c.result).where(table.c.query_key == 'T2'))).scalar()
+            # 旧版本以 str 保存的缓存
+            await ensure_partition(session, table)
+            await session.execute(insert(table).values(query_key='T3', category='test_schedule',
+                                                       result=to_json(make_schedule('T3'))))
+            await session.commit()
+        assert isinstance(stored, bytes)
+        assert await query_cached_result(query_key='T2', category='test_schedule', empty_cb=None,
+                                         _date=TRAIN_DATE, pydantic_class=TrainSchedule) == schedule
+        cached = await query_cached_results(['T2', 'T3'], 'test_schedule', _date=TRAIN_DATE,
+                                            pydantic_class=TrainSchedule)
+        assert cached == {'T2': schedule, 'T3': make_schedule('T3')}
+        await async_engine.dispose()
+
+    asyncio.run(run())
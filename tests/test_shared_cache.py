@@ -0,0 +1,80 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from china_railway_tools.utils.shared_cache import SharedCache, SingleFlightTimeoutError
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / 'shared_cache.db')
+
+
+def test_get_or_fetch_caches_value(cache_path):
+    cache = SharedCache(cache_path)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return ['value']
+
+    async def run():
+        return [await cache.get_or_fetch('key', fetch, ttl_seconds=60) for _ in range(3)]
+
+    assert asyncio.run(run()) == [['value']] * 3
+    assert len(calls) == 1
+
+
+def test_waiter_does_not_fetch_after_lock_timeout(cache_path):
+    # 另一个进程持有锁且一直没有写入结果
+    holder = SharedCache(cache_path, lock_timeout=60)
+    assert holder.try_lock('key')
+    waiter = SharedCache(cache_path, lock_timeout=0.2, poll_interval=0.01)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return ['value']
+
+    with pytest.raises(SingleFlightTimeoutError):
+        asyncio.run(waiter.get_or_fetch('key', fetch))
+    assert not calls
+
+
+def test_waiter_reads_value_written_by_lock_holder(cache_path):
+    holder = SharedCache(cache_path, lock_timeout=60)
+    assert holder.try_lock('key')
+    waiter = SharedCache(cache_path, lock_timeout=5, poll_interval=0.01)
+
+    async def fetch():
+        raise AssertionError('only the lock holder should fetch')
+
+    async def release():
+        await asyncio.sleep(0.1)
+        holder.set(['value'], 'key', 60)
+        holder.unlock('key')
+
+    async def run():
+        _, value = await asyncio.gather(release(), waiter.get_or_fetch('key', fetch))
+        return value
+
+    assert asyncio.run(run()) == ['value']
+
+
+def test_get_and_set_do_not_block_on_write_lock(cache_path):
+    cache = SharedCache(cache_path, busy_timeout=0.05)
+    cache.set(['value'], 'key', 60)
+    # WAL 模式下读不受写锁影响
+    writer = sqlite3.connect(cache_path, isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        started = time.monotonic()
+        assert cache.get('key') == ['value']
+        cache.set(['other'], 'key', 60)
+        assert time.monotonic() - started < 1
+    finally:
+        writer.execute('ROLLBACK')
+        writer.close()
+    assert cache.get('key') == ['value']
@@ -0,0 +1,38 @@
+import pickle
+
+from benchmarks.fixtures import load_left_ticket_response
+from china_railway_tools.schemas.query import QueryTrains
+from china_railway_tools.utils.cr_utils import parse_ticket_stocks, filter_trains
+from china_railway_tools.utils.train_statics import TRAIN_STATICS
+
+
+def load_train_stocks():
+    TRAIN_STATICS.clear()
+    return parse_ticket_stocks(load_left_ticket_response()['data'], '2025-01-01')
+
+
+def test_select_matches_filtering_full_trains():
+    train_stocks = load_train_stocks()
+    form = QueryTrains(train_codes=['G*', 'D*'], start_time='08:00', end_time='20:00')
+    expected = filter_trains(form, train_stocks.to_train_infos())
+    selected = train_stocks.select(filter_trains(form, train_stocks.static_trains()))
+    assert expected
+    assert sorted(x.model_dump_json() for x in selected) == sorted(x.model_dump_json() for x in expected)
+
+
+def test_unpickle_reuses_cached_statics():
+    train_stocks = load_train_stocks()
+    restored = pickle.loads(pickle.dumps(train_stocks))
+    assert all(a is b for a, b in zip(train_stocks.statics, restored.statics))
+    assert restored.stocks == train_stocks.stocks
+
+
+def test_unpickle_rebuilds_missing_statics():
+    train_stocks = load_train_stocks()
+    data = pickle.dumps(train_stocks)
+    TRAIN_STATICS.clear()
+    restored = pickle.loads(data)
+    assert [x.train for x in restored.statics] == [x.train for x in train_stocks.statics]
+    assert restored.to_train_infos() == train_stocks.to_train_infos()
+    # 重建的车次写回本进程缓存
+    assert pickle.loads(data).statics[0] is restored.statics[0]
@@ -0,0 +1,95 @@
+import asyncio
+
+from china_railway_tools.utils.upstream_scheduler import PriorityLimiter, INTERACTIVE, BACKGROUND
+
+
+async def start_waiter(limiter: PriorityLimiter, priority: int, granted: list) -> asyncio.Task:
+    async def wait():
+        await limiter.acquire(priority)
+        granted.append(priority)
+
+    task = asyncio.create_task(wait())
+    # 进入等待队列
+    await asyncio.sleep(0)
+    return task
+
+
+def test_background_share_is_reserved():
+    async def run():
+        limiter = PriorityLimiter(4, background_share=0.25)
+        assert limiter.reserved_background == 1
+        for _ in range(4):
+            await limiter.acquire(INTERACTIVE)
+        granted = []
+        tasks = [await start_waiter(limiter, INTERACTIVE, granted),
+                 await start_waiter(limiter, INTERACTIVE, granted),
+                 await start_waiter(limiter, BACKGROUND, granted)]
+        # 后台请求后到, 但在没有占用额度时优先获得保留的额度
+        limiter.release(INTERACTIVE)
+        await asyncio.sleep(0)
+        assert granted == [BACKGROUND]
+        limiter.release(INTERACTIVE)
+        limiter.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+        assert granted == [BACKGROUND, INTERACTIVE, INTERACTIVE]
+        assert limiter.in_flight == {INTERACTIVE: 3, BACKGROUND: 1}
+
+    asyncio.run(run())
+
+
+def test_interactive_first_without_background_share():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire(INTERACTIVE)
+        granted = []
+        tasks = [await start_waiter(limiter, BACKGROUND, granted),
+                 await start_waiter(limiter, INTERACTIVE, granted)]
+        limiter.release(INTERACTIVE)
+        await asyncio.sleep(0)
+        assert granted == [INTERACTIVE]
+        limiter.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+        assert granted == [INTERACTIVE, BACKGROUND]
+
+    asyncio.run(run())
+
+
+def test_cancel_while_waiting():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire(INTERACTIVE)
+        granted = []
+        task = await start_waiter(limiter, INTERACTIVE, granted)
+        assert limiter.waiting() == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert limiter.waiting() == 0
+        limiter.release(INTERACTIVE)
+        assert limiter.active == 0
+        assert granted == []
+        # 取消的请求不占用额度
+        await asyncio.wait_for(limiter.acquire(BACKGROUND), 1)
+        assert limiter.active == 1
+
+    asyncio.run(run())
+
+
+def test_cancel_after_grant_passes_slot_on():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire(INTERACTIVE)
+        granted = []
+        cancelled = await start_waiter(limiter, INTERACTIVE, granted)
+        next_waiter = await start_waiter(limiter, BACKGROUND, granted)
+        # 额度已分配给 cancelled, 但它还没有恢复运行就被取消
+        limiter.release(INTERACTIVE)
+        assert limiter.in_flight[INTERACTIVE] == 1
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert cancelled.cancelled()
+        await asyncio.wait_for(next_waiter, 1)
+        assert granted == [BACKGROUND]
+        assert limiter.in_flight == {INTERACTIVE: 0, BACKGROUND: 1}
+        assert limiter.waiting() == 0
+
+    asyncio.run(run())
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime
+
+from china_railway_tools.api import common
+from china_railway_tools.database.connection import async_engine
+from china_railway_tools.database.schema import MTrainNo, init_db_async
+from china_railway_tools.database.write_queue import TrainNoWriteQueue, TRAIN_NO_WRITE_QUEUE
+
+TRAIN_DATE = '2025-01-01'
+
+
+def make_train_no(train_code: str, train_date: str = TRAIN_DATE) -> MTrainNo:
+    return MTrainNo(date=train_date, train_no=f'{train_code}00', train_code=train_code,
+                    from_station='北京南', to_station='上海虹桥')
+
+
+def test_search_pending_rows():
+    queue = TrainNoWriteQueue()
+    # 没有运行中的事件循环, 数据留在队列中
+    queue.put([make_train_no(x) for x in ('G12', 'G1', 'G103', 'D1')])
+    queue.put([make_train_no('G1'), make_train_no('G1', '2025-01-02')])
+    assert [x['train_code'] for x in queue.search('G1', TRAIN_DATE)] == ['G1']
+    assert [x['train_code'] for x in queue.search('G1', TRAIN_DATE, exact=False)] == ['G1', 'G12', 'G103']
+    assert [x['train_code'] for x in queue.search('G1', TRAIN_DATE, exact=False, limit=2)] == ['G1', 'G12']
+    assert queue.search('G2', TRAIN_DATE) == []
+    assert len(queue.search('G1', '2025-01-02')) == 1
+
+
+def test_query_train_no_uses_pending_rows(monkeypatch):
+    calls = []
+
+    async def fetch_train_no(train_code: str, train_date: str, **kwargs):
+        calls.append(train_code)
+        return [make_train_no(train_code, train_date)]
+
+    monkeypatch.setattr(common, 'fetch_train_no', fetch_train_no)
+
+    async def run():
+        await init_db_async()
+        train_date = datetime.strptime('2025-01-03', '%Y-%m-%d')
+        first = await common.query_train_no('G7', train_date)
+        # 写后队列尚未落库
+        assert len(TRAIN_NO_WRITE_QUEUE) == 1
+        second = await common.query_train_no('G7', train_date)
+        assert calls == ['G7']
+        assert [x.train_no for x in second] == [x.train_no for x in first] == ['G700']
+        await TRAIN_NO_WRITE_QUEUE.close()
+        assert len(TRAIN_NO_WRITE_QUEUE) == 0
+        assert [x.train_no for x in await common.query_train_no('G7', train_date)] == ['G700']
+        assert calls == ['G7']
+        await async_engine.dispose()
+
+    asyncio.run(run())